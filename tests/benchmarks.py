@@ -0,0 +1,278 @@
+"""
+Timing benchmarks of the numerical methods against the original per-element Python implementations.
+
+Run as a script: python -m tests.benchmarks
+"""
+import os
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+from threshold_dynamics.numerical_methods import (tridiagonal_matrix_algorithm_batch, tridiagonal_workspace,
+                                                  CubicSplineInterpolation, EulerMethod, RungeKuttaMethod,
+                                                  DormandPrinceMethod, BackwardDifferentiationMethod)
+
+
+def best_time(stmt, repeat=3):
+    """
+    best_time(stmt, repeat=3)
+
+    :param stmt: callable to time.
+    :param repeat: number of runs.
+    :return: best wall time of a single run, seconds.
+    """
+    return min(timeit.repeat(stmt, number=1, repeat=repeat))
+
+
+def thomas_loop(a, b, c, d):
+    """
+    thomas_loop(a, b, c, d)
+
+    Reference per-system Thomas algorithm, the scalar loop tridiagonal_matrix_algorithm used to run.
+
+    :param a: second diagonal of a coefficients [n-1].
+    :param b: main diagonal of b coefficients [n].
+    :param c: first diagonal of c coefficients [n-1].
+    :param d: array of d coefficients [n].
+    :return: array of x [n].
+    """
+    b = b.copy()
+    d = d.copy()
+    n = len(d)
+    for i in range(1, n):
+        m = a[i - 1] / b[i - 1]
+        b[i] = b[i] - m * c[i - 1]
+        d[i] = d[i] - m * d[i - 1]
+    x = b
+    x[-1] = d[-1] / b[-1]
+    for i in range(n - 2, -1, -1):
+        x[i] = (d[i] - c[i] * x[i + 1]) / b[i]
+    return x
+
+
+def benchmark_tridiagonal(sizes=(10, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6), max_elements=10 ** 6):
+    """
+    benchmark_tridiagonal(sizes, max_elements=10 ** 6)
+
+    Solves m diagonally dominant systems of n equations with the per-system loop and with the batched solver
+    (with and without a preallocated workspace). m is chosen so that m*n does not exceed max_elements.
+
+    :param sizes: numbers of equations n.
+    :param max_elements: bound on the total number of unknowns m*n.
+    """
+    rng = np.random.default_rng(0)
+    print("{:>8} {:>6} {:>12} {:>12} {:>12} {:>9}".format("n", "m", "loop, s", "batch, s", "reuse, s", "speedup"))
+    for n in sizes:
+        m = max(1, min(1000, max_elements // n))
+        a = rng.random((m, n - 1))
+        c = rng.random((m, n - 1))
+        b = rng.random((m, n)) + 2
+        d = rng.random((m, n))
+        work = tridiagonal_workspace(m, n)
+        out = np.empty((m, n))
+
+        t_loop = best_time(lambda: [thomas_loop(a[k], b[k], c[k], d[k]) for k in range(m)], repeat=1)
+        t_batch = best_time(lambda: tridiagonal_matrix_algorithm_batch(a, b, c, d))
+        t_reuse = best_time(lambda: tridiagonal_matrix_algorithm_batch(a, b, c, d, work=work, out=out))
+        print("{:>8} {:>6} {:>12.4g} {:>12.4g} {:>12.4g} {:>8.0f}x".format(n, m, t_loop, t_batch, t_reuse,
+                                                                          t_loop / t_reuse))
+
+
+def spline_fit_loop(y, x, form='symmetric'):
+    """
+    spline_fit_loop(y, x, form='symmetric')
+
+    Reference CubicSplineInterpolation.fit built with per-element list comprehensions, as it was before
+    vectorisation. Only used for timing.
+
+    :param y: function values array.
+    :param x: argument values array.
+    :param form: 'usual' or 'symmetric'.
+    :return: list of coefficient arrays.
+    """
+    if form == 'usual':
+        ac = np.array([x[i] - x[i - 1] for i in range(2, len(x) - 2)])
+        b = np.array([2 * (x[i + 2] - x[i]) for i in range(len(x) - 3)])
+        d = np.array(
+            [6 * (((y[i + 2] - y[i + 1]) / (x[i + 2] - x[i + 1])) - ((y[i + 1] - y[i]) / (x[i + 1] - x[i])))
+             for i in range(len(x) - 3)])
+        c = np.append(0, np.append(thomas_loop(ac, b, ac, d), 0))
+        dc = [(c[i] - c[i - 1]) / (x[i] - x[i - 1]) for i in range(1, len(c))]
+        bc = [(0.5 * (x[i + 1] - x[i]) * c[i + 1]) - (1 / 6) * (((x[i + 1] - x[i]) ** 2) * c[i + 1]) +
+              ((y[i + 1] - y[i]) / (x[i + 1] - x[i])) for i in range(len(c) - 1)]  # len(x) - 1 overran c
+        return [y[1:], bc, c[:-1], dc]
+
+    ac = np.array([(1 / (x[i + 1] - x[i])) for i in range(0, len(x) - 1)])
+    b = np.array([2 / (x[1] - x[0])] + [2 * ((1 / (x[i] - x[i - 1])) + (1 / (x[i + 1] - x[i])))
+                                        for i in range(1, len(x) - 1)] + [2 / (x[-1] - x[-2])])
+    d = np.array([3 * ((y[1] - y[0]) / ((x[1] - x[0]) ** 2))] +
+                 [3 * (((y[i + 1] - y[i]) / ((x[i + 1] - x[i]) ** 2)) +
+                       ((y[i + 2] - y[i + 1]) / ((x[i + 2] - x[i + 1]) ** 2))) for i in range(len(x) - 2)] +
+                 [3 * ((y[-1] - y[-2]) / ((x[-1] - x[-2]) ** 2))])
+    k = thomas_loop(ac, b, ac, d)
+    a = [(k[i] * (x[i + 1] - x[i]) - (y[i + 1] - y[i])) for i in range(len(k) - 1)]
+    bc = [(-k[i + 1] * (x[i + 1] - x[i]) + (y[i + 1] - y[i])) for i in range(len(k) - 1)]
+    return [k, a, bc]
+
+
+def benchmark_spline_fit(sizes=(100, 1000, 10 ** 4, 10 ** 5, 10 ** 6)):
+    """
+    benchmark_spline_fit(sizes)
+
+    Times CubicSplineInterpolation.fit against the list comprehension implementation for both forms.
+
+    :param sizes: numbers of knots.
+    """
+    print("{:>10} {:>8} {:>12} {:>12} {:>9}".format("form", "knots", "loop, s", "fit, s", "speedup"))
+    for form in ('usual', 'symmetric'):
+        model = CubicSplineInterpolation(form)
+        for n in sizes:
+            x = np.linspace(0, n / 10, n)
+            y = np.sin(x)
+            t_loop = best_time(lambda: spline_fit_loop(y, x, form), repeat=1)
+            t_fit = best_time(lambda: model.fit(y, x))
+            print("{:>10} {:>8} {:>12.4g} {:>12.4g} {:>8.0f}x".format(form, n, t_loop, t_fit, t_loop / t_fit))
+
+
+def benchmark_ode_solvers(tol=1e-6):
+    """
+    benchmark_ode_solvers(tol=1e-6)
+
+    Solves the oscillator y'' = -y on [0, 10] (and a stiff relaxation y' = -1000 (y - cos x) on [0, 2]) with every
+    solver, doubling the grid of the fixed step methods until the final error is below tol (or the grid exceeds 10^5
+    points), and reports the work.
+
+    :param tol: target absolute error of y at the final point.
+    """
+    problems = [
+        ("oscillator", lambda x, y: np.stack((y[1], -y[0])), np.array([1.0, 0.0]), 10, np.cos(10)),
+        ("stiff", lambda x, y: -1000 * (y - np.cos(x)), np.array([0.0]), 2,
+         (1000 ** 2 * np.cos(2) + 1000 * np.sin(2) - 1000 ** 2 * np.exp(-2000)) / (1000 ** 2 + 1)),
+    ]
+    print("{:>11} {:>30} {:>9} {:>9} {:>11} {:>10}".format("problem", "method", "steps", "nfev", "error", "time, s"))
+    for name, foo, y0, xf, exact in problems:
+        for cls in (EulerMethod, RungeKuttaMethod, DormandPrinceMethod, BackwardDifferentiationMethod):
+            n = 11
+            while True:
+                if cls is DormandPrinceMethod:
+                    model = cls(foo, vectorized=True, rtol=tol, atol=tol * 1e-3)
+                else:
+                    model = cls(foo, vectorized=True)
+                model.fit(y0=y0, xf=xf, n=n)
+                with np.errstate(all='ignore'):  # explicit methods blow up on coarse stiff grids
+                    elapsed = best_time(model.predict, repeat=1)
+                error = abs(model.state[-1, 0] - exact)
+                if error < tol or cls is DormandPrinceMethod or n > 10 ** 5:
+                    break
+                n = 2 * n - 1
+            print("{:>11} {:>30} {:>9} {:>9} {:>11.3g} {:>10.4g}".format(name, cls.__name__, model.n_steps,
+                                                                         model.nfev, error, elapsed))
+
+
+def cubic_correction(deviation, beta):
+    return beta[0] * deviation + beta[1] * deviation ** 3
+
+
+def benchmark_sweep(sizes=(50, 100, 200, 500), n_jobs=None):
+    """
+    benchmark_sweep(sizes=(50, 100, 200, 500), n_jobs=None)
+
+    Times the 2-D sweep of the criterion of the threshold dynamics model with the two parameter correction
+    beta_1 (x - S) + beta_2 (x - S)^3 over size x size grids.
+
+    :param sizes: numbers of grid points per parameter.
+    :param n_jobs: number of worker processes.
+    """
+    from threshold_dynamics.criterion import QualityCriterion
+    from threshold_dynamics.model import ThresholdDynamicsModel
+    from threshold_dynamics.sweep import ParameterSweep
+
+    t = np.linspace(0, 1, 101)
+    model = ThresholdDynamicsModel(t, 1000 * t, 300 * t, correction=cubic_correction)
+    criterion = QualityCriterion(model, method=RungeKuttaMethod, n=101)
+    print("{:>8} {:>10} {:>10} {:>12}".format("grid", "points", "sweep, s", "points/s"))
+    for n in sizes:
+        sweep = ParameterSweep(criterion, [np.linspace(0, 100, n), np.linspace(0, 1000, n)], chunk_size=1024,
+                               n_jobs=n_jobs)
+        elapsed = best_time(sweep.run, repeat=1)
+        sweep.remove()
+        print("{:>8} {:>10} {:>10.4g} {:>12.0f}".format("{0}x{0}".format(n), n * n, elapsed, n * n / elapsed))
+
+
+def benchmark_csv_loading(sizes=(10 ** 4, 10 ** 5, 10 ** 6), n_columns=3):
+    """
+    benchmark_csv_loading(sizes=(10 ** 4, 10 ** 5, 10 ** 6), n_columns=3)
+
+    Times numpy.genfromtxt against the chunked loader and a load from its binary sidecar.
+
+    :param sizes: numbers of rows.
+    :param n_columns: number of columns.
+    """
+    import tempfile
+
+    from threshold_dynamics.loader import load_csv, sidecar_name
+
+    print("{:>10} {:>14} {:>10} {:>10}".format("rows", "genfromtxt, s", "parse, s", "cached, s"))
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            fname = os.path.join(directory, "table{}.csv".format(n))
+            np.savetxt(fname, np.random.default_rng(0).random((n, n_columns)), delimiter=',')
+            genfromtxt = best_time(lambda: np.genfromtxt(fname, delimiter=','), repeat=1)
+            parse = best_time(lambda: load_csv(fname, cache=False), repeat=1)
+            load_csv(fname)
+            cached = best_time(lambda: load_csv(fname))
+            os.remove(sidecar_name(fname))
+            print("{:>10} {:>14.4g} {:>10.4g} {:>10.4g}".format(n, genfromtxt, parse, cached))
+
+
+# import time budgets on top of numpy, seconds, reported by benchmark_import
+IMPORT_BUDGETS = {'threshold_dynamics.numerical_methods': 0.05, 'threshold_dynamics.tasks': 0.05,
+                  'threshold_dynamics.cli': 0.1}
+
+
+def import_time(module, repeat=5):
+    """
+    import_time(module, repeat=5)
+
+    Times the import of a module in fresh interpreters with numpy already imported, since numpy is a dependency
+    of every module.
+
+    :param module: module name.
+    :param repeat: number of interpreters.
+    :return: best import time, seconds, and the sorted list of the heavy packages (scipy, matplotlib, PyQt5) it
+    loaded.
+    """
+    code = ("import sys, time, numpy\n"
+            "start = time.perf_counter()\n"
+            "import {}\n"
+            "elapsed = time.perf_counter() - start\n"
+            "heavy = sorted({{name.split('.')[0] for name in sys.modules}} & {{'scipy', 'matplotlib', 'PyQt5'}})\n"
+            "print(elapsed, *heavy)").format(module)
+    runs = [subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+            for _ in range(repeat)]
+    return min(float(run[0]) for run in runs), runs[0][1:]
+
+
+def benchmark_import(budgets=None):
+    """
+    benchmark_import(budgets=None)
+
+    Times the imports of the package modules against their budgets.
+
+    :param budgets: dict of module name and import time budget, seconds; IMPORT_BUDGETS if "None".
+    """
+    print("{:>40} {:>10} {:>10}  {}".format("module", "import, ms", "budget, ms", "heavy packages"))
+    for module, budget in (budgets or IMPORT_BUDGETS).items():
+        elapsed, heavy = import_time(module)
+        print("{:>40} {:>10.1f} {:>10.0f}  {}".format(module, 1000 * elapsed, 1000 * budget, ", ".join(heavy)))
+
+
+if __name__ == "__main__":
+    benchmark_import()
+    benchmark_tridiagonal()
+    benchmark_spline_fit()
+    benchmark_ode_solvers()
+    benchmark_sweep()
+    benchmark_csv_loading()
@@ -0,0 +1,68 @@
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from threshold_dynamics import cli
+from threshold_dynamics.storage import load_result
+
+
+def test_cli_runs_every_mode(tmp_path):
+    x = np.linspace(0, 1, 11)
+    np.savetxt(tmp_path / "graph1.csv", np.stack((x, x ** 2), axis=1), delimiter=',')
+    config = {"output": "out", "jobs": [
+        {"name": "rho", "mode": "integral", "distribution": "norm", "loc": 0.5, "scale": 0.1, "a": 0.5, "b": 2.0},
+        {"name": "spline", "mode": "interpolation", "data": "graph1.csv", "h": 0.01},
+        {"name": "cauchy", "mode": "cauchy_problem", "beta": 5.0, "method": "runge_kutta", "solver": {"n": 51}},
+        {"name": "sweep", "mode": "sweep", "betas": {"start": 0, "stop": 10, "num": 4},
+         "criterion": {"method": "runge_kutta", "n": 51}},
+        {"name": "broken", "mode": "interpolation", "data": "missing.csv"},
+    ]}
+    with open(tmp_path / "config.json", 'w') as f:
+        json.dump(config, f)
+
+    assert cli.main([str(tmp_path / "config.json"), "--n-jobs", "1"]) == 1
+    summary = {record['name']: record for record in json.load(open(tmp_path / "out" / "summary.json"))}
+    assert summary['rho']['value'] == pytest.approx(0.5)
+    columns, metadata = load_result(tmp_path / "out" / "spline_coefs.npz")
+    assert columns['coefficients'].shape == (10, 4) and metadata['grid'] == {'knots': 11, 'h': 0.01}
+    columns, metadata = load_result(tmp_path / "out" / "cauchy.npz")
+    assert columns['states'].shape == (51, 3) and metadata['method'] == 'RungeKuttaMethod'
+    assert metadata['parameters']['beta'] == 5.0 and metadata['kind'] == 'cauchy_problem'
+    columns, metadata = load_result(tmp_path / "out" / "sweep.npz")
+    assert not np.isnan(columns['C']).any() and metadata['grid']['beta']['num'] == 4
+    assert 'error' in summary['broken'] and 'error' not in summary['sweep']
+    assert not list((tmp_path / "out").glob("*.csv"))
+
+    assert cli.main([str(tmp_path / "config.json"), "--only", "cauchy", "--csv", "-o", str(tmp_path / "csv")]) == 0
+    assert np.loadtxt(tmp_path / "csv" / "cauchy.csv", delimiter=',').shape == (51, 4)
+
+    assert cli.main([str(tmp_path / "config.json"), "--only", "rho", "-o", str(tmp_path / "rho")]) == 0
+
+
+def test_cli_rejects_bad_data_and_does_not_reuse_stale_sweeps(tmp_path):
+    np.savetxt(tmp_path / "wide.csv", np.ones((5, 3)), delimiter=',')
+    sweep = {"name": "sweep", "mode": "sweep", "betas": {"start": 0, "stop": 10, "num": 4}, "resume": True,
+             "criterion": {"method": "runge_kutta", "n": 51}}
+    config = {"output": "out", "jobs": [{"name": "wide", "mode": "interpolation", "data": "wide.csv"}, sweep]}
+    summary = cli.run(config, n_jobs=1, base=str(tmp_path))
+    assert summary[0]['error'].startswith("ValueError") and 'error' not in summary[1]
+    assert not (tmp_path / "out" / "sweep_sweep.npy").exists()
+
+    sweep['betas']['stop'] = 100
+    cli.run(config, only=["sweep"], n_jobs=1, base=str(tmp_path))
+    wider = np.array(load_result(tmp_path / "out" / "sweep.npz")[0]['C'])
+    del sweep['resume']
+    cli.run(config, only=["sweep"], n_jobs=1, base=str(tmp_path))
+    assert np.allclose(load_result(tmp_path / "out" / "sweep.npz")[0]['C'], wider)
+    assert list((tmp_path / "out").glob("*.npy")) == []
+
+
+def test_cli_does_not_import_gui():
+    code = ("import sys, threshold_dynamics.cli; "
+            "print(any(m.split('.')[0] in ('PyQt5', 'matplotlib') for m in sys.modules))")
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout.strip() == "False"
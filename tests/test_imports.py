@@ -0,0 +1,13 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("module", ["threshold_dynamics.numerical_methods", "threshold_dynamics.tasks",
+                                    "threshold_dynamics.cli"])
+def test_import_does_not_load_heavy_packages(module):
+    code = ("import sys, {}; "
+            "print(*sorted({{m.split('.')[0] for m in sys.modules}} & {{'scipy', 'matplotlib', 'PyQt5'}}))")
+    run = subprocess.run([sys.executable, "-c", code.format(module)], capture_output=True, text=True, check=True)
+    assert run.stdout.split() == []
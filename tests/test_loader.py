@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+from threshold_dynamics.loader import count_lines, load_csv, parse_csv, sidecar_name
+from threshold_dynamics.numerical_methods import Cancelled
+
+
+def write_table(fname, data, header='x,y,z'):
+    np.savetxt(fname, data, delimiter=',', header=header, comments='')
+
+
+def test_parse_csv_chunks_header_comments_and_missing_values(tmp_path):
+    data = np.random.default_rng(0).random((1001, 3))
+    write_table(tmp_path / "table.csv", data)
+    assert count_lines(tmp_path / "table.csv") == 1002
+    assert np.array_equal(parse_csv(tmp_path / "table.csv", chunk_size=100), data.T)
+    assert np.array_equal(parse_csv(tmp_path / "table.csv", usecols=[2, 0], chunk_size=7), data[:, [2, 0]].T)
+
+    (tmp_path / "ragged.csv").write_text("# comment\n1,2\n3,\n\n5,6")
+    assert count_lines(tmp_path / "ragged.csv") == 5
+    assert np.array_equal(parse_csv(tmp_path / "ragged.csv", chunk_size=2), [[1, 3, 5], [2, np.nan, 6]],
+                          equal_nan=True)
+    (tmp_path / "empty.csv").write_text("# nothing\n")
+    assert parse_csv(tmp_path / "empty.csv").shape == (0, 0)
+
+
+def test_load_csv_caches_binary_sidecar(tmp_path):
+    fname = str(tmp_path / "table.csv")
+    data = np.arange(30.0).reshape(10, 3)
+    write_table(fname, data)
+    fractions = []
+    columns = load_csv(fname, chunk_size=4, progress=fractions.append)
+    assert fractions == pytest.approx([5 / 11, 9 / 11, 1])
+    assert os.path.exists(sidecar_name(fname)) and not isinstance(columns[0], np.memmap)
+
+    cached = load_csv(fname)
+    assert all(isinstance(column, np.memmap) for column in cached)
+    assert np.array_equal(np.stack(cached, axis=1), data)
+    assert np.array_equal(load_csv(fname, usecols=[1])[0], data[:, 1])
+
+    # a modified source is parsed again, a sidecar of selected columns serves only them
+    write_table(fname, 2 * data)
+    os.utime(fname, ns=(os.stat(fname).st_atime_ns, os.stat(fname).st_mtime_ns + 10 ** 9))
+    assert np.array_equal(load_csv(fname, usecols=[2])[0], 2 * data[:, 2])
+    assert isinstance(load_csv(fname, usecols=[2])[0], np.memmap)
+    assert not isinstance(load_csv(fname, usecols=[0, 2])[0], np.memmap)
+
+    with pytest.raises(Cancelled):
+        load_csv(fname, cache=False, chunk_size=4, progress=lambda fraction: True)
@@ -0,0 +1,192 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from threshold_dynamics.criterion import QualityCriterion
+from threshold_dynamics.ensemble import MonteCarloEnsemble
+from threshold_dynamics.model import ThresholdDynamicsModel
+from threshold_dynamics.optimizer import CriterionOptimizer
+from threshold_dynamics.sweep import ParameterSweep
+from threshold_dynamics.numerical_methods import RungeKuttaMethod, Cancelled
+from threshold_dynamics import tasks
+
+
+def make_model(beta=5.0):
+    t = np.linspace(0, 1, 101)
+    return ThresholdDynamicsModel(t, 1000 * t, 300 * t, beta=beta)
+
+
+def test_model_tables_and_plan_tracking():
+    model = make_model()
+    assert np.isclose(model.audience_share(0.0), 1) and np.isclose(model.audience_share(0.5), 0.5)
+    assert np.isclose(model.audience_share(1.0), 0)
+
+    x, y, q = model.solve(y0=0.5).states[-1]
+    # x(T) is pulled towards the plan S(T) = 300 from the free-running 500 impressions
+    assert abs(x - 300) < 50 and y > 0.5 and 0 < q < x
+
+
+def test_model_beta_ensemble_matches_single_runs():
+    model = make_model(beta=np.array([1.0, 5.0, 20.0]))
+    ensemble = model.solve(method=RungeKuttaMethod, n=201).states[-1]
+    assert ensemble.shape == (3, 3)
+    for i, beta in enumerate([1.0, 5.0, 20.0]):
+        model.beta = beta
+        assert np.allclose(model.solve(method=RungeKuttaMethod, n=201).states[-1], ensemble[:, i])
+
+
+def test_criterion_batch_matches_single_candidates():
+    criterion = QualityCriterion(make_model(), method=RungeKuttaMethod, n=201)
+    values = criterion.evaluate_batch(np.array([[1.0], [20.0]]))
+    assert np.allclose(values, [criterion(1.0), criterion(20.0)])
+    tracking, volume, accuracy = criterion.components(criterion.solve(np.array([1.0, 20.0])))
+    assert np.all(volume[1] < volume[0]) and np.all((0 < accuracy) & (accuracy < 1))
+
+
+def test_criterion_gradient_matches_separate_differences():
+    criterion = QualityCriterion(make_model(), method=RungeKuttaMethod, n=201)
+    value, gradient = criterion.gradient([5.0], initial=True)
+    assert value == pytest.approx(criterion(5.0)) and gradient.shape == (3,)
+    h = 1e-4
+    assert gradient[0] == pytest.approx((criterion(5.0 + h) - criterion(5.0 - h)) / (2 * h), rel=1e-3)
+    criterion.y0 = 0.5 + h
+    plus = criterion(5.0)
+    criterion.y0 = 0.5 - h
+    minus = criterion(5.0)
+    criterion.y0 = 0.5
+    assert gradient[2] == pytest.approx((plus - minus) / (2 * h), rel=1e-3)
+
+
+def test_model_completion_time():
+    model = make_model(beta=np.array([0.0, 5.0]))
+    completion = model.completion_time(y0=0.5)
+    # with a constant threshold half of the traffic 1000 t passes, the plan of 300 is met at t = 0.6
+    assert completion.shape == (2,) and completion[0] == pytest.approx(0.6, abs=1e-6)
+    assert 0.6 < completion[1] <= 1 or np.isinf(completion[1])
+
+
+def test_monte_carlo_ensemble_statistics():
+    t = np.linspace(0, 1, 101)
+    runs = [MonteCarloEnsemble(t, 1000 + 0 * t, 300 * t, snr=5, seed=1, batch_size=64, n_grid=11, beta=5.0).run(150)
+            for _ in range(2)]
+    ensemble = runs[0]
+    assert ensemble.n_scenarios_ == 150 and len(ensemble.volume_) == 150
+    assert np.allclose(ensemble.model.traffic.evaluate(t), 1000 * t)  # the noiseless traffic is restored
+    assert np.array_equal(ensemble.volume_, runs[1].volume_)  # seeded
+    assert ensemble.mean_.shape == ensemble.std_.shape == (11, 3)
+    assert np.all(np.diff(ensemble.quantiles_['volume']) >= 0) and 0 <= ensemble.failure_probability_ <= 1
+
+    # the streaming mean and deviation match the statistics of all trajectories
+    batches = np.random.default_rng(0).normal(size=(3, 11, 3, 40))
+    ensemble.mean_, ensemble.n_scenarios_ = None, 0
+    for batch in batches:
+        ensemble.update(batch)
+    everything = np.concatenate(batches, axis=-1)
+    assert np.allclose(ensemble.mean_, everything.mean(axis=-1)) and np.allclose(ensemble.std_, everything.std(axis=-1))
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_optimizer_caches_and_improves(n_jobs):
+    criterion = QualityCriterion(make_model(), method=RungeKuttaMethod, n=101)
+    with CriterionOptimizer(criterion, n_jobs=n_jobs, chunk_size=8) as optimizer:
+        optimizer.grid_search([(0, 100)], n=21)
+        evaluations = optimizer.n_evaluations
+        assert evaluations == 21
+        optimizer.grid_search([(0, 100)], n=21)
+        assert optimizer.n_evaluations == evaluations
+        coarse = optimizer.best_value_
+        optimizer.nelder_mead(optimizer.best_params_, step=2.0, tol=1e-8)
+        assert optimizer.best_value_ <= coarse
+        assert optimizer.best_value_ == pytest.approx(criterion(optimizer.best_params_[0]))
+
+
+def cubic_correction(deviation, beta):
+    return beta[0] * deviation + beta[1] * deviation ** 3
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_sweep_grid_and_resume(tmp_path, n_jobs):
+    model = make_model()
+    model.correction = cubic_correction
+    criterion = QualityCriterion(model, method=RungeKuttaMethod, n=101)
+    axes = [np.linspace(0, 40, 6), np.linspace(0, 100, 4)]
+    sweep = ParameterSweep(criterion, axes, fname=str(tmp_path / "sweep.npy"), chunk_size=5, n_jobs=n_jobs)
+    result = np.array(sweep.run())
+    assert result.shape == (6, 4) and not np.isnan(result).any() and sweep.pending() == []
+    assert result[2, 3] == pytest.approx(criterion.evaluate_batch([[axes[0][2], axes[1][3]]])[0])
+
+    # an interrupted sweep only evaluates the unfinished chunks
+    partial = np.load(sweep.fname, mmap_mode='r+')
+    partial[1:3] = np.nan
+    partial.flush()
+    assert sweep.pending() == [(0, 5), (5, 10), (10, 15)]
+    chunks = []
+    assert np.allclose(sweep.run(callback=lambda done, total: chunks.append(total)), result)
+    assert chunks == [3, 3, 3]
+
+
+def test_sweep_resumes_only_the_same_grid_and_criterion(tmp_path):
+    fname = str(tmp_path / "sweep.npy")
+    criterion = QualityCriterion(make_model(), method=RungeKuttaMethod, n=51)
+    first = np.array(ParameterSweep(criterion, [np.linspace(0, 10, 4)], fname=fname, n_jobs=1).run())
+    criterion.evaluate_batch([[7.0]])  # model.beta is left set, the fingerprint does not depend on it
+    same = QualityCriterion(make_model(), method=RungeKuttaMethod, n=51)
+    assert ParameterSweep(same, [np.linspace(0, 10, 4)], fname=fname, n_jobs=1).pending() == []
+    assert ParameterSweep(criterion, [np.linspace(0, 10, 4)], fname=fname, n_jobs=1).pending() == []
+
+    wider = np.array(ParameterSweep(criterion, [np.linspace(0, 100, 4)], fname=fname, n_jobs=1).run())
+    assert np.allclose(wider, criterion.evaluate_batch(np.linspace(0, 100, 4)[:, np.newaxis]))
+    assert not np.allclose(wider, first)
+    weighted = QualityCriterion(make_model(), weights=(2.0, 1.0, 1.0), method=RungeKuttaMethod, n=51)
+    assert len(ParameterSweep(weighted, [np.linspace(0, 100, 4)], fname=fname, n_jobs=1).pending()) == 1
+
+
+def test_sweep_cancel_keeps_finished_chunks(tmp_path):
+    criterion = QualityCriterion(make_model(), method=RungeKuttaMethod, n=51)
+    sweep = ParameterSweep(criterion, [np.linspace(0, 40, 12)], fname=str(tmp_path / "sweep.npy"), chunk_size=4,
+                           n_jobs=1)
+    with pytest.raises(Cancelled):
+        sweep.run(callback=lambda done, total: done >= 1)
+    assert len(sweep.pending()) == 2
+
+
+def test_tasks_report_progress():
+    fractions = []
+    x = np.linspace(0, 1, 11)
+    spline, xc, yc = tasks.spline_interpolation(x, x ** 2, h=1e-4, chunk_size=1000, progress=fractions.append)
+    assert len(fractions) == 11 and fractions[-1] == pytest.approx(1)
+    assert np.allclose(yc, spline.evaluate(xc)) and tasks.spline_coefficients(spline).shape == (10, 4)
+
+    visits, schedule = 1 + np.cos(np.linspace(0, 3, 31)), np.ones(31)
+    fractions = []
+    solution = tasks.cauchy_problem(visits, schedule, beta=5.0, progress=fractions.append)
+    assert solution.states.shape[1] == 3 and fractions[-1] == pytest.approx(1)
+    assert tasks.cauchy_problem(visits, schedule, beta=5.0) is solution
+    assert tasks.cauchy_problem(visits, schedule, beta=4.0) is not solution
+    with pytest.raises(Cancelled):
+        tasks.cauchy_problem(visits, schedule, beta=5.0, progress=lambda fraction: True, cache=False)
+
+
+@pytest.mark.parametrize("name, args, loc, scale", [("norm", (), 0.4, 0.2), ("laplace", (), 0.4, 0.2),
+                                                    ("lognorm", (0.2,), 0.0, np.exp(0.4)),
+                                                    ("beta", (2.0, 5.0), 0.0, 1.0)])
+def test_distribution_integral_of_the_settings(name, args, loc, scale):
+    import scipy.stats
+
+    distribution = getattr(scipy.stats, name)
+    params = tasks.distribution_params(distribution.pdf, mu=0.4, sigma=0.2, alpha=2.0, beta=5.0)
+    assert params == (args, loc, pytest.approx(scale))
+    value = tasks.distribution_integral(distribution.pdf, 0.1, 0.9, *params)
+    assert value == pytest.approx(distribution.cdf(0.9, *args, loc=loc, scale=scale) -
+                                  distribution.cdf(0.1, *args, loc=loc, scale=scale))
+
+
+def test_sweep_with_spawned_workers():
+    criterion = QualityCriterion(make_model(), method=RungeKuttaMethod, n=51)
+    betas = np.linspace(0, 40, 6)
+    sweep = ParameterSweep(criterion, [betas], chunk_size=3, n_jobs=2, start_method='spawn')
+    try:
+        assert np.allclose(sweep.run(), criterion.evaluate_batch(betas[:, np.newaxis]))
+    finally:
+        sweep.remove()
@@ -0,0 +1,330 @@
+import numpy as np
+import pytest
+
+from threshold_dynamics.numerical_methods import (tridiagonal_matrix_algorithm, tridiagonal_matrix_algorithm_batch,
+                                                  tridiagonal_workspace, CubicSplineInterpolation, NumericalIntegration,
+                                                  EulerMethod, RungeKuttaMethod, DormandPrinceMethod,
+                                                  BackwardDifferentiationMethod, OdeSolution, Cancelled)
+
+
+def random_tridiagonal(m, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((m, n - 1)), rng.random((m, n)) + 2, rng.random((m, n - 1)), rng.random((m, n))
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 8, 33, 100])
+def test_tridiagonal_batch_matches_dense_solve(n):
+    a, b, c, d = random_tridiagonal(4, n)
+    x = tridiagonal_matrix_algorithm_batch(a, b, c, d)
+    for k in range(4):
+        matrix = np.diag(b[k]) + np.diag(a[k], -1) + np.diag(c[k], 1)
+        assert np.allclose(matrix @ x[k], d[k])
+
+
+def test_tridiagonal_batch_does_not_mutate_and_reuses_buffers():
+    a, b, c, d = random_tridiagonal(3, 20)
+    copies = [arr.copy() for arr in (a, b, c, d)]
+    work = tridiagonal_workspace(3, 20)
+    out = np.empty((3, 20))
+    x = tridiagonal_matrix_algorithm_batch(a, b, c, d, work=work, out=out)
+    assert x is out
+    for arr, copy in zip((a, b, c, d), copies):
+        assert np.array_equal(arr, copy)
+    assert np.allclose(x[1], tridiagonal_matrix_algorithm(a[1], b[1], c[1], d[1]))
+
+
+def test_tridiagonal_batch_rejects_small_workspace():
+    a, b, c, d = random_tridiagonal(2, 10)
+    with pytest.raises(ValueError):
+        tridiagonal_matrix_algorithm_batch(a, b, c, d, work=tridiagonal_workspace(2, 5))
+
+
+def test_tridiagonal_batch_rejects_empty_systems():
+    with pytest.raises(ValueError):
+        tridiagonal_matrix_algorithm_batch(np.empty(0), np.empty(0), np.empty(0), np.empty((3, 0)))
+    with pytest.raises(ValueError):
+        tridiagonal_workspace(3, 0)
+
+
+@pytest.mark.parametrize("form", ["usual", "symmetric"])
+def test_spline_fit_is_natural_cubic_spline(form):
+    interpolate = pytest.importorskip("scipy.interpolate")
+    x = np.cumsum(np.random.default_rng(1).random(30) + 0.1)
+    y = np.sin(x)
+    model = CubicSplineInterpolation(form)
+    model.fit(y, x)
+    assert model.a.dtype == np.float64 and model.a.flags.c_contiguous
+    assert len(model.a) == len(model.b) == len(x) - 1
+    yc, xc = model.predict(0.05)
+    assert np.allclose(yc, interpolate.CubicSpline(x, y, bc_type='natural')(xc))
+
+
+@pytest.mark.parametrize("form", ["usual", "symmetric"])
+def test_spline_evaluate_arbitrary_queries(form):
+    x = np.cumsum(np.random.default_rng(2).random(20) + 0.1)
+    model = CubicSplineInterpolation(form)
+    model.fit(np.cos(x), x)
+    assert np.allclose(model.evaluate(x), np.cos(x))
+    queries = np.random.default_rng(3).uniform(x[0], x[-1], (5, 40))
+    out = np.empty_like(queries)
+    assert model.evaluate(queries, out=out) is out
+    yc, xc = model.predict(0.1)
+    assert np.allclose(model.evaluate(xc), yc)
+    assert np.all(np.diff(xc) > 0) and xc[0] == x[0] and xc[-1] < x[-1]
+
+
+@pytest.mark.parametrize("x", [[0.0, 1.0, 1.0, 2.0], [0.0, 2.0, 1.0, 3.0], [0.0, np.nan, 2.0, 3.0]])
+def test_spline_fit_rejects_unordered_knots(x):
+    with pytest.raises(ValueError):
+        CubicSplineInterpolation().fit(np.arange(4.0), x)
+
+
+def test_spline_predict_chunks_and_files(tmp_path):
+    x = np.linspace(0, 10, 11)
+    model = CubicSplineInterpolation()
+    model.fit(np.sin(x), x)
+    yc, xc = model.predict(0.01)
+    chunks = list(model.predict_chunks(0.01, chunk_size=128))
+    assert max(len(chunk[1]) for chunk in chunks) == 128
+    assert np.allclose(np.concatenate([chunk[0] for chunk in chunks]), yc)
+    assert np.allclose(np.concatenate([chunk[1] for chunk in chunks]), xc)
+
+    assert model.predict_to_file(str(tmp_path / "spline.npy"), 0.01, chunk_size=100) == len(xc)
+    assert np.allclose(np.load(str(tmp_path / "spline.npy"), mmap_mode='r'), np.stack((xc, yc), axis=1))
+    model.predict_to_file(str(tmp_path / "spline.csv"), 0.01, chunk_size=100)
+    assert np.allclose(np.loadtxt(str(tmp_path / "spline.csv"), delimiter=','), np.stack((xc, yc), axis=1))
+
+
+def test_trapezium_method_batched_and_non_uniform():
+    model = NumericalIntegration()
+    x = np.linspace(0, 2, 101)
+    curves = np.outer(np.arange(1, 4), np.sin(x))
+    expected = np.trapezoid(curves, x) if hasattr(np, "trapezoid") else np.trapz(curves, x)
+    assert np.allclose(model.trapezium_method(curves, x), expected)
+    assert np.allclose(model.trapezium_method(curves, delta=x[1] - x[0]), expected)
+    assert np.allclose(model.trapezium_method(curves.T, x, axis=0), expected)
+    assert np.isclose(model.trapezium_method(curves[0], x), expected[0])
+
+    xn = np.sort(np.random.default_rng(4).random(50))
+    yn = np.outer(np.arange(1, 4), xn ** 2)
+    assert np.allclose(model.trapezium_method(yn, xn, eq_diff=False),
+                       [np.sum(np.diff(xn) * (row[1:] + row[:-1]) / 2) for row in yn])
+    assert np.allclose(model.trapezium_method(yn, np.tile(xn, (3, 1)), eq_diff=False),
+                       model.trapezium_method(yn, xn, eq_diff=False))
+
+
+def test_cumulative_trapezium_method_extends_without_recomputing():
+    model = NumericalIntegration()
+    x = np.sort(np.random.default_rng(5).random(300)) * 3
+    y = np.outer(np.arange(1, 4), np.sin(x))
+    segments = np.diff(x) * (y[:, 1:] + y[:, :-1]) / 2
+    expected = np.concatenate((np.zeros((3, 1)), np.cumsum(segments, axis=1)), axis=1)
+
+    running = model.cumulative_trapezium_method(y[:, :10], x[:10], eq_diff=False)
+    assert np.allclose(running, expected[:, :10])
+    for start, stop in [(10, 11), (11, 200), (200, 300)]:
+        running = model.extend_cumulative(y[:, start:stop], x[start:stop])
+    assert np.allclose(running, expected)
+    assert np.isclose(running[0, -1], model.trapezium_method(y[0], x, eq_diff=False))
+
+    grid = np.linspace(0, 1, 101)
+    model.cumulative_trapezium_method(grid[:40], delta=0.01, initial=2)
+    assert np.allclose(model.extend_cumulative(grid[40:]), 2 + grid ** 2 / 2)
+
+
+@pytest.mark.parametrize("method", ["trapezium", "simpson", "romberg", "gauss", "adaptive"])
+def test_integrate_methods_report_cost(method):
+    model = NumericalIntegration()
+    solution = model.integrate(np.exp, 0, 1, method=method, tol=1e-10)
+    assert np.isclose(solution, np.e - 1, atol=1e-4 if method == "trapezium" else 1e-9)
+    assert model.nfev > 0
+    assert model.error_ < 1e-4
+
+
+def test_simpson_method_odd_intervals_and_adaptive_refinement():
+    model = NumericalIntegration()
+    x = np.linspace(0, 1, 8)
+    assert np.allclose(model.simpson_method(np.stack((x ** 2, x ** 3)), x), [1 / 3, 1 / 4])
+    x = np.linspace(0, 1, 4)
+    assert np.allclose(model.simpson_method(np.stack((x ** 2, x ** 3)), x), [1 / 3, 1 / 4])
+    assert np.isclose(model.integrate(np.exp, 0, 1, method='simpson', n=3), np.e - 1, atol=1e-3)
+    assert np.isclose(model.adaptive_method(np.sqrt, 0, 1, tol=1e-10), 2 / 3, atol=1e-9)
+    assert model.nfev < 2000
+
+
+def test_distribution_integrals_closed_form_and_tabulated():
+    stats = pytest.importorskip("scipy.stats")
+    model = NumericalIntegration()
+    model.fit_distribution(stats.norm.pdf, loc=0.5, scale=0.1)
+    assert np.isclose(model.distribution_integral(0.4, 0.6), 0.6826894921370859)
+    model.fit_distribution(stats.beta(2, 3))
+    assert np.allclose(model.tail_share(np.array([0, 0.5, 1])), [1, 0.3125, 0])
+
+    model.fit_distribution(lambda w: 12 * w * (1 - w) ** 2, x=np.linspace(0, 1, 2001))
+    assert np.allclose(model.tail_share(np.array([0, 0.5, 1])), [1, 0.3125, 0], atol=1e-6)
+    with pytest.raises(ValueError):
+        model.fit_distribution(lambda w: w)
+
+
+def test_euler_system_matches_scalar_pair_and_steps_ensembles():
+    pair = EulerMethod(lambda x, y, y1: y1, lambda x, y, y1: -y, order=1, n_eq=2)
+    pair.fit(y0=1.0, ey0=0.0, xf=1, n=101)
+    y, y1, x = pair.predict()
+
+    rates = np.linspace(0.5, 2.0, 7)
+    system = EulerMethod(lambda x, state: np.stack((state[1], -rates ** 2 * state[0])), vectorized=True)
+    system.fit(y0=np.stack((np.ones(7), np.zeros(7))), xf=1, n=101)
+    states, x = system.predict()
+    assert states.shape == (101, 2, 7)
+    assert np.allclose(states[:, 0, 2], y) and np.allclose(states[:, 1, 2], y1)
+    assert np.allclose(states[-1, 0], np.cos(rates), atol=0.05)
+    assert system.n_steps == 100 and system.nfev == 101
+
+    third = EulerMethod(lambda x, y, dy, ddy: -y, order=3)
+    third.fit(y0=1.0, ey0=[0.0, 0.0], xf=1, n=11)
+    assert third.predict()[0].shape == (11,)
+
+
+def oscillator(x, state):
+    return np.stack((state[1], -state[0]))
+
+
+@pytest.mark.parametrize("cls, n, atol", [(RungeKuttaMethod, 101, 1e-5), (DormandPrinceMethod, 11, 1e-5),
+                                          (BackwardDifferentiationMethod, 2001, 1e-3)])
+def test_ode_solvers_share_interface(cls, n, atol):
+    model = cls(oscillator, vectorized=True)
+    model.fit(y0=np.array([1.0, 0.0]), xf=5, n=n)
+    states, x = model.predict()
+    assert x[-1] == 5 and states.shape == (len(x), 2)
+    assert np.allclose(states[:, 0], np.cos(x), atol=atol)
+    assert model.n_steps == len(x) - 1 and model.nfev >= model.n_steps
+
+    scalar = cls(lambda x, y: -y)
+    scalar.fit(y0=1.0, xf=1, n=n)
+    y, x = scalar.predict()
+    assert np.isclose(y[-1], np.exp(-1), atol=atol)
+
+
+@pytest.mark.parametrize("cls, n", [(EulerMethod, 51), (RungeKuttaMethod, 51), (DormandPrinceMethod, 11),
+                                    (BackwardDifferentiationMethod, 51)])
+def test_ode_solvers_report_progress_and_cancel(cls, n):
+    fractions = []
+    model = cls(lambda x, y: -y)
+    model.fit(y0=1.0, xf=1, n=n)
+    model.progress = lambda fraction: fractions.append(fraction)
+    model.predict()
+    assert fractions[-1] == pytest.approx(1) and np.all(np.diff(fractions) >= 0)
+
+    model = cls(lambda x, y: -y)
+    model.fit(y0=1.0, xf=1, n=n)
+    model.progress = lambda fraction: fraction > 0.3
+    with pytest.raises(Cancelled):
+        model.predict()
+
+
+def test_bdf_is_stable_on_stiff_ensembles():
+    rates = np.array([1.0, 100.0, 10000.0])
+    model = BackwardDifferentiationMethod(lambda x, state: -rates * (state - np.cos(x)), vectorized=True)
+    model.fit(y0=np.zeros((1, 3)), xf=2, n=41)
+    states, x = model.predict()
+    assert np.all(np.isfinite(states))
+    assert np.allclose(states[-1, 0, 1:], np.cos(2), atol=0.02)
+
+
+def test_bdf_raises_when_newton_does_not_converge():
+    model = BackwardDifferentiationMethod(lambda x, y: -y ** 2, vectorized=True, max_iter=1)
+    model.fit(y0=np.array([1.0]), xf=1, n=11)
+    with pytest.raises(RuntimeError):
+        model.predict()
+
+
+def test_ode_solution_dense_output_is_memoized():
+    model = RungeKuttaMethod(oscillator, vectorized=True)
+    model.fit(y0=np.array([1.0, 0.0]), xf=5, n=101)
+    solution = model.solution()
+    assert isinstance(solution, OdeSolution)
+    queries = np.linspace(0, 5, 37)
+    assert solution(queries).shape == (37, 2)
+    assert np.allclose(solution(queries)[:, 0], np.cos(queries), atol=1e-4)
+    assert np.allclose(solution(model.x), model.state)
+
+    again = RungeKuttaMethod(oscillator, vectorized=True)
+    again.fit(y0=np.array([1.0, 0.0]), xf=5, n=101)
+    assert again.solution() is solution and again.nfev == 0
+    assert again.n_steps == model.n_steps == 100
+    with pytest.raises(ValueError):
+        again.state[0] = 0.0
+    again.fit(y0=np.array([2.0, 0.0]), xf=5, n=101)
+    assert again.solution() is not solution
+
+
+@pytest.mark.parametrize("cls, n", [(RungeKuttaMethod, 201), (DormandPrinceMethod, 11)])
+def test_sensitivity_of_exponential_decay(cls, n):
+    model = cls(lambda x, y: -y, vectorized=True)
+    model.fit(y0=np.array([2.0]), xf=1, n=n)
+    states, jacobian = model.sensitivity(lambda x, y, a: -a * y, p=[3.0])
+    x = model.x
+    assert states.shape == (len(x), 1) and jacobian.shape == (len(x), 1, 2)
+    assert np.allclose(states[:, 0], 2 * np.exp(-3 * x), atol=1e-5)
+    assert np.allclose(jacobian[:, 0, 0], np.exp(-3 * x), atol=1e-5)  # d y / d y0
+    assert np.allclose(jacobian[:, 0, 1], -2 * x * np.exp(-3 * x), atol=1e-5)  # d y / d a
+
+    _, jacobian = model.sensitivity()
+    assert jacobian.shape == (len(model.x), 1, 1)
+    assert np.allclose(jacobian[:, 0, 0], np.exp(-model.x), atol=1e-5)
+
+
+@pytest.mark.parametrize("cls, n", [(EulerMethod, 101), (RungeKuttaMethod, 101), (DormandPrinceMethod, 11),
+                                    (BackwardDifferentiationMethod, 101)])
+def test_terminal_events_stop_ensemble_members(cls, n):
+    rates = np.array([1.0, 2.0, 4.0])
+
+    def full(x, state):
+        return state[0] - 1
+
+    full.terminal = True
+    model = cls(lambda x, state: rates * np.ones_like(state), vectorized=True, events=[full])
+    model.fit(y0=np.zeros((1, 3)), xf=2, n=n)
+    states, x = model.predict()
+    assert np.allclose(model.x_terminal, 1 / rates)
+    assert x[-1] == pytest.approx(1) and model.n_steps < n - 1
+    assert np.allclose(states[-1], 1) and np.allclose(states[x > 0.5, 0, 1:], 1)
+    assert np.allclose(model.y_events[0][:, 0], 1) and sorted(model.m_events[0]) == [0, 1, 2]
+
+
+def test_events_count_directed_crossings():
+    def falling(x, state):
+        return state[0]
+
+    falling.direction = -1
+    model = DormandPrinceMethod(oscillator, vectorized=True, events=[falling, lambda x, state: state[1]])
+    model.fit(y0=np.array([1.0, 0.0]), xf=7, n=11)
+    model.predict()
+    assert len(model.t_events[0]) == 1 and np.isclose(model.t_events[0][0], np.pi / 2, atol=1e-6)
+    assert len(model.t_events[1]) == 2 and np.allclose(model.t_events[1], [np.pi, 2 * np.pi], atol=1e-6)
+    assert model.x[-1] == 7 and np.all(np.isinf(model.x_terminal))
+
+
+def test_usual_spline_fits_ensembles():
+    x = np.linspace(0, 6, 40)
+    y = np.stack((np.sin(x), np.cos(x), x ** 2), axis=1)
+    queries = np.linspace(-0.5, 6.5, 17)
+    ensemble = CubicSplineInterpolation('usual')
+    ensemble.fit(y, x)
+    assert ensemble.evaluate(queries).shape == (17, 3) and ensemble.derivative(2.0).shape == (3,)
+    for j in range(3):
+        single = CubicSplineInterpolation('usual')
+        single.fit(y[:, j], x)
+        assert np.allclose(ensemble.evaluate(queries)[:, j], single.evaluate(queries))
+        assert np.allclose(ensemble.derivative(queries)[:, j], single.derivative(queries))
+    with pytest.raises(ValueError):
+        CubicSplineInterpolation('symmetric').fit(y, x)
+
+
+def test_spline_derivative():
+    x = np.linspace(0, 6, 40)
+    queries = np.linspace(0.5, 5.5, 9)
+    for form in ("usual", "symmetric"):
+        model = CubicSplineInterpolation(form)
+        model.fit(np.sin(x), x)
+        assert np.allclose(model.derivative(queries), np.cos(queries), atol=1e-4)
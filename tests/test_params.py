@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from threshold_dynamics.params import Params
+
+
+def make_params():
+    x = np.arange(0.0, 1.0, 0.01)
+    return Params(xgraph1=x, xgraph2=x, xgraph3=x, xgraph4=x, xgraph5=x, mu=0.5, sigma=0.1,
+                  a1=1, b1=1, a2=1, b2=10, a3=5, b3=1, seed=0)
+
+
+def test_graphs_are_recomputed_only_when_dependencies_change():
+    params = make_params()
+    params.set_figure_params()
+    graphs = [y.copy() for y in params.ygraphs]
+    assert not any(params.is_stale(name) for name in params.dependencies)
+
+    params.mu, params.sigma = 0.3, 0.2  # the distribution settings do not touch the graphs (nor redraw the noise)
+    assert not any(params.is_stale(name) for name in params.dependencies)
+    assert all(np.array_equal(y, old, equal_nan=True) for y, old in zip(params.ygraphs, graphs))
+
+    params.a3 = 10
+    assert params.is_stale('ygraph2') and params.is_stale('ygraph3') and not params.is_stale('ygraph1')
+    assert np.array_equal(params.ygraph1, graphs[0]) and not np.array_equal(params.ygraph2, graphs[1])
+    assert np.allclose(params.ygraph3, 10 * np.cos(params.xgraph3) + 10)
+
+
+def test_assigned_graph_is_kept_until_its_dependencies_change():
+    params = make_params()
+    contour = np.linspace(1, 2, 100)
+    params.ygraph4 = contour
+    params.a2 = 3
+    assert np.array_equal(params.ygraph4, contour)
+    params.xgraph4 = np.arange(0.0, 1.0, 0.02)
+    assert np.array_equal(params.ygraph4, params.xgraph4) and len(params.ygraph4) == 50
+    with pytest.raises(AttributeError):
+        params.ygraph9
+
+
+def test_graphs_are_views_of_family_buffers():
+    params = make_params()
+    x1, y1 = params.xgraph1, params.ygraph1
+    assert np.shares_memory(x1, params.buffers['x']) and np.shares_memory(params.ygraphs[0], params.buffers['y'])
+    assert len(params.ygraphs[4]) == 0  # ygraph5 is not derived and has not been assigned
+
+    params.xgraph1 = np.linspace(0, 1, 100)  # written in place: earlier views see the update
+    assert np.array_equal(x1, np.linspace(0, 1, 100)) and params.is_stale('ygraph1')
+    assert np.allclose(params.ygraph1, y1) and np.allclose(y1[-1], params.compute_ygraph1()[-1])
+
+    params.xgraph2 = np.linspace(0, 1, 300)  # longer than the capacity: the buffer grows
+    assert params.buffers['x'].shape == (5, 300) and np.array_equal(params.xgraph1, np.linspace(0, 1, 100))
+    assert len(params.ygraph2) == 300
+    with pytest.raises(ValueError):
+        params.xgraph3 = np.zeros((2, 2))
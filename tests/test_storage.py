@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from threshold_dynamics.storage import save_result, load_result, export_csv
+
+
+def test_result_round_trip_maps_columns(tmp_path):
+    x = np.linspace(0, 1, 1001)
+    states = np.stack((x, x ** 2, x ** 3), axis=1)
+    fname = save_result(tmp_path / "result", {'t': x, 'states': states, 'steps': np.arange(5)},
+                        kind='cauchy_problem', method=np.sin, parameters={'beta': np.float64(2.0)},
+                        grid={'start': x[0], 'stop': x[-1]})
+    assert fname.endswith('result.npz')
+
+    columns, metadata = load_result(fname)
+    assert all(isinstance(column, np.memmap) for column in columns.values())
+    assert np.array_equal(columns['states'], states) and columns['steps'].dtype == np.arange(5).dtype
+    assert metadata == {'kind': 'cauchy_problem', 'method': 'sin', 'parameters': {'beta': 2.0},
+                        'grid': {'start': 0.0, 'stop': 1.0}}
+    with pytest.raises(ValueError):
+        columns['t'][0] = 1
+
+    copied, _ = load_result(fname, mmap_mode=None)
+    assert not isinstance(copied['t'], np.memmap) and np.array_equal(copied['t'], x)
+
+    np.save(tmp_path / "plain.npy", x)
+    columns, metadata = load_result(tmp_path / "plain.npy")
+    assert np.array_equal(columns['data'], x) and metadata == {}
+
+
+def test_result_special_columns_and_csv_export(tmp_path):
+    columns = {'x': np.empty(0), 'F': np.asfortranarray(np.arange(6.0).reshape(3, 2))}
+    loaded, _ = load_result(save_result(tmp_path / "special.npz", columns))
+    assert loaded['x'].shape == (0,) and np.array_equal(loaded['F'], columns['F'])
+    with pytest.raises(ValueError):
+        save_result(tmp_path / "bad", {'__meta__': np.zeros(1)})
+
+    table = {'t': np.arange(3.0), 'states': np.arange(6.0).reshape(3, 2)}
+    export_csv(tmp_path / "table.csv", table)
+    with open(tmp_path / "table.csv") as f:
+        assert f.readline() == "# t,states_0,states_1\n"
+    assert np.array_equal(np.loadtxt(tmp_path / "table.csv", delimiter=','),
+                          np.column_stack((table['t'], table['states'])))
+    with pytest.raises(ValueError):
+        export_csv(tmp_path / "ragged.csv", {'a': np.zeros(2), 'b': np.zeros(3)})
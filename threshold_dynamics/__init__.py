@@ -1,2 +1,3 @@
 import os
 STATIC_PATH = os.path.realpath(os.path.dirname(os.path.realpath(__file__)) + '/static')
+RESULTS_PATH = os.path.join(os.path.expanduser('~'), 'threshold_dynamics', 'results')  # outside the source tree
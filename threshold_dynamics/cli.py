@@ -0,0 +1,216 @@
+"""Headless batch runner
+
+Notes
+-----
+Runs the program modes from a JSON config without the GUI:
+
+    python -m threshold_dynamics.cli config.json [-o OUTPUT] [--only NAME ...] [--n-jobs N] [--csv]
+
+The config holds the output directory and a list of jobs, each with a "mode" ("integral", "interpolation",
+"cauchy_problem" or "sweep"), an optional "name" and the parameters of the matching function of tasks.py; a solver
+"method" is given by its key in METHODS. Arrays are given as a list of numbers, a CSV file name or
+{"start": ..., "stop": ..., "num": ...} for numpy.linspace. The visits and the schedule default to the graphs of the
+program setup. A sweep job with "resume": true keeps its scratch <name>_sweep.npy until it finishes, so an
+interrupted run of the same job continues from it. Every job writes its results into the output directory as .npz
+files of storage.py with their method, parameters and grid (CSV only with --csv); summary.json lists the jobs with
+their files, scalar results, times and errors.
+
+Only numpy and the numerical modules are imported here; PyQt5 and matplotlib are never loaded.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from threshold_dynamics import loader, storage, tasks
+from threshold_dynamics.numerical_methods import (EulerMethod, RungeKuttaMethod, DormandPrinceMethod,
+                                                  BackwardDifferentiationMethod)
+
+METHODS = {'euler': EulerMethod, 'runge_kutta': RungeKuttaMethod, 'dormand_prince': DormandPrinceMethod,
+           'bdf': BackwardDifferentiationMethod}
+
+
+def load_array(value, base=''):
+    """
+    load_array(value, base='')
+
+    :param value: list of numbers, CSV file name (relative to base, loaded by loader.load_csv with its sidecar cache)
+    or dict of numpy.linspace arguments.
+    :param base: directory of the config.
+    :return: float64 array.
+    """
+
+    if isinstance(value, str):
+        columns = loader.load_csv(os.path.join(base, value))
+        return columns[0] if len(columns) == 1 else np.stack(columns, axis=1)
+    if isinstance(value, dict):
+        return np.linspace(value['start'], value['stop'], value.get('num', 50))
+    return np.asarray(value, dtype=np.float64)
+
+
+def model_params(job, base=''):
+    """
+    model_params(job, base='')
+
+    :param job: job of the config.
+    :param base: directory of the config.
+    :return: keyword arguments of the threshold dynamics model, the graphs of the program setup by default.
+    """
+
+    params = {key: job[key] for key in ('x0', 'y0', 'T', 'mu', 'sigma') if key in job}
+    for graph, default in (('visits', 'ygraph2'), ('schedule', 'ygraph3')):
+        if graph in job:
+            params[graph] = load_array(job[graph], base)
+        else:
+            from threshold_dynamics.setup import figure_params
+            params[graph] = np.array(getattr(figure_params, default))
+    params.setdefault('mu', 0.5)
+    params.setdefault('sigma', 0.1)
+    return params
+
+
+def scalars(params):
+    """
+    scalars(params)
+
+    :param params: keyword arguments of the model.
+    :return: the parameters without the graphs, for the result metadata.
+    """
+
+    return {key: value for key, value in params.items() if np.ndim(value) == 0}
+
+
+def run_integral(job, base=''):
+    import scipy.stats
+
+    distribution = getattr(scipy.stats, job.get('distribution', 'norm'))
+    x = load_array(job['x'], base) if 'x' in job else None
+    value = tasks.distribution_integral(distribution, job['a'], job['b'], args=job.get('args', ()),
+                                        loc=job.get('loc', 0.0), scale=job.get('scale', 1.0), x=x)
+    return {'value': float(value)}, {}
+
+
+def run_interpolation(job, base=''):
+    if 'data' in job:
+        data = load_array(job['data'], base)
+        if data.ndim != 2 or data.shape[1] != 2:
+            raise ValueError("Interpolation data should have two columns, x and y, got shape {}.".format(data.shape))
+        x, y = data.T
+    else:
+        x, y = load_array(job['x'], base), load_array(job['y'], base)
+    h, form = job.get('h', 0.001), job.get('form', 'symmetric')
+    spline, xc, yc = tasks.spline_interpolation(x, y, h=h, form=form)
+    metadata = dict(method='cubic spline', parameters={'form': form}, grid={'knots': len(x), 'h': h})
+    return {}, {'': ({'x': xc, 'y': yc}, metadata),
+                '_coefs': ({'x': spline.x[:-1], 'coefficients': tasks.spline_coefficients(spline)}, metadata)}
+
+
+def run_cauchy_problem(job, base=''):
+    solver_params = job.get('solver', {})
+    method = METHODS[job.get('method', 'dormand_prince')]
+    params = dict(model_params(job, base), beta=job.get('beta', 0.5))
+    solution = tasks.cauchy_problem(method=method, **params, **solver_params)
+    metadata = dict(method=method, parameters=scalars(params), solver=solver_params,
+                    labels={'states': ['x', 'y', 'q']},
+                    grid={'start': solution.x[0], 'stop': solution.x[-1], 'steps': solution.n_steps})
+    return ({'value': solution.states[-1].ravel().tolist()},
+            {'': ({'t': solution.x, 'states': solution.states}, metadata)})
+
+
+def run_sweep(job, base='', n_jobs=None, path=None):
+    betas = load_array(job['betas'], base)
+    criterion = dict(job.get('criterion', {}))
+    if 'method' in criterion:
+        criterion['method'] = METHODS[criterion['method']]
+    params = model_params(job, base)
+    # an interrupted sweep is resumed from its scratch file only on request
+    fname = path + '_sweep.npy' if job.get('resume', False) else None
+    values = tasks.contour_line(betas=betas, fname=fname, n_jobs=job.get('n_jobs', n_jobs),
+                                chunk_size=job.get('chunk_size', 16), **params, **criterion)
+    metadata = dict(method=criterion.get('method', 'DormandPrinceMethod'), criterion=criterion,
+                    parameters=scalars(params),
+                    grid={'beta': {'start': betas[0], 'stop': betas[-1], 'num': len(betas)}})
+    return {}, {'': ({'beta': betas, 'C': values}, metadata)}
+
+
+MODES = {'integral': run_integral, 'interpolation': run_interpolation, 'cauchy_problem': run_cauchy_problem,
+         'sweep': run_sweep}
+
+
+def run(config, output=None, only=None, n_jobs=None, csv=False, base=''):
+    """
+    run(config, output=None, only=None, n_jobs=None, csv=False, base='')
+
+    Every mode function returns the scalar results of the summary and the results to save as
+    {file name suffix: (columns, metadata)}; they are saved by storage.save_result.
+
+    :param config: dict with the "jobs" list and the "output" directory.
+    :param output: output directory, overrides the config.
+    :param only: names of the jobs to run, all if "None".
+    :param n_jobs: number of worker processes of the sweeps.
+    :param csv: if "True", the results are also exported as CSV.
+    :param base: directory the file names of the config are relative to.
+    :return: list of the job summaries.
+    """
+
+    output = output or os.path.join(base, config.get('output', 'results'))
+    os.makedirs(output, exist_ok=True)
+    summary = []
+    for i, job in enumerate(config['jobs']):
+        mode = job['mode']
+        if mode not in MODES:
+            raise ValueError("Unknown mode '{}', expected one of {}.".format(mode, sorted(MODES)))
+        name = job.get('name', '{}_{}'.format(i, mode))
+        if only is not None and name not in only:
+            continue
+        record = {'name': name, 'mode': mode}
+        start = time.perf_counter()
+        path = os.path.join(output, name)
+        try:
+            kwargs = {'n_jobs': n_jobs, 'path': path} if mode == 'sweep' else {}
+            values, results = MODES[mode](job, base, **kwargs)
+            record.update(values)
+            record['files'] = []
+            for suffix, (columns, metadata) in results.items():
+                record['files'].append(storage.save_result(path + suffix, columns, kind=mode, **metadata))
+                if csv:
+                    record['files'].append(storage.export_csv(path + suffix + '.csv', columns))
+        except Exception as error:
+            record['error'] = "{}: {}".format(type(error).__name__, error)
+        record['time'] = time.perf_counter() - start
+        summary.append(record)
+        print("{}: {} in {:.3f} s".format(name, record.get('error', 'done'), record['time']), file=sys.stderr)
+
+    with open(os.path.join(output, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    """
+    main(argv=None)
+
+    :param argv: command line arguments, sys.argv[1:] if "None".
+    :return: exit status, 1 if any job failed.
+    """
+
+    parser = argparse.ArgumentParser(prog='threshold_dynamics', description='Runs the program modes headless.')
+    parser.add_argument('config', help='JSON config with the jobs')
+    parser.add_argument('-o', '--output', help='output directory, overrides the config')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='names of the jobs to run')
+    parser.add_argument('--n-jobs', type=int, help='number of worker processes of the sweeps')
+    parser.add_argument('--csv', action='store_true', help='also export the results as CSV')
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = json.load(f)
+    summary = run(config, args.output, args.only, args.n_jobs, args.csv,
+                  base=os.path.dirname(os.path.abspath(args.config)))
+    return int(any('error' in record for record in summary))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
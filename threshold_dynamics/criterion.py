@@ -0,0 +1,141 @@
+"""Quality criterion of the advertising server
+
+Notes
+-----
+The criterion combines the three requirements of the program description:
+
+    C = w_1 * tracking + w_2 * volume + w_3 * (1 - accuracy),
+
+tracking = RMS of (x(t) - S(t)) / S(T) over the placement, the schedule following error;
+volume = |x(T) - S(T)| / S(T), the total volume mismatch;
+accuracy = q(T) / x(T), the share of impressions that hit the target audience.
+"""
+import hashlib
+import pickle
+
+import numpy as np
+
+from threshold_dynamics.numerical_methods import DormandPrinceMethod
+
+
+class QualityCriterion:
+
+    def __init__(self, model, weights=(1.0, 1.0, 1.0), x0=0.0, y0=0.5, T=None, n_grid=101,
+                 method=DormandPrinceMethod, **solver_params):
+        """
+        QualityCriterion(model, weights=(1.0, 1.0, 1.0), x0=0.0, y0=0.5, T=None, n_grid=101,
+                         method=DormandPrinceMethod, **solver_params)
+
+        :param model: ThresholdDynamicsModel.
+        :param weights: weights of the tracking, volume and accuracy terms.
+        :param x0: initial number of impressions.
+        :param y0: initial threshold.
+        :param T: duration of the placement, the last time sample of the model if "None".
+        :param n_grid: number of time points of the tracking error.
+        :param method: EulerMethod subclass solving the model.
+        :param solver_params: parameters of the solver, e.g. n, rtol, atol.
+        """
+
+        self.model = model
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.x0 = x0
+        self.y0 = y0
+        self.T = model.t[-1] if T is None else T
+        self.method = method
+        self.solver_params = solver_params
+        self.t = np.linspace(model.t[0], self.T, n_grid)
+        self.plan = model.plan.evaluate(self.t)
+
+    def components(self, solution):
+        """
+        components(self, solution)
+
+        :param solution: OdeSolution of the model.
+        :return: tracking, volume and accuracy terms (arrays over the ensemble axes).
+        """
+
+        states = solution(self.t)  # [n_grid, 3, ...]
+        plan = self.plan.reshape((-1,) + (1,) * (states.ndim - 2))
+        volume = self.model.volume
+        tracking = np.sqrt(np.mean(((states[:, 0] - plan) / volume) ** 2, axis=0))
+        mismatch = np.abs(states[-1, 0] - plan[-1]) / volume
+        accuracy = states[-1, 2] / np.maximum(states[-1, 0], np.finfo(np.float64).tiny)
+        return tracking, mismatch, accuracy
+
+    def solve(self, beta):
+        """
+        solve(self, beta)
+
+        :param beta: parameter of the correction function; an array [m] or a tuple of arrays [m] for a parametric
+        class with several parameters solves an ensemble of m candidates at once.
+        :return: OdeSolution of the model.
+        """
+
+        self.model.beta = beta
+        return self.model.solve(x0=self.x0, y0=self.y0, T=self.T, method=self.method, **self.solver_params)
+
+    def __call__(self, beta):
+        """
+        __call__(self, beta)
+
+        :param beta: parameter(s) of the correction function, see solve.
+        :return: criterion value(s), the smaller the better.
+        """
+
+        tracking, volume, accuracy = self.components(self.solve(beta))
+        return self.weights[0] * tracking + self.weights[1] * volume + self.weights[2] * (1 - accuracy)
+
+    def evaluate_batch(self, params):
+        """
+        evaluate_batch(self, params)
+
+        :param params: candidate parameter vectors [m, k].
+        :return: criterion values [m], computed in one batched solve.
+        """
+
+        params = np.asarray(params, dtype=np.float64)
+        beta = params[:, 0] if params.shape[1] == 1 else tuple(params.T)
+        return np.broadcast_to(self(beta), (len(params),)).copy()
+
+    def fingerprint(self):
+        """
+        fingerprint(self)
+
+        :return: hex digest of everything the criterion values depend on (model, weights, initial state, solver),
+        except the evaluated parameter model.beta.
+        """
+
+        beta = self.model.beta
+        self.model.beta = None
+        try:
+            return hashlib.sha256(pickle.dumps(self)).hexdigest()
+        finally:
+            self.model.beta = beta
+
+    def gradient(self, params, initial=False, h=1e-6):
+        """
+        gradient(self, params, initial=False, h=1e-6)
+
+        Criterion value and gradient by central differences. The point and its 2k perturbations are solved as one
+        ensemble instead of 2k separate solves.
+
+        :param params: parameter vector [k] of the correction function.
+        :param initial: "True", to differentiate by x0 and y0 as well.
+        :param h: relative perturbation.
+        :return: criterion value and gradient [k] (followed by dC/dx0 and dC/dy0 with initial).
+        """
+
+        k = len(np.atleast_1d(params))
+        values = np.concatenate((np.atleast_1d(params), (self.x0, self.y0) if initial else ())).astype(np.float64)
+        q = len(values)
+        steps = h * np.maximum(np.abs(values), 1)
+        batch = values[:, np.newaxis] + np.hstack((np.zeros((q, 1)), np.diag(steps), -np.diag(steps)))
+
+        x0, y0 = self.x0, self.y0
+        if initial:
+            self.x0, self.y0 = batch[k], batch[k + 1]
+        try:
+            criterion = self.evaluate_batch(batch[:k].T)
+        finally:
+            self.x0, self.y0 = x0, y0
+        return criterion[0], (criterion[1:q + 1] - criterion[q + 1:]) / (2 * steps)
@@ -0,0 +1,143 @@
+"""Monte-Carlo ensembles of the threshold dynamics model under noisy traffic
+
+Notes
+-----
+The traffic rate is the signal plus white Gaussian noise of the given signal to noise ratio (as on the "Months
+Statistics" graph). All realizations of a batch are drawn at once from a seeded numpy.random.Generator, their
+cumulative traffic is fitted by one batched spline and the model is solved for the whole batch as one ensemble.
+Trajectories are reduced to running statistics batch by batch, so only a few numbers per scenario are kept.
+"""
+import numpy as np
+
+from threshold_dynamics.model import ThresholdDynamicsModel
+from threshold_dynamics.numerical_methods import NumericalIntegration, CubicSplineInterpolation, RungeKuttaMethod
+
+
+def noisy_traffic(rate, snr, size, rng):
+    """
+    noisy_traffic(rate, snr, size, rng)
+
+    :param rate: traffic rate signal samples [n].
+    :param snr: signal to noise ratio, std(signal) / std(noise).
+    :param size: number of realizations.
+    :param rng: numpy.random.Generator.
+    :return: noisy traffic rate realizations [n, size].
+    """
+
+    rate = np.asarray(rate, dtype=np.float64)
+    return rate[:, np.newaxis] + rng.normal(0, np.std(rate) / snr, (len(rate), size))
+
+
+class MonteCarloEnsemble:
+
+    def __init__(self, t, rate, s, snr, seed=None, batch_size=1000, n_grid=101, tolerance=0.05,
+                 quantiles=(0.05, 0.5, 0.95), **model_params):
+        """
+        MonteCarloEnsemble(t, rate, s, snr, seed=None, batch_size=1000, n_grid=101, tolerance=0.05,
+                           quantiles=(0.05, 0.5, 0.95), **model_params)
+
+        :param t: time samples [n].
+        :param rate: noiseless traffic rate samples [n]; the cumulative traffic z(t) integrates its absolute value.
+        :param s: planned cumulative impressions samples [n].
+        :param snr: signal to noise ratio of the traffic.
+        :param seed: seed of numpy.random.default_rng.
+        :param batch_size: number of scenarios solved as one ensemble.
+        :param n_grid: number of time points of the trajectory statistics.
+        :param tolerance: relative volume mismatch |x(T) - S(T)| / S(T) counted as a failure of the placement.
+        :param quantiles: probabilities of the reported quantiles.
+        :param model_params: parameters of ThresholdDynamicsModel, e.g. rho, beta, correction.
+        """
+
+        self.t = np.asarray(t, dtype=np.float64)
+        self.rate = np.asarray(rate, dtype=np.float64)
+        self.snr = snr
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+        self.n_grid = n_grid
+        self.tolerance = tolerance
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.ni = NumericalIntegration()
+        # P and Q tables and the plan are shared by all batches, only the traffic spline is refitted
+        self.model = ThresholdDynamicsModel(self.t, self.traffic(np.abs(self.rate)), s, **model_params)
+
+        self.n_scenarios_ = 0
+        self.mean_ = None  # mean states [n_grid, 3]
+        self.std_ = None  # standard deviations of the states [n_grid, 3]
+        self.volume_ = np.array([])  # x(T) / S(T) of every scenario
+        self.accuracy_ = np.array([])  # q(T) / x(T) of every scenario
+        self.failure_probability_ = np.nan
+        self.quantiles_ = {}  # 'volume' and 'accuracy' quantiles
+        self._m2 = None
+
+    def traffic(self, rate):
+        """
+        traffic(self, rate)
+
+        :param rate: traffic rate samples [n, ...].
+        :return: cumulative traffic z(t) [n, ...].
+        """
+
+        return self.ni.cumulative_trapezium_method(rate, self.t, axis=0).copy()
+
+    def run(self, n_scenarios, x0=0.0, y0=0.5, T=None, method=RungeKuttaMethod, n=201, **solver_params):
+        """
+        run(self, n_scenarios, x0=0.0, y0=0.5, T=None, method=RungeKuttaMethod, n=201, **solver_params)
+
+        Simulates n_scenarios more traffic realizations batch by batch and updates the statistics.
+
+        :param n_scenarios: number of scenarios.
+        :param x0: initial number of impressions.
+        :param y0: initial threshold.
+        :param T: duration of the placement, the last time sample if "None".
+        :param method: EulerMethod subclass solving the model.
+        :param n: number of grid points of the solver.
+        :param solver_params: parameters of the solver.
+        :return: self.
+        """
+
+        T = self.t[-1] if T is None else T
+        grid = np.linspace(self.t[0], T, self.n_grid)
+        volumes, accuracies = [self.volume_], [self.accuracy_]
+        # the batches are solved with a spline of the noisy traffic, the model keeps the noiseless one
+        traffic, self.model.traffic = self.model.traffic, CubicSplineInterpolation('usual')
+        try:
+            for start in range(0, n_scenarios, self.batch_size):
+                size = min(self.batch_size, n_scenarios - start)
+                z = self.traffic(np.abs(noisy_traffic(self.rate, self.snr, size, self.rng)))
+                self.model.traffic.fit(z, self.t)
+                # states [n_grid, 3, b]
+                states = self.model.solve(x0=x0, y0=y0, T=T, method=method, n=n, **solver_params)(grid)
+                self.update(states)
+                volumes.append(states[-1, 0] / self.model.volume)
+                accuracies.append(states[-1, 2] / np.maximum(states[-1, 0], np.finfo(np.float64).tiny))
+        finally:
+            self.model.traffic = traffic
+
+        self.volume_ = np.concatenate(volumes)
+        self.accuracy_ = np.concatenate(accuracies)
+        self.failure_probability_ = np.mean(np.abs(self.volume_ - 1) > self.tolerance)
+        self.quantiles_ = {'volume': np.quantile(self.volume_, self.quantiles),
+                           'accuracy': np.quantile(self.accuracy_, self.quantiles)}
+        return self
+
+    def update(self, states):
+        """
+        update(self, states)
+
+        Merges the running mean and variance of the trajectories with a batch (Chan et al. pairwise update).
+
+        :param states: states of the batch [n_grid, 3, b].
+        """
+
+        size = states.shape[-1]
+        mean = states.mean(axis=-1)
+        m2 = ((states - mean[..., np.newaxis]) ** 2).sum(axis=-1)
+        if self.mean_ is None:
+            self.mean_, self._m2 = mean, m2
+        else:
+            total = self.n_scenarios_ + size
+            delta = mean - self.mean_
+            self.mean_ = self.mean_ + delta * size / total
+            self._m2 = self._m2 + m2 + delta ** 2 * self.n_scenarios_ * size / total
+        self.n_scenarios_ += size
+        self.std_ = np.sqrt(self._m2 / self.n_scenarios_)
@@ -0,0 +1,134 @@
+"""Streaming CSV loader of discrete sets
+
+Notes
+-----
+Rows are counted first with a binary scan, so the result is allocated once; the file is then parsed in chunks of
+lines by the C parser of numpy.loadtxt (numpy.genfromtxt only for chunks with missing values, which become NaN).
+A non-numeric first line is taken for a header, lines starting with "#" are comments. The parsed columns are cached
+in a binary sidecar (<file>.cache.npz, see storage.py) recording the size and the modification time of the source,
+so later loads of an unchanged file only map the sidecar.
+"""
+import os
+from itertools import islice
+
+import numpy as np
+
+from threshold_dynamics import storage
+from threshold_dynamics.numerical_methods import Cancelled
+
+
+def sidecar_name(fname):
+    return str(fname) + '.cache.npz'
+
+
+def count_lines(fname, block_size=1 << 20):
+    """
+    count_lines(fname, block_size=1 << 20)
+
+    :param fname: file name.
+    :param block_size: bytes read at a time.
+    :return: number of lines of the file, an unterminated last line included.
+    """
+
+    lines, last = 0, b'\n'
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return lines + (last != b'\n')
+
+
+def _is_header(line, delimiter):
+    try:
+        [float(field) for field in line.split(delimiter) if field.strip()]
+    except ValueError:
+        return True
+    return False
+
+
+def _parse_chunk(lines, delimiter, usecols):
+    try:
+        return np.loadtxt(lines, delimiter=delimiter, usecols=usecols, ndmin=2)
+    except ValueError:
+        # missing values, the slow path
+        return np.genfromtxt(lines, delimiter=delimiter, usecols=usecols, ndmin=2)
+
+
+def parse_csv(fname, usecols=None, delimiter=',', chunk_size=65536, progress=None):
+    """
+    parse_csv(fname, usecols=None, delimiter=',', chunk_size=65536, progress=None)
+
+    :param fname: CSV file name.
+    :param usecols: indices of the columns to read, all if "None".
+    :param delimiter: delimiter of the values.
+    :param chunk_size: number of lines parsed at a time.
+    :param progress: callback called with the parsed fraction of the lines after every chunk; if it returns "True",
+    Cancelled is raised.
+    :return: array [n_columns, n_rows], every column is contiguous.
+    """
+
+    n_lines = count_lines(fname)
+    with open(fname) as f:
+        first = next((line for line in f if line.strip() and not line.startswith('#')), None)
+        if first is None:
+            return np.empty((0 if usecols is None else len(usecols), 0))
+        n_columns = len(first.split(delimiter)) if usecols is None else len(usecols)
+        f.seek(0)
+        read = 0
+        if _is_header(first, delimiter):
+            # skip the lines up to and including the header
+            for line in f:
+                read += 1
+                if line == first:
+                    break
+
+        data = np.empty((n_columns, n_lines))
+        rows = 0
+        for lines in iter(lambda: list(islice(f, chunk_size)), []):
+            read += len(lines)
+            chunk = _parse_chunk(lines, delimiter, usecols)
+            if len(chunk) and chunk.shape[1] != n_columns:
+                raise ValueError("Rows {}..{} of {} have {} columns, expected {}.".format(
+                    read - len(lines), read, fname, chunk.shape[1], n_columns))
+            data[:, rows:rows + len(chunk)] = chunk.T
+            rows += len(chunk)
+            if progress is not None and progress(read / n_lines):
+                raise Cancelled()
+    return data[:, :rows]
+
+
+def load_csv(fname, usecols=None, delimiter=',', chunk_size=65536, cache=True, progress=None):
+    """
+    load_csv(fname, usecols=None, delimiter=',', chunk_size=65536, cache=True, progress=None)
+
+    :param fname: CSV file name.
+    :param usecols: indices of the columns to read, all if "None".
+    :param delimiter: delimiter of the values.
+    :param chunk_size: number of lines parsed at a time.
+    :param cache: if "True", the columns are served from the binary sidecar when it is up to date, and the sidecar is
+    written after parsing (silently skipped if the directory is not writable).
+    :param progress: callback of the parsed fraction, see parse_csv.
+    :return: list of float64 columns; memory maps of the sidecar on cached loads.
+    """
+
+    fname = str(fname)
+    stat = os.stat(fname)
+    source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'delimiter': delimiter}
+    sidecar = sidecar_name(fname)
+    if cache and os.path.exists(sidecar):
+        columns, metadata = storage.load_result(sidecar)
+        # a sidecar of all the columns serves any selection, one of selected columns only a subset of them
+        if metadata.get('source') == source and (metadata['all_columns'] or usecols is not None and
+                                                 all(str(i) in columns for i in usecols)):
+            return list(columns.values()) if usecols is None else [columns[str(i)] for i in usecols]
+
+    data = parse_csv(fname, usecols, delimiter, chunk_size, progress)
+    columns = list(data)
+    if cache:
+        indices = range(len(columns)) if usecols is None else usecols
+        try:
+            storage.save_result(sidecar, {str(i): column for i, column in zip(indices, columns)}, kind='csv_cache',
+                                source=source, all_columns=usecols is None)
+        except OSError:
+            pass
+    return columns
@@ -9,12 +9,16 @@ from __future__ import division, absolute_import, print_function
 
 import sys
 
-from threshold_dynamics.widgets.canvas import *
-from threshold_dynamics.widgets.main_application_window import MainApplicationWindow
-from threshold_dynamics.setup import progname, progversion
-
 if __name__ == "__main__":
 
+    if len(sys.argv) > 1:  # headless batch run of a config, see threshold_dynamics/cli.py
+        from threshold_dynamics.cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    from PyQt5 import QtWidgets
+    from threshold_dynamics.widgets.main_application_window import MainApplicationWindow
+    from threshold_dynamics.setup import progname, progversion
+
     qApp = QtWidgets.QApplication(sys.argv)  # Starts Qt application.
     aw = MainApplicationWindow()  # Initialises main application window.
     aw.setWindowTitle("%s %s" % (progname, progversion))  # Sets the window title.
@@ -0,0 +1,175 @@
+"""Threshold dynamics model
+
+Notes
+-----
+The advertising server is described by the ODE system
+
+    x'(t) = z'(t) * P(y(t)),
+    y'(t) = phi(x(t) - S(t), beta),
+    q'(t) = z'(t) * Q(y(t)),
+
+where x(t) is the number of impressions, y(t) is the filter threshold on the probability w of a visitor hitting the
+target, z(t) is the cumulative traffic, S(t) is the planned cumulative number of impressions and q(t) is the expected
+number of impressions that hit the target. P(y) is the audience share above the threshold and Q(y) is the target
+share above it:
+
+    P(y) = integral from y to 1 of rho(w) dw,    Q(y) = integral from y to 1 of w * rho(w) dw.
+
+phi is the filter correction function with the tunable parameter beta: ahead of the plan the filter gets stricter,
+behind it the filter gets looser.
+"""
+import numpy as np
+
+from threshold_dynamics.numerical_methods import (NumericalIntegration, CubicSplineInterpolation, DormandPrinceMethod)
+
+
+def linear_correction(deviation, beta):
+    """
+    linear_correction(deviation, beta)
+
+    Default filter correction function phi(x - S, beta) = beta * (x - S).
+
+    :param deviation: deviation from the plan, relative to the planned volume.
+    :param beta: tunable parameter (scalar or ensemble array).
+    :return: rate of change of the threshold y.
+    """
+
+    return beta * deviation
+
+
+class ThresholdDynamicsModel:
+
+    def __init__(self, t, z, s, rho=None, beta=0.5, correction=linear_correction, n_table=2001):
+        """
+        ThresholdDynamicsModel(t, z, s, rho=None, beta=0.5, correction=linear_correction, n_table=2001)
+
+        Precomputes everything the right-hand side needs once per run: spline fits of the cumulative traffic z(t) and
+        of the plan S(t), and tables of P(y) and Q(y) on a uniform grid of [0, 1]. After that every right-hand side
+        evaluation is two spline lookups and two table interpolations, vectorised over an ensemble.
+
+        :param t: time samples [n].
+        :param z: cumulative traffic samples [n].
+        :param s: planned cumulative impressions samples [n].
+        :param rho: audience density rho(w), vectorised; normal with mean 0.5 and deviation 0.1 if "None". It is
+        normalised to a unit integral over [0, 1].
+        :param beta: tunable parameter of the correction function, a scalar or an ensemble array.
+        :param correction: filter correction function phi(deviation, beta).
+        :param n_table: number of grid points of the P and Q tables.
+        """
+
+        self.t = np.asarray(t, dtype=np.float64)
+        self.beta = beta
+        self.correction = correction
+
+        self.traffic = CubicSplineInterpolation('usual')
+        self.traffic.fit(z, self.t)
+        self.plan = CubicSplineInterpolation('usual')
+        self.plan.fit(s, self.t)
+        self.volume = float(np.asarray(s)[-1])  # planned volume S(T)
+
+        if rho is None:
+            from scipy.stats import norm
+
+            rho = lambda w: norm.pdf(w, loc=0.5, scale=0.1)
+        self.w = np.linspace(0, 1, n_table)
+        density = rho(self.w)
+        ni = NumericalIntegration()
+        cumulative = ni.cumulative_trapezium_method(density, self.w).copy()
+        target = ni.cumulative_trapezium_method(self.w * density, self.w).copy()
+        self.share = (cumulative[-1] - cumulative) / cumulative[-1]  # P(y)
+        self.target_share = (target[-1] - target) / cumulative[-1]  # Q(y)
+
+    def audience_share(self, y):
+        """
+        audience_share(self, y)
+
+        :param y: threshold(s); values outside [0, 1] are clipped.
+        :return: P(y), share of the audience passing the filter.
+        """
+
+        return np.interp(y, self.w, self.share)
+
+    def rhs(self, t, state):
+        """
+        rhs(self, t, state)
+
+        Vectorised right-hand side of the system for EulerMethod(..., vectorized=True) and its subclasses.
+
+        :param t: time.
+        :param state: state array [3, ...] of x, y and q.
+        :return: derivatives array of the same shape.
+        """
+
+        x, y = state[0], state[1]
+        rate = self.traffic.derivative(t)
+        dx = rate * np.interp(y, self.w, self.share)
+        dy = self.correction((x - self.plan.evaluate(t)) / self.volume, self.beta)
+        dq = rate * np.interp(y, self.w, self.target_share)
+        return np.stack(np.broadcast_arrays(dx, dy, dq))
+
+    def events(self, terminal=True):
+        """
+        events(self, terminal=True)
+
+        :param terminal: "True", to stop the integration when the plan is met.
+        :return: event functions of the solvers: x(t) reaching the planned volume S(T), y(t) leaving [0, 1] through
+        the lower and through the upper bound.
+        """
+
+        def plan_met(t, state):
+            return state[0] - self.volume
+
+        def lower_bound(t, state):
+            return state[1]
+
+        def upper_bound(t, state):
+            return 1 - state[1]
+
+        plan_met.terminal, plan_met.direction = terminal, 1
+        lower_bound.direction = upper_bound.direction = -1
+        return plan_met, lower_bound, upper_bound
+
+    def solver(self, x0=0.0, y0=0.5, T=None, method=DormandPrinceMethod, n=101, **kwargs):
+        """
+        solver(self, x0=0.0, y0=0.5, T=None, method=DormandPrinceMethod, n=101, **kwargs)
+
+        :param x0: initial number of impressions (scalar or ensemble array).
+        :param y0: initial threshold (scalar or ensemble array).
+        :param T: duration of the placement, the last time sample if "None".
+        :param method: EulerMethod subclass.
+        :param n: number of grid points of the fixed step methods (initial step of the adaptive ones).
+        :param kwargs: solver parameters, e.g. rtol and atol.
+        :return: fitted solver.
+        """
+
+        T = self.t[-1] if T is None else T
+        x0, y0 = np.broadcast_arrays(np.asarray(x0, dtype=np.float64), np.asarray(y0, dtype=np.float64))
+        de = method(self.rhs, vectorized=True, **kwargs)
+        de.fit(x0=self.t[0], y0=np.stack((x0, y0, np.zeros_like(x0))), xf=T, n=n)
+        return de
+
+    def solve(self, x0=0.0, y0=0.5, T=None, method=DormandPrinceMethod, n=101, **kwargs):
+        """
+        solve(self, x0=0.0, y0=0.5, T=None, method=DormandPrinceMethod, n=101, **kwargs)
+
+        Solves the Cauchy problem. beta is read from the model and may be changed between calls, so the solver memo
+        is not used here.
+
+        :return: OdeSolution of the states x, y, q.
+        """
+
+        return self.solver(x0, y0, T, method, n, **kwargs).solution(cache=False)
+
+    def completion_time(self, x0=0.0, y0=0.5, T=None, method=DormandPrinceMethod, n=101, **kwargs):
+        """
+        completion_time(self, x0=0.0, y0=0.5, T=None, method=DormandPrinceMethod, n=101, **kwargs)
+
+        Integrates until x(t) reaches the planned volume and locates that moment; ensemble members which reached it
+        stop there, the integration stops when all of them have.
+
+        :return: time the placement is completed (inf if not before T), of the ensemble shape.
+        """
+
+        de = self.solver(x0, y0, T, method, n, events=self.events()[:1], **kwargs)
+        de.predict()
+        return de.x_terminal.reshape(de.state.shape[2:])
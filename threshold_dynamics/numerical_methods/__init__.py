@@ -1,4 +1,5 @@
-import matplotlib.pyplot as plt
+from collections import OrderedDict
+
 import numpy as np
 
 
@@ -12,6 +13,8 @@ def tridiagonal_matrix_algorithm(a, b, c, d):
     a_{i}*x_{i-1}+b_{i}*x_{i}+c_{i}*x_{i+1}=d_{i}, where a_{1}=0 and c_{n}=0.
     Algorithm from https://en.wikipedia.org/wiki/Tridiagonal_matrix_algorithm
 
+    Single system wrapper around tridiagonal_matrix_algorithm_batch. Arrays a, b, c and d are left unchanged.
+
     :param a: second diagonal of a coefficients [n-1].
     :param b: main diagonal of b coefficients [n].
     :param c: first diagonal of c coefficients [n-1].
@@ -19,19 +22,211 @@ def tridiagonal_matrix_algorithm(a, b, c, d):
     :return: array of x [n].
     """
 
-    n = len(d)  # number of equations
-    for i in range(1, n):
-        m = a[i - 1] / b[i - 1]
-        b[i] = b[i] - m * c[i - 1]
-        d[i] = d[i] - m * d[i - 1]
+    return tridiagonal_matrix_algorithm_batch(a, b, c, d)
+
+
+def _reduction_levels(n):
+    """
+    _reduction_levels(n)
+
+    Offsets and sizes of the cyclic reduction levels packed one after another along the last workspace axis.
+
+    :param n: number of equations.
+    :return: list of (offset, size) tuples and the total workspace length.
+    """
+
+    if n < 1:
+        raise ValueError("Tridiagonal systems should have at least one equation, got an empty system.")
+    levels = []
+    offset = 0
+    while True:
+        levels.append((offset, n))
+        offset += n
+        if n == 1:
+            break
+        n = (n + 1) // 2
+    return levels, offset
+
+
+def tridiagonal_workspace(m, n, dtype=np.float64):
+    """
+    tridiagonal_workspace(m, n, dtype=np.float64)
+
+    Preallocates the workspace used by tridiagonal_matrix_algorithm_batch for m systems of n equations. Passing the
+    same workspace to repeated calls makes the solver allocation free.
+
+    :param m: number of systems.
+    :param n: number of equations in every system.
+    :param dtype: floating point type of the systems.
+    :return: workspace array [6, m, ~2n].
+    """
+
+    return np.empty((6, m, _reduction_levels(n)[1]), dtype=dtype)
+
+
+def tridiagonal_matrix_algorithm_batch(a, b, c, d, work=None, out=None):
+    """
+    tridiagonal_matrix_algorithm_batch(a, b, c, d, work=None, out=None)
+
+    Solves m independent tridiagonal systems A_k(a_k, b_k, c_k)*x_k=d_k at once. Cyclic reduction is used instead of
+    the sequential Thomas sweep: every level eliminates the odd unknowns of all systems with a handful of NumPy
+    operations over the (m, n / 2^level) block, so the interpreted work is O(log n) instead of O(m*n). Like the
+    Thomas algorithm it is stable for diagonally dominant matrices (e.g. spline systems).
+    Algorithm from https://en.wikipedia.org/wiki/Cyclic_reduction
+
+    Input arrays are never modified. Diagonals shared by all systems may be given as 1-D arrays and are broadcast
+    along the batch axis.
+
+    :param a: second diagonals of a coefficients [m, n-1] or [n-1].
+    :param b: main diagonals of b coefficients [m, n] or [n].
+    :param c: first diagonals of c coefficients [m, n-1] or [n-1].
+    :param d: arrays of d coefficients [m, n] or [n].
+    :param work: preallocated workspace from tridiagonal_workspace(m, n), optional.
+    :param out: preallocated array for the solution [m, n], optional.
+    :return: array of x [m, n] ([n] for a single 1-D system).
+    """
+
+    d = np.asarray(d)
+    single = d.ndim == 1
+    if single:
+        d = d[np.newaxis]
+    if d.ndim != 2:
+        raise ValueError("'d' should be either a [n] or a [m, n] array.")
+    m, n = d.shape
+
+    levels, total = _reduction_levels(n)
+    if work is None:
+        work = np.empty((6, m, total), dtype=np.result_type(d, b, np.float64))
+    elif work.shape[0] < 6 or work.shape[1] != m or work.shape[2] < total:
+        raise ValueError("Workspace of shape {} is too small for {} systems of {} equations, "
+                         "use tridiagonal_workspace(m, n).".format(work.shape, m, n))
+
+    wa, wb, wc, wd, t1, t2 = work[:6, :, :total]
+
+    # level 0: padded copies of the diagonals, a_{1}=0 and c_{n}=0
+    wa[:, 0] = 0
+    wa[:, 1:n] = a
+    wb[:, :n] = b
+    wc[:, :n - 1] = c
+    wc[:, n - 1] = 0
+    wd[:, :n] = d
+
+    # forward reduction: even unknowns of a level form the next level
+    for (off, s), (off2, s2) in zip(levels[:-1], levels[1:]):
+        lvl, nxt = slice(off, off + s), slice(off2, off2 + s2)
+        A, B, C, D = wa[:, lvl], wb[:, lvl], wc[:, lvl], wd[:, lvl]
+        A2, B2, C2, D2 = wa[:, nxt], wb[:, nxt], wc[:, nxt], wd[:, nxt]
+        so = s // 2  # number of odd unknowns
+        ev, od = slice(0, s, 2), slice(1, s, 2)
+
+        B2[:] = B[:, ev]
+        D2[:] = D[:, ev]
+        A2[:] = 0
+        C2[:] = 0
+
+        # contribution of the left odd neighbour, alpha = -a_i / b_{i-1}
+        alpha, tmp = t1[:, :s2 - 1], t2[:, :s2 - 1]
+        np.divide(A[:, ev][:, 1:], B[:, od][:, :s2 - 1], out=alpha)
+        np.negative(alpha, out=alpha)
+        np.multiply(alpha, A[:, od][:, :s2 - 1], out=A2[:, 1:])
+        np.multiply(alpha, C[:, od][:, :s2 - 1], out=tmp)
+        B2[:, 1:] += tmp
+        np.multiply(alpha, D[:, od][:, :s2 - 1], out=tmp)
+        D2[:, 1:] += tmp
+
+        # contribution of the right odd neighbour, gamma = -c_i / b_{i+1}
+        gamma, tmp = t1[:, :so], t2[:, :so]
+        np.divide(C[:, ev][:, :so], B[:, od], out=gamma)
+        np.negative(gamma, out=gamma)
+        np.multiply(gamma, C[:, od], out=C2[:, :so])
+        np.multiply(gamma, A[:, od], out=tmp)
+        B2[:, :so] += tmp
+        np.multiply(gamma, D[:, od], out=tmp)
+        D2[:, :so] += tmp
+
+    off, s = levels[-1]
+    wd[:, off] /= wb[:, off]
+
+    # back substitution: the solution of every level is written over its d coefficients
+    for (off, s), (off2, s2) in zip(levels[-2::-1], levels[:0:-1]):
+        lvl = slice(off, off + s)
+        A, B, C, D = wa[:, lvl], wb[:, lvl], wc[:, lvl], wd[:, lvl]
+        so = s // 2
+        ev, od = slice(0, s, 2), slice(1, s, 2)
+        X, Xo = D[:, ev], D[:, od]
+
+        X[:] = wd[:, off2:off2 + s2]
+        tmp = t1[:, :so]
+        np.multiply(A[:, od], X[:, :so], out=tmp)
+        Xo -= tmp
+        tmp = t1[:, :s2 - 1]
+        np.multiply(C[:, od][:, :s2 - 1], X[:, 1:], out=tmp)
+        Xo[:, :s2 - 1] -= tmp
+        Xo /= B[:, od]
+
+    x = wd[0, :n] if single else wd[:, :n]
+    if out is None:
+        return x.copy()
+    out[...] = x
+    return out
+
+
+def _axis_slice(ndim, axis, index):
+    """
+    _axis_slice(ndim, axis, index)
+
+    :param ndim: number of array dimensions.
+    :param axis: axis to index.
+    :param index: integer or slice along axis.
+    :return: index tuple selecting index along axis and everything along the other axes.
+    """
+
+    key = [slice(None)] * ndim
+    key[axis] = index
+    return tuple(key)
+
+
+def _hashable(value):
+    """
+    _hashable(value)
+
+    :param value: scalar, sequence or array.
+    :return: hashable key of the value; arrays are keyed by dtype, shape and contents.
+    """
+
+    if isinstance(value, (np.ndarray, list, tuple)):
+        value = np.asarray(value)
+        return value.dtype.str, value.shape, value.tobytes()
+    return value
+
+
+class Cancelled(Exception):
+    """Raised by a numerical method when its progress callback asks it to stop."""
+
+
+_gauss_legendre_cache = {}
+
+
+def gauss_legendre_nodes(order):
+    """
+    gauss_legendre_nodes(order)
+
+    Nodes and weights of the Gauss-Legendre rule on [-1, 1]. They are computed once per order and cached; the
+    returned arrays are read-only.
 
-    x = b
+    :param order: number of nodes.
+    :return: arrays of nodes and weights [order].
+    """
+
+    if order not in _gauss_legendre_cache:
+        nodes, weights = np.polynomial.legendre.leggauss(order)
+        nodes.flags.writeable = False
+        weights.flags.writeable = False
+        _gauss_legendre_cache[order] = nodes, weights
+    return _gauss_legendre_cache[order]
 
-    x[-1] = d[-1] / d[-1]
 
-    for i in range(n - 2, -1, -1):
-        x[i] = (d[i] - c[i] * x[i + 1]) / b[i]
-    return x
+_cdf_table_cache = {}
 
 
 class NumericalMethods:
@@ -39,6 +234,20 @@ class NumericalMethods:
         self.coef_ = []
         self.x = []
         self.y = []
+        self.progress = None  # progress(fraction) callback of long computations, returns "True" to cancel them
+
+    def report(self, fraction):
+        """
+        report(self, fraction)
+
+        Passes the done fraction of a long computation to the progress callback. This is the cooperative
+        cancellation point: if the callback returns "True", Cancelled is raised.
+
+        :param fraction: done fraction in [0, 1].
+        """
+
+        if self.progress is not None and self.progress(fraction):
+            raise Cancelled("{} was cancelled at {:.0%}.".format(type(self).__name__, fraction))
 
     def fit(self, y, x):
         self.y = y
@@ -52,18 +261,33 @@ class NumericalIntegration(NumericalMethods):
 
     def __init__(self):
         NumericalMethods.__init__(self)
+        # running integral state of cumulative_trapezium_method
+        self._cumulative = None  # buffer, integration axis last
+        self._cumulative_size = 0
+        self._cumulative_axis = -1
+        self._last_x = None
+        self._last_y = None
+        self._delta = None
+        # cost and accuracy of the last integrate call
+        self.nfev = 0
+        self.error_ = np.nan
+        # distribution of fit_distribution
+        self._cdf = None
+        self._sf = None
 
-    def trapezium_method(self, y=None, x=None, delta=None, eq_diff=True):
+    def trapezium_method(self, y=None, x=None, delta=None, eq_diff=True, axis=-1):
         """
-        trapezium_method(y, x, delta=None, eq_diff=True)
+        trapezium_method(y, x, delta=None, eq_diff=True, axis=-1)
 
-        Integrate along the given axis using the composite trapezoidal rule.
+        Integrate along the given axis using the composite trapezoidal rule. y may be an N-D array, e.g. a stack of
+        curves [m, n]; every 1-D slice along axis is integrated and an array of integrals is returned.
 
-        :param y: function values list.
-        :param x: function arguments list.
+        :param y: function values array.
+        :param x: function arguments array, either 1-D of length y.shape[axis] or of the same shape as y.
         :param delta: sampling rate.
         :param eq_diff: "True", if difference between samples is equal.
-        :return: approximated value of a definite integral
+        :param axis: axis along which to integrate.
+        :return: approximated value of a definite integral (array of y.ndim - 1 dimensions for N-D y).
         """
 
         if y is None and x is None:
@@ -75,23 +299,405 @@ class NumericalIntegration(NumericalMethods):
         elif x is not None and delta is not None:
             raise ValueError("Either 'x' or 'h' argument should be 'None'")
 
+        y = np.asarray(y)
+        first = _axis_slice(y.ndim, axis, 0)
+        last = _axis_slice(y.ndim, axis, -1)
+
         if x is None and delta is not None:
             # List of arguments is not given. Assume that difference between samples is equal to delta.
             h = delta
-            solution = h * (((y[0] + y[-1]) / 2) + sum(y[0:-1]))
         elif delta is None and eq_diff:
             # List of arguments is given. Made an assumption that difference between samples is equal.
-            # print("x0: ", x[0], "x1: ", x[1])
-            h = x[1] - x[0]
-            solution = h * (((y[0] + y[-1]) / 2) + sum(y[0:-1]))
-        elif delta is None and not eq_diff:
+            x = np.asarray(x)
+            h = x[_axis_slice(x.ndim, axis, 1)] - x[_axis_slice(x.ndim, axis, 0)] if x.ndim > 1 else x[1] - x[0]
+        else:
             # List of arguments is given, but difference between samples should be calculated.
-            h = np.diff(x)
-            solution = 0
-            for i in range(1, len(x)):
-                solution += h[i] * (y[i - 1] + y[i]) / 2
+            h = np.diff(np.asarray(x), axis=axis if np.ndim(x) > 1 else -1)
+            if h.ndim == 1 and y.ndim > 1:
+                shape = [1] * y.ndim
+                shape[axis] = -1
+                h = h.reshape(shape)
+            return (h * (y[_axis_slice(y.ndim, axis, slice(1, None))] +
+                         y[_axis_slice(y.ndim, axis, slice(None, -1))])).sum(axis=axis) / 2
+
+        return h * (y.sum(axis=axis) - (y[first] + y[last]) / 2)
+
+    def cumulative_trapezium_method(self, y=None, x=None, delta=None, eq_diff=True, axis=-1, initial=0):
+        """
+        cumulative_trapezium_method(y, x, delta=None, eq_diff=True, axis=-1, initial=0)
+
+        Running integral F(t_k) = initial + integral from t_0 to t_k, e.g. cumulative traffic z(t) or the planned
+        cumulative impressions S(t), computed with the composite trapezoidal rule in O(n). The result can later be
+        extended with new samples by extend_cumulative without recomputing the prefix.
+
+        :param y: function values array.
+        :param x: function arguments array, either 1-D of length y.shape[axis] or of the same shape as y.
+        :param delta: sampling rate.
+        :param eq_diff: "True", if difference between samples is equal.
+        :param axis: axis along which to integrate.
+        :param initial: value of the running integral at the first sample.
+        :return: array of the same shape as y.
+        """
+
+        if y is None and x is None:
+            x = self.x
+            y = self.y
+
+        if x is None and delta is None:
+            raise ValueError("Either 'x' or 'h' argument should not be 'None'")
+        elif x is not None and delta is not None:
+            raise ValueError("Either 'x' or 'h' argument should be 'None'")
+
+        y = np.moveaxis(np.asarray(y, dtype=np.float64), axis, -1)
+        if x is not None:
+            x = np.asarray(x, dtype=np.float64)
+            if x.ndim > 1:
+                x = np.moveaxis(x, axis, -1)
+            self._last_x = np.array(x[..., -1])
+            if eq_diff:
+                delta = x[..., 1:2] - x[..., 0:1] if x.ndim > 1 else x[1] - x[0]
+                self._delta = delta
+                segments = delta * (y[..., 1:] + y[..., :-1]) / 2
+            else:
+                self._delta = None
+                segments = np.diff(x, axis=-1) * (y[..., 1:] + y[..., :-1]) / 2
+        else:
+            self._last_x = None
+            self._delta = delta
+            segments = delta * (y[..., 1:] + y[..., :-1]) / 2
+
+        n = y.shape[-1]
+        self._cumulative = np.empty(y.shape[:-1] + (max(2 * n, 16),), dtype=np.float64)
+        self._cumulative[..., 0] = initial
+        np.cumsum(segments, axis=-1, out=self._cumulative[..., 1:n])
+        self._cumulative[..., 1:n] += self._cumulative[..., 0:1]
+        self._cumulative_size = n
+        self._cumulative_axis = axis
+        self._last_y = y[..., -1].copy()
+        return self.cumulative
+
+    @property
+    def cumulative(self):
+        """
+        Running integral of the last cumulative_trapezium_method / extend_cumulative call (a view, copy it to keep).
+        """
+
+        if self._cumulative is None:
+            return None
+        return np.moveaxis(self._cumulative[..., :self._cumulative_size], -1, self._cumulative_axis)
+
+    def extend_cumulative(self, y, x=None):
+        """
+        extend_cumulative(y, x=None)
+
+        Appends new samples to the running integral in O(k) for k new samples. The trapezium between the last known
+        sample and the first new one is included. The internal buffer grows geometrically, so repeated appends are
+        amortised O(1) per sample.
+
+        :param y: new function values, [..., k] along the integration axis.
+        :param x: new function arguments, optional if the running integral was built with an equal sampling rate.
+        :return: extended running integral.
+        """
+
+        if self._cumulative is None:
+            raise ValueError("Call cumulative_trapezium_method before extending the running integral.")
+
+        y = np.moveaxis(np.asarray(y, dtype=np.float64), self._cumulative_axis, -1)
+        k = y.shape[-1]
+        prev = np.concatenate((self._last_y[..., np.newaxis], y), axis=-1)
+        if x is not None:
+            x = np.asarray(x, dtype=np.float64)
+            if x.ndim > 1:
+                x = np.moveaxis(x, self._cumulative_axis, -1)
+            if self._last_x is None:
+                raise ValueError("Running integral was built without 'x', extend it without 'x' too.")
+            h = np.diff(np.concatenate((self._last_x[..., np.newaxis], x), axis=-1), axis=-1)
+            self._last_x = x[..., -1].copy()
+        elif self._delta is not None:
+            h = self._delta
+            if self._last_x is not None:
+                self._last_x = self._last_x + k * np.reshape(h, np.shape(self._last_x))
+        else:
+            raise ValueError("Sampling is not equal, 'x' argument should not be 'None'")
+
+        segments = h * (prev[..., 1:] + prev[..., :-1]) / 2
+
+        size = self._cumulative_size
+        if size + k > self._cumulative.shape[-1]:
+            grown = np.empty(self._cumulative.shape[:-1] + (max(2 * self._cumulative.shape[-1], size + k),))
+            grown[..., :size] = self._cumulative[..., :size]
+            self._cumulative = grown
+        new = self._cumulative[..., size:size + k]
+        np.cumsum(segments, axis=-1, out=new)
+        new += self._cumulative[..., size - 1:size]
+        self._cumulative_size = size + k
+        self._last_y = y[..., -1].copy()
+        return self.cumulative
+
+    def simpson_method(self, y=None, x=None, delta=None, axis=-1):
+        """
+        simpson_method(y, x, delta=None, axis=-1)
+
+        Integrate along the given axis using the composite Simpson's rule on equally spaced samples. For an odd number
+        of intervals the last three are integrated with Simpson's 3/8 rule.
+
+        :param y: function values array.
+        :param x: function arguments array, equally spaced.
+        :param delta: sampling rate.
+        :param axis: axis along which to integrate.
+        :return: approximated value of a definite integral (array of y.ndim - 1 dimensions for N-D y).
+        """
+
+        if y is None and x is None:
+            x = self.x
+            y = self.y
+
+        if x is None and delta is None:
+            raise ValueError("Either 'x' or 'h' argument should not be 'None'")
+        elif x is not None and delta is not None:
+            raise ValueError("Either 'x' or 'h' argument should be 'None'")
+
+        y = np.moveaxis(np.asarray(y), axis, -1)
+        h = delta if x is None else x[1] - x[0]
+        n = y.shape[-1] - 1  # number of intervals
+        if n < 2:
+            raise ValueError("At least three samples are needed for Simpson's rule.")
+
+        m = n if n % 2 == 0 else n - 3  # intervals of the 1/3 rule, none for three intervals
+        solution = 0.0
+        if m:
+            solution = h / 3 * (y[..., 0] + 4 * y[..., 1:m:2].sum(axis=-1) + 2 * y[..., 2:m - 1:2].sum(axis=-1) +
+                                y[..., m])
+        if m != n:
+            solution = solution + 3 * h / 8 * (y[..., m] + 3 * y[..., m + 1] + 3 * y[..., m + 2] + y[..., m + 3])
         return solution
 
+    def romberg_method(self, foo, a, b, tol=1e-10, max_level=20):
+        """
+        romberg_method(foo, a, b, tol=1e-10, max_level=20)
+
+        Romberg integration: trapezium rule on 1, 2, 4, ... intervals with Richardson extrapolation. Every level
+        evaluates only the new midpoints, in one vectorised call of foo.
+
+        :param foo: vectorised function.
+        :param a: lower limit.
+        :param b: upper limit.
+        :param tol: absolute tolerance of the difference of two consecutive diagonal extrapolations.
+        :param max_level: maximal number of interval halvings.
+        :return: approximated value of a definite integral.
+        """
+
+        h = b - a
+        row = [h * (foo(a) + foo(b)) / 2]
+        self.nfev = 2
+        self.error_ = np.inf
+        for k in range(1, max_level + 1):
+            h /= 2
+            midpoints = a + h * np.arange(1, 2 ** k, 2)
+            self.nfev += len(midpoints)
+            new = [row[0] / 2 + h * np.sum(foo(midpoints))]
+            for j in range(1, k + 1):
+                new.append(new[j - 1] + (new[j - 1] - row[j - 1]) / (4 ** j - 1))
+            self.error_ = abs(new[-1] - row[-1])
+            row = new
+            if self.error_ < tol:
+                break
+            self.report(k / max_level)
+        return row[-1]
+
+    def gauss_legendre_method(self, foo, a, b, order=5, n=10):
+        """
+        gauss_legendre_method(foo, a, b, order=5, n=10)
+
+        Composite Gauss-Legendre quadrature with cached nodes: n equal subintervals with order nodes each, all
+        evaluated in one vectorised call of foo. The error is estimated by Richardson's rule from the same composite
+        rule on n // 2 subintervals.
+
+        :param foo: vectorised function.
+        :param a: lower limit.
+        :param b: upper limit.
+        :param order: number of nodes per subinterval.
+        :param n: number of subintervals.
+        :return: approximated value of a definite integral.
+        """
+
+        nodes, weights = gauss_legendre_nodes(order)
+
+        def composite(m):
+            edges = np.linspace(a, b, m + 1)
+            half = (edges[1:] - edges[:-1])[:, np.newaxis] / 2
+            points = (edges[:-1, np.newaxis] + half) + half * nodes
+            return np.sum(half * weights * foo(points)), points.size
+
+        solution, self.nfev = composite(n)
+        if n >= 2:
+            coarse, nfev = composite(n // 2)
+            self.nfev += nfev
+            self.error_ = abs(solution - coarse) / (2 ** (2 * order) - 1)
+        else:
+            self.error_ = np.nan
+        return solution
+
+    def adaptive_method(self, foo, a, b, tol=1e-10, max_depth=50):
+        """
+        adaptive_method(foo, a, b, tol=1e-10, max_depth=50)
+
+        Adaptive Simpson's rule. Every subinterval whose local error estimate |S_left + S_right - S| / 15 is above its
+        share of tol is halved; the others are accepted with Richardson's correction. All intervals of a refinement
+        level are evaluated in one vectorised call of foo, so refinement costs evaluations only where the function is
+        hard to integrate.
+
+        :param foo: vectorised function.
+        :param a: lower limit.
+        :param b: upper limit.
+        :param tol: absolute tolerance.
+        :param max_depth: maximal number of halvings of one interval.
+        :return: approximated value of a definite integral.
+        """
+
+        left = np.array([a], dtype=np.float64)
+        right = np.array([b], dtype=np.float64)
+        f = foo(np.array([a, (a + b) / 2, b], dtype=np.float64))
+        f_left, f_mid, f_right = f[0:1], f[1:2], f[2:3]
+        whole = (right - left) / 6 * (f_left + 4 * f_mid + f_right)
+        self.nfev = 3
+
+        solution = 0.0
+        error = 0.0
+        for depth in range(max_depth + 1):
+            mid = (left + right) / 2
+            quarters = foo(np.concatenate(((left + mid) / 2, (mid + right) / 2)))
+            self.nfev += quarters.size
+            f_q1, f_q3 = quarters[:len(left)], quarters[len(left):]
+            s_left = (mid - left) / 6 * (f_left + 4 * f_q1 + f_mid)
+            s_right = (right - mid) / 6 * (f_mid + 4 * f_q3 + f_right)
+            delta = s_left + s_right - whole
+            local_error = np.abs(delta) / 15
+
+            done = local_error <= tol * (right - left) / (b - a)
+            if depth == max_depth:
+                done[:] = True
+            solution += np.sum(s_left[done] + s_right[done] + delta[done] / 15)
+            error += np.sum(local_error[done])
+            if done.all():
+                break
+
+            todo = ~done
+            left, mid, right = left[todo], mid[todo], right[todo]
+            f_left, f_q1, f_mid, f_q3, f_right = f_left[todo], f_q1[todo], f_mid[todo], f_q3[todo], f_right[todo]
+            left, right = np.concatenate((left, mid)), np.concatenate((mid, right))
+            f_left, f_mid, f_right = (np.concatenate((f_left, f_mid)), np.concatenate((f_q1, f_q3)),
+                                      np.concatenate((f_mid, f_right)))
+            whole = np.concatenate((s_left[todo], s_right[todo]))
+
+        self.error_ = error
+        return solution
+
+    def integrate(self, foo, a, b, method='adaptive', tol=1e-10, n=100, order=5):
+        """
+        integrate(foo, a, b, method='adaptive', tol=1e-10, n=100, order=5)
+
+        Common interface of the quadrature rules. After the call self.nfev holds the number of function evaluations
+        and self.error_ the error estimate, so the rules can be compared by cost.
+
+        :param foo: vectorised function.
+        :param a: lower limit.
+        :param b: upper limit.
+        :param method: 'trapezium', 'simpson' (n intervals), 'romberg', 'gauss' (n subintervals of order nodes) or
+        'adaptive' (Simpson).
+        :param tol: absolute tolerance of 'romberg' and 'adaptive'.
+        :param n: number of intervals of the fixed rules.
+        :param order: number of nodes of the Gauss-Legendre rule.
+        :return: approximated value of a definite integral.
+        """
+
+        if method in ('trapezium', 'simpson'):
+            x = np.linspace(a, b, n + 1)
+            y = foo(x)
+            self.nfev = n + 1
+            rule, p = (self.trapezium_method, 2) if method == 'trapezium' else (self.simpson_method, 4)
+            solution = rule(y, x)
+            if n % 4 == 0:
+                # Richardson's estimate from every other sample, no extra evaluations
+                self.error_ = abs(solution - rule(y[::2], x[::2])) / (2 ** p - 1)
+            else:
+                self.error_ = np.nan
+            return solution
+        elif method == 'romberg':
+            return self.romberg_method(foo, a, b, tol=tol)
+        elif method == 'gauss':
+            return self.gauss_legendre_method(foo, a, b, order=order, n=n)
+        elif method == 'adaptive':
+            return self.adaptive_method(foo, a, b, tol=tol)
+        raise ValueError("Method should be 'trapezium', 'simpson', 'romberg', 'gauss' or 'adaptive'.")
+
+    def fit_distribution(self, foo, args=(), loc=0, scale=1, x=None):
+        """
+        fit_distribution(foo, args=(), loc=0, scale=1, x=None)
+
+        Prepares O(1) per query integrals of a density, e.g. the audience distribution rho(omega). Scipy distributions
+        (rv_continuous, frozen, or their .pdf method like norm.pdf) are integrated through their closed-form CDF. Any
+        other vectorised density is tabulated once on the grid x with the cumulative trapezium rule; tables are cached
+        by density and grid, and queries interpolate them.
+
+        :param foo: scipy distribution, its pdf method or a vectorised density function.
+        :param args: shape parameters of a scipy distribution.
+        :param loc: location parameter of a scipy distribution.
+        :param scale: scale parameter of a scipy distribution.
+        :param x: tabulation grid, needed only for densities without a CDF.
+        :return:
+        """
+
+        dist = foo if hasattr(foo, 'cdf') else getattr(foo, '__self__', None)
+        if hasattr(dist, 'cdf'):
+            if hasattr(dist, 'dist'):
+                # frozen distribution, parameters are already bound
+                self._cdf, self._sf = dist.cdf, dist.sf
+            else:
+                self._cdf = lambda v: dist.cdf(v, *args, loc=loc, scale=scale)
+                self._sf = lambda v: dist.sf(v, *args, loc=loc, scale=scale)
+            return
+
+        if x is None:
+            raise ValueError("Density has no CDF, the 'x' tabulation grid is needed.")
+        x = np.asarray(x, dtype=np.float64)
+        key = (foo, x[0], x[-1], len(x), hash(x.tobytes()))
+        if key not in _cdf_table_cache:
+            table = NumericalIntegration().cumulative_trapezium_method(foo(x), x, eq_diff=False).copy()
+            _cdf_table_cache[key] = x, table
+        grid, table = _cdf_table_cache[key]
+        self._cdf = lambda v: np.interp(v, grid, table)
+        self._sf = lambda v: table[-1] - np.interp(v, grid, table)
+
+    def distribution_integral(self, a, b):
+        """
+        distribution_integral(a, b)
+
+        Integral of the fitted density from a to b, CDF(b) - CDF(a). Works elementwise on arrays of limits.
+
+        :param a: lower limit(s).
+        :param b: upper limit(s).
+        :return: approximated value of a definite integral.
+        """
+
+        if self._cdf is None:
+            raise ValueError("Call fit_distribution before integrating the distribution.")
+        return self._cdf(b) - self._cdf(a)
+
+    def tail_share(self, y):
+        """
+        tail_share(y)
+
+        Share of the audience above the threshold y, 1 - CDF(y) (the survival function).
+
+        :param y: threshold(s).
+        :return: integral of the fitted density from y to infinity (to the end of the grid for tabulated densities).
+        """
+
+        if self._sf is None:
+            raise ValueError("Call fit_distribution before integrating the distribution.")
+        return self._sf(y)
+
 
 class CubicSplineInterpolation(NumericalMethods):
     def __init__(self, form='symmetric'):
@@ -119,58 +725,72 @@ class CubicSplineInterpolation(NumericalMethods):
         """
         fit(self, y, x)
 
-        Fits the data and gets the interpolation coefficients.
+        Fits the data and gets the interpolation coefficients of the natural cubic spline. Diagonals and coefficients
+        are built with np.diff and slicing; coefficients of the N-1 intervals are stored as contiguous float64 arrays
+        (a, b, c, d for the 'usual' form, k, a, b for the 'symmetric' one). The 'usual' form fits an ensemble of
+        functions at once: y [n, ...] with trailing axes gives coefficients [n-1, ...], all tridiagonal systems are
+        solved in one batched call, and evaluate and derivative return the values of every member.
 
-        :param size_check:
-        :param form:
-        :param y: function values array
-        :param x: argument values array.
+        :param size_check: if "True", prints the lengths of the system and coefficient arrays.
+        :param y: function values array [n] (or [n, ...] for the 'usual' form).
+        :param x: argument values array, strictly increasing.
         :return:
         """
 
-        self.x = x
-        self.y = y
-
         if x is None or y is None:
             raise ValueError("Both argument value array and function value array are needed "
                              "to process cubic spline interpolation.")
         elif len(x) != len(y):
             raise ValueError("Both argument value array and function value array should be of equal length.")
+        elif len(x) < 2:
+            raise ValueError("At least two knots are needed to process cubic spline interpolation.")
+
+        self.x = x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = y = np.ascontiguousarray(y, dtype=np.float64)
+        if x.ndim != 1 or not np.all(np.diff(x) > 0):
+            raise ValueError("Argument values should be a strictly increasing 1-D array.")
+        if y.ndim > 1 and self.form != 'usual':
+            raise ValueError("Only the 'usual' form fits function value arrays with ensemble axes.")
+
+        h = np.diff(x)  # interval lengths
+        dy = np.diff(y, axis=0)
 
         try:
             if self.form == 'usual':
-                h = np.array([x[i] - x[i - 1] for i in range(1, len(x))])
-                ac = np.array([x[i] - x[i - 1] for i in range(2, len(x) - 2)])
-                b = np.array([2 * (x[i + 2] - x[i]) for i in range(len(x) - 3)])
-                d = np.array(
-                    [6 * (((y[i + 2] - y[i + 1]) / (x[i + 2] - x[i + 1])) - ((y[i + 1] - y[i]) / (x[i + 1] - x[i])))
-                     for i in range(len(x) - 3)])
-
-                self.a = y[1:]
-
-                self.c = np.append(tridiagonal_matrix_algorithm(ac, b, ac, d), 0)
-                self.c = np.append(0, self.c)
-                self.d = [(self.c[i] - self.c[i - 1]) / (x[i] - x[i - 1]) for i in range(1, len(self.c))]
-                self.b = [
-                    (0.5 * (x[i + 1] - x[i]) * self.c[i + 1]) - (1 / 6) * (((x[i + 1] - x[i]) ** 2) * self.c[i + 1]) + (
-                    (y[i + 1] - y[i]) / (x[i + 1] - x[i]))
-                    for i in range(len(x) - 1)
-                ]
-                self.c = self.c[:-1]
+                # S_i(x) = a_i + b_i*(x-x_i) + c_i*(x-x_i)^2 + d_i*(x-x_i)^3 on [x_{i-1}, x_i], natural boundary
+                # conditions; m holds the second derivatives in the knots.
+                hb = h.reshape((-1,) + (1,) * (y.ndim - 1))  # broadcast against ensemble axes
+                slope = dy / hb
+                ac = h[1:-1]  # first and third diagonals
+                b = 2 * (h[:-1] + h[1:])  # main diagonal
+                d = 6 * np.diff(slope, axis=0)  # array of d coefficients
+
+                m = np.zeros_like(y)
+                if len(x) > 2:
+                    # one system per ensemble member, all sharing the diagonals
+                    m[1:-1] = tridiagonal_matrix_algorithm_batch(ac, b, ac, d.reshape(len(d), -1).T).T.reshape(d.shape)
+
+                self.a = y[1:].copy()
+                self.b = slope + hb * (2 * m[1:] + m[:-1]) / 6
+                self.c = m[1:] / 2
+                self.d = np.diff(m, axis=0) / (6 * hb)
 
             elif self.form == 'symmetric':
-                ac = np.array([(1 / (x[i + 1] - x[i])) for i in range(0, len(x) - 1)])  # first and third diagonals
-                b = np.array([2 / (x[1] - x[0])] + [2 * ((1 / (x[i] - x[i - 1])) + (1 / (x[i + 1] - x[i]))) for i in
-                                                    range(1, len(x) - 1)] +
-                             [2 / (x[-1] - x[-2])])  # main diagonal
-                d = np.array([3 * ((y[1] - y[0]) / ((x[1] - x[0]) ** 2))] +
-                             [3 * (((y[i + 1] - y[i]) / ((x[i + 1] - x[i]) ** 2)) +
-                                   ((y[i + 2] - y[i + 1]) / ((x[i + 2] - x[i + 1]) ** 2))) for i in range(len(x) - 2)] +
-                             [3 * ((y[-1] - y[-2]) / ((x[-1] - x[-2]) ** 2))])  # array of d coefficients
+                inv_h = 1 / h
+                slope = dy * inv_h ** 2
+                ac = inv_h  # first and third diagonals
+                b = np.empty_like(x)  # main diagonal
+                b[0] = 2 * inv_h[0]
+                b[1:-1] = 2 * (inv_h[:-1] + inv_h[1:])
+                b[-1] = 2 * inv_h[-1]
+                d = np.empty_like(x)  # array of d coefficients
+                d[0] = 3 * slope[0]
+                d[1:-1] = 3 * (slope[:-1] + slope[1:])
+                d[-1] = 3 * slope[-1]
 
                 self.k = tridiagonal_matrix_algorithm(ac, b, ac, d)
-                self.a = [(self.k[i] * (x[i + 1] - x[i]) - (y[i + 1] - y[i])) for i in range(len(self.k) - 1)]
-                self.b = [(-self.k[i + 1] * (x[i + 1] - x[i]) + (y[i + 1] - y[i])) for i in range(len(self.k) - 1)]
+                self.a = self.k[:-1] * h - dy
+                self.b = -self.k[1:] * h + dy
 
         finally:
             if size_check:
@@ -185,44 +805,277 @@ class CubicSplineInterpolation(NumericalMethods):
                         print(len(i), end=' ')
                     print("\n")
 
+    def evaluate(self, x, out=None):
+        """
+        evaluate(self, x, out=None)
+
+        Evaluates the fitted spline at arbitrary argument values. Intervals are located with np.searchsorted
+        (O(m log n) for m queries and n knots) and the piecewise polynomial is computed in one vectorised pass.
+        Values outside [x_0, x_n] are extrapolated with the first and the last polynomials.
+
+        :param x: argument values array of any shape.
+        :param out: preallocated float64 array of the same shape for the function values, optional.
+        :return: array of function values.
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        idx = np.clip(np.searchsorted(self.x, x, side='right') - 1, 0, len(self.x) - 2)
+        return self._evaluate(x, idx, out)
+
+    def derivative(self, x):
+        """
+        derivative(self, x)
+
+        First derivative of the fitted spline at arbitrary argument values, located the same way as in evaluate.
+
+        :param x: argument values array of any shape.
+        :return: array of derivative values.
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        idx = np.clip(np.searchsorted(self.x, x, side='right') - 1, 0, len(self.x) - 2)
+
+        if self.form == 'usual':
+            t = (x - self.x[idx + 1]).reshape(x.shape + (1,) * (self.b.ndim - 1))
+            return self.b[idx] + t * (2 * self.c[idx] + 3 * t * self.d[idx])
+
+        elif self.form == 'symmetric':
+            x0 = self.x[idx]
+            h = self.x[idx + 1] - x0
+            t = (x - x0) / h
+            a, b = self.a[idx], self.b[idx]
+            return ((self.y[idx + 1] - self.y[idx]) + (1 - 2 * t) * (a * (1 - t) + b * t) + t * (1 - t) * (b - a)) / h
+
+    def _evaluate(self, x, idx, out=None):
+        """
+        _evaluate(self, x, idx, out=None)
+
+        :param x: argument values array.
+        :param idx: index i of the interval [x_i, x_{i+1}] of every argument value.
+        :param out: preallocated array for the function values, optional.
+        :return: array of function values.
+        """
+
+        if out is None:
+            out = np.empty(x.shape + self.a.shape[1:], dtype=np.float64)
+
+        if self.form == 'usual':
+            t = (x - self.x[idx + 1]).reshape(x.shape + (1,) * (self.a.ndim - 1))
+            np.multiply(self.d[idx], t, out=out)
+            out += self.c[idx]
+            out *= t
+            out += self.b[idx]
+            out *= t
+            out += self.a[idx]
+
+        elif self.form == 'symmetric':
+            x0 = self.x[idx]
+            t = (x - x0) / (self.x[idx + 1] - x0)
+            s = 1 - t
+            np.multiply(self.a[idx], s, out=out)
+            out += self.b[idx] * t
+            out *= t * s
+            out += s * self.y[idx]
+            out += t * self.y[idx + 1]
+        return out
+
+    def _grid_bounds(self, h):
+        """
+        _grid_bounds(self, h)
+
+        :param h: sampling rate.
+        :return: index of the first grid point of every interval and the index after its last one.
+        """
+
+        counts = np.ceil(np.diff(self.x) / h).astype(np.intp)
+        ends = np.cumsum(counts)
+        return ends - counts, ends
+
+    def _grid(self, h, start=0, stop=None, bounds=None):
+        """
+        _grid(self, h, start=0, stop=None, bounds=None)
+
+        Builds the sampling grid of predict: np.arange(x_{i-1}, x_i, h) for every interval, concatenated.
+
+        :param h: sampling rate.
+        :param start: index of the first grid point to build.
+        :param stop: index after the last grid point to build, the whole grid if "None".
+        :param bounds: precomputed result of _grid_bounds(h), optional.
+        :return: grid argument values and the interval index of every point.
+        """
+
+        begins, ends = bounds if bounds is not None else self._grid_bounds(h)
+        if stop is None:
+            stop = ends[-1]
+        position = np.arange(start, stop)
+        idx = np.searchsorted(ends, position, side='right')
+        xc = self.x[idx] + (position - begins[idx]) * h
+        return xc, idx
+
+    def grid_size(self, h=0.01):
+        """
+        grid_size(self, h=0.01)
+
+        :param h: sampling rate.
+        :return: number of points predict(h) would return.
+        """
+
+        return int(self._grid_bounds(h)[1][-1])
+
     def predict(self, h=0.01):
         """
         predict(self, h=0.01)
 
+        Samples every interval [x_{i-1}, x_i) with the step h and evaluates the spline on the resulting grid.
+
         :param h: sampling rate.
-        :return: computed array of argument values and function values.
+        :return: computed array of function values and argument values.
         """
 
-        self.xc = np.array([])
-        self.yc = np.array([])
+        self.xc, idx = self._grid(h)
+        self.yc = self._evaluate(self.xc, idx)
+        return self.yc, self.xc
 
-        # for i in [self.k, self.x, self.y, self.a, self.b]:
-        #     print(len(i), end=' ')
+    def predict_chunks(self, h=0.01, chunk_size=65536):
+        """
+        predict_chunks(self, h=0.01, chunk_size=65536)
 
-        if self.form == 'usual':
-            for i in range(1, len(self.x) - 1):
-                xd = np.arange(self.x[i - 1], self.x[i], h)
-                self.xc = np.append(self.xc, xd)
-                for j in xd:
-                    yd = self.a[i] + self.b[i] * (j - x[i]) + self.c[i] * ((j - x[i]) ** 2) + self.d[i] * (
-                    (j - x[i]) ** 3)
-                    self.yc = np.append(self.yc, yd)
-            return self.yc, self.xc
+        Generator version of predict. The grid is built and evaluated chunk_size points at a time, so memory stays
+        bounded whatever the length of the output grid; self.xc and self.yc are left untouched.
 
-        elif self.form == 'symmetric':
-            for i in range(1, len(self.x)):
-                xd = np.arange(self.x[i - 1], self.x[i], h)
-                self.xc = np.append(self.xc, xd)
-                for j in xd:
-                    t = (j - self.x[i - 1]) / (self.x[i] - self.x[i - 1])
-                    yd = ((1 - t) * self.y[i - 1]) + (t * self.y[i]) + (
-                    t * (1 - t) * ((self.a[i - 1] * (1 - t)) + (self.b[i - 1] * t)))
-                    self.yc = np.append(self.yc, yd)
-            return self.yc, self.xc
+        :param h: sampling rate.
+        :param chunk_size: number of points per chunk (the last chunk may be shorter).
+        :return: generator of (function values, argument values) chunks.
+        """
+
+        if chunk_size < 1:
+            raise ValueError("'chunk_size' should be positive.")
+        bounds = self._grid_bounds(h)
+        size = bounds[1][-1]
+        for start in range(0, size, chunk_size):
+            stop = min(start + chunk_size, size)
+            xc, idx = self._grid(h, start, stop, bounds)
+            yc = self._evaluate(xc, idx)
+            self.report(stop / size)
+            yield yc, xc
+
+    def predict_to_file(self, fname, h=0.01, chunk_size=65536):
+        """
+        predict_to_file(self, fname, h=0.01, chunk_size=65536)
+
+        Streams predict(h) to disk chunk by chunk as an [N, 2] table of argument and function values. A '.npy' file
+        name creates a memory-mapped NumPy file, any other name gets comma separated text; an already opened
+        [N, 2] array (e.g. np.memmap) is filled in place.
+
+        :param fname: file name or a preallocated [grid_size(h), 2] array.
+        :param h: sampling rate.
+        :param chunk_size: number of points per chunk.
+        :return: number of written points.
+        """
+
+        size = self.grid_size(h)
+        chunks = self.predict_chunks(h, chunk_size)
+
+        if isinstance(fname, np.ndarray):
+            if fname.shape != (size, 2):
+                raise ValueError("Output array should be of shape {}.".format((size, 2)))
+            target = fname
+        elif str(fname).endswith('.npy'):
+            target = np.lib.format.open_memmap(fname, mode='w+', dtype=np.float64, shape=(size, 2))
+        else:
+            with open(fname, 'wb') as f:
+                for yc, xc in chunks:
+                    np.savetxt(f, np.stack((xc, yc), axis=1), delimiter=',')
+            return size
+
+        start = 0
+        for yc, xc in chunks:
+            target[start:start + len(xc), 0] = xc
+            target[start:start + len(xc), 1] = yc
+            start += len(xc)
+        if isinstance(target, np.memmap):
+            target.flush()
+        return size
+
+
+_solution_cache = OrderedDict()
+_solution_cache_size = 32
+
+
+class OdeSolution:
+    """
+    Continuous solution of an ODE system: piecewise cubic Hermite interpolant built on the solver steps from the
+    states and the right-hand side values at both ends of every step. Third order accurate between the steps and
+    exact at them; evaluation costs one np.searchsorted and a Horner pass, without re-solving.
+    """
+
+    def __init__(self, x, states, derivatives):
+        """
+        OdeSolution(x, states, derivatives)
+
+        :param x: step points [n].
+        :param states: states at the step points [n, n_eq, ...].
+        :param derivatives: right-hand side values at the step points [n, n_eq, ...].
+        """
+
+        self.x = np.asarray(x, dtype=np.float64)
+        self.states = states
+        self.derivatives = derivatives
+        self.nfev = 0
+        self.n_steps = len(self.x) - 1
+
+        h = np.diff(self.x).reshape((-1,) + (1,) * (states.ndim - 1))
+        slope = np.diff(states, axis=0) / h
+        # p(s) = c0 + c1*s + c2*s^2 + c3*s^3, s = x - x_i
+        self.coef_ = np.stack((states[:-1],
+                               derivatives[:-1],
+                               (3 * slope - 2 * derivatives[:-1] - derivatives[1:]) / h,
+                               (derivatives[:-1] + derivatives[1:] - 2 * slope) / h ** 2))
+
+    def __call__(self, x):
+        """
+        __call__(self, x)
+
+        :param x: argument value or array of them.
+        :return: states at x [x.shape + (n_eq, ...)]; outside the solved range the end polynomials are used.
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        idx = np.clip(np.searchsorted(self.x, x, side='right') - 1, 0, len(self.x) - 2)
+        s = (x - self.x[idx]).reshape(x.shape + (1,) * (self.states.ndim - 1))
+        c0, c1, c2, c3 = self.coef_[:, idx]
+        return c0 + s * (c1 + s * (c2 + s * c3))
 
 
 class EulerMethod(NumericalMethods):
-    def __init__(self, foo, foo1=None, order=1, n_eq=1):
+    solver_params = ()  # attributes of the subclasses which change the solution
+
+    def __init__(self, foo, foo1=None, order=1, n_eq=1, vectorized=False, events=()):
+        """
+        EulerMethod(foo, foo1=None, order=1, n_eq=1, vectorized=False, events=())
+
+        Explicit Euler method. Without vectorized the right-hand side is given the classic way: foo(x, y) for one
+        first order equation, foo(x, y, y1) and foo1(x, y, y1) for a pair of them, foo(x, y, y', ..., y^(order-1))
+        for one equation of a higher order. With vectorized=True foo(x, Y) is the right-hand side of a whole system:
+        Y is the state array [n_eq, ...] and foo returns dY/dx of the same shape. Trailing axes form an ensemble, e.g.
+        a batch of initial conditions y0 [n_eq, m] or parameter arrays [m] captured by foo, and all of them are stepped
+        at once.
+
+        Event functions g(x, Y) of the first order system state are zero at the events. After every step their sign
+        changes are located by bisection of the cubic Hermite interpolant of the step. An event function with the
+        attribute terminal=True stops the integration at its first zero: ensemble members are frozen at their own
+        event state and the integration stops when all of them have stopped. The attribute direction > 0 (< 0) only
+        counts zeros where g increases (decreases).
+
+        :param foo: right-hand side.
+        :param foo1: right-hand side of the second equation of a pair.
+        :param order: order of a single equation.
+        :param n_eq: number of equations (1 or 2 without vectorized).
+        :param vectorized: "True", if foo is the vectorised right-hand side of the whole system.
+        :param events: event functions g(x, Y), vectorised over the ensemble; x is an array of the ensemble members
+        during root finding.
+        """
+
         NumericalMethods.__init__(self)
         # differential equation parameters
         self.order = order
@@ -235,6 +1088,8 @@ class EulerMethod(NumericalMethods):
         self.n_eq = n_eq
         self.foo = foo
         self.foo1 = foo1
+        self.vectorized = vectorized
+        self.events = tuple(events)
 
         self.n = 0
         self.d = 0  # delta or step
@@ -243,8 +1098,37 @@ class EulerMethod(NumericalMethods):
         self.y = np.array([])  # y array for prediction
         self.dy = np.array([])
         self.y1 = np.array([])
+        self.state = np.array([])  # states of the system [n, n_eq, ...]
+        self.derivatives = np.array([])  # right-hand side at the states
+        self.grid = np.array([])  # grid of fit, self.x is cut at a terminal event
+
+        # events of the last predict call: arguments, states [count, n_eq] and flat ensemble member indices per event
+        # function, and the argument of the terminal event of every member (inf if it did not stop)
+        self.t_events = []
+        self.y_events = []
+        self.m_events = []
+        self.x_terminal = np.array([])
+        self._y_terminal = np.empty((0, 0))
+        self._event_values = []
+
+        # cost of the last predict call
+        self.n_steps = 0
+        self.nfev = 0
 
     def fit(self, x0=0, y0=None, ey0=None, xf=10, n=100, d=None):
+        """
+        fit(self, x0=0, y0=None, ey0=None, xf=10, n=100, d=None)
+
+        :param x0: initial argument value.
+        :param y0: initial function value; initial state [n_eq, ...] with vectorized.
+        :param ey0: extra initial value: of the second function of a pair, of the derivative (a sequence of
+        derivatives up to order - 1 for higher orders).
+        :param xf: final argument value.
+        :param n: number of grid points.
+        :param d: step.
+        :return:
+        """
+
         self.x0 = x0
         self.xf = xf
         self.y0 = y0
@@ -264,19 +1148,327 @@ class EulerMethod(NumericalMethods):
             self.d = d
             self.x = np.arange(self.x0, self.xf, self.d)
             self.n = self.x.shape[0]
+        self.grid = self.x
 
         self.y = np.zeros([self.n])  # how does it work?
         self.dy = np.zeros([self.n])
         self.y1 = np.zeros([self.n])
 
+    def rhs(self):
+        """
+        rhs(self)
+
+        :return: vectorised right-hand side F(x, Y) of the first order system equivalent to the equations.
+        """
+
+        foo, foo1 = self.foo, self.foo1
+        if self.vectorized:
+            return foo
+        if self.n_eq == 2 and self.order == 1:
+            return lambda x, y: np.stack((foo(x, y[0], y[1]), foo1(x, y[0], y[1])))
+        if self.n_eq == 1 and self.order == 1:
+            return lambda x, y: np.asarray(foo(x, y[0]))[np.newaxis]
+        if self.n_eq == 1 and self.order > 1:
+            return lambda x, y: np.concatenate((y[1:], np.asarray(foo(x, *y))[np.newaxis]))
+        raise ValueError("Set vectorized=True to solve a system of {} equations of order {}.".format(self.n_eq,
+                                                                                                      self.order))
+
+    def initial_state(self):
+        """
+        initial_state(self)
+
+        :return: initial state array [n_eq, ...] of the first order system.
+        """
+
+        if self.vectorized:
+            return np.asarray(self.y0, dtype=np.float64)
+        if self.order == 1 and self.n_eq == 1:
+            return np.array([self.y0], dtype=np.float64)
+        if self.order == 1:
+            return np.array([self.y0, self.y01], dtype=np.float64)
+        return np.concatenate(([self.y0], np.ravel(self.dy0))).astype(np.float64)
+
+    def step(self, rhs, x, y, d, f=None):
+        """
+        step(self, rhs, x, y, d, f=None)
+
+        One explicit Euler step Y(x + d) = Y(x) + d * F(x, Y).
+
+        :param rhs: vectorised right-hand side.
+        :param x: argument value.
+        :param y: state array.
+        :param d: step.
+        :param f: already computed F(x, Y), optional.
+        :return: state array at x + d.
+        """
+
+        if f is None:
+            f = rhs(x, y)
+            self.nfev += 1
+        return y + d * f
+
+    @staticmethod
+    def ensemble(state0, f):
+        """
+        ensemble(state0, f)
+
+        :param state0: initial state array [n_eq, ...].
+        :param f: right-hand side at the initial state; it may carry ensemble axes of parameter arrays.
+        :return: initial state broadcast against the ensemble axes of f (a read-only view).
+        """
+
+        state0 = state0.reshape(state0.shape + (1,) * (f.ndim - state0.ndim))
+        return np.broadcast_to(state0, np.broadcast_shapes(state0.shape, f.shape))
+
+    def solve(self, rhs, state0):
+        """
+        solve(self, rhs, state0)
+
+        Steps the system over the grid of fit. Initial states are broadcast against the shape of the right-hand side,
+        so parameter ensembles need no copies of the initial state.
+
+        :param rhs: vectorised right-hand side F(x, Y).
+        :param state0: initial state array [n_eq, ...].
+        :return: states array [n, n_eq, ...].
+        """
+
+        grid = self.grid
+        f = np.asarray(rhs(grid[0], state0))
+        self.nfev = 1
+        state0 = self.ensemble(state0, f)
+        state = np.empty((len(grid),) + state0.shape, dtype=np.float64)
+        self.derivatives = np.empty_like(state)
+        state[0] = state0
+        self.init_events(grid[0], state0)
+        n = len(grid)
+        for i in range(1, len(grid)):
+            self.derivatives[i - 1] = f
+            state[i] = self.step(rhs, grid[i - 1], state[i - 1], self.d, f)
+            f = rhs(grid[i], state[i])
+            self.nfev += 1
+            self.report(i / (len(grid) - 1))
+            if self.locate_events(grid[i - 1], state[i - 1], self.derivatives[i - 1], grid[i], state[i], f):
+                n = i + 1
+                break
+        self.derivatives[n - 1] = f
+        self.n_steps = n - 1
+        self.x, state, self.derivatives = self.finish_events(grid[:n], state[:n], self.derivatives[:n])
+        self.n = len(self.x)
+        return state
+
+    def init_events(self, x, y):
+        """
+        init_events(self, x, y)
+
+        Resets the event records and evaluates the event functions at the initial state.
+
+        :param x: initial argument value.
+        :param y: initial state array [n_eq, ...] broadcast against the ensemble.
+        """
+
+        size = int(np.prod(y.shape[1:]))
+        self.t_events = [[] for _ in self.events]
+        self.y_events = [[] for _ in self.events]
+        self.m_events = [[] for _ in self.events]
+        self.x_terminal = np.full(size, np.inf)
+        self._y_terminal = np.empty((y.shape[0], size))
+        self._event_values = [np.broadcast_to(g(x, y), y.shape[1:]).astype(np.float64).reshape(-1)
+                              for g in self.events]
+
+    def locate_events(self, x0, y0, f0, x1, y1, f1):
+        """
+        locate_events(self, x0, y0, f0, x1, y1, f1)
+
+        Finds the zeros of the event functions on the step from x0 to x1 of the ensemble members which have not
+        stopped yet.
+
+        :param x0: argument at the step start.
+        :param y0: state at the step start.
+        :param f0: right-hand side at the step start.
+        :param x1: argument at the step end.
+        :param y1: state at the step end.
+        :param f1: right-hand side at the step end.
+        :return: "True", if every ensemble member has met a terminal event and the integration should stop.
+        """
+
+        if not self.events:
+            return False
+        values = [np.broadcast_to(g(x1, y1), y1.shape[1:]).astype(np.float64).reshape(-1) for g in self.events]
+        n_eq, d = y1.shape[0], x1 - x0
+        y0, f0, y1, f1 = (np.broadcast_to(a, y1.shape).reshape(n_eq, -1) for a in (y0, f0, y1, f1))
+        active = np.isinf(self.x_terminal)
+
+        def interpolant(x, members):
+            s = (x - x0) / d
+            return ((1 + 2 * s) * (1 - s) ** 2 * y0[:, members] + s * (1 - s) ** 2 * d * f0[:, members] +
+                    s ** 2 * (3 - 2 * s) * y1[:, members] - s ** 2 * (1 - s) * d * f1[:, members])
+
+        for k, g in enumerate(self.events):
+            g0, g1 = self._event_values[k], values[k]
+            self._event_values[k] = g1
+            direction = getattr(g, 'direction', 0)
+            rising, falling = (g0 < 0) & (g1 >= 0), (g0 > 0) & (g1 <= 0)
+            crossing = rising if direction > 0 else falling if direction < 0 else rising | falling
+            members = np.flatnonzero(crossing & active)
+            if not members.size:
+                continue
+
+            # bisection keeps g(lo) of the sign of g0 and g(hi) across zero
+            lo, hi = np.full(members.size, x0, dtype=np.float64), np.full(members.size, x1, dtype=np.float64)
+            sign = np.sign(g0[members])
+            xtol = 4 * np.finfo(np.float64).eps * max(abs(x0), abs(x1), 1)
+            while np.max(np.abs(hi - lo)) > xtol:
+                mid = (lo + hi) / 2
+                same = np.sign(np.asarray(g(mid, interpolant(mid, members)), dtype=np.float64)) == sign
+                lo, hi = np.where(same, mid, lo), np.where(same, hi, mid)
+
+            states = interpolant(hi, members)
+            self.t_events[k].append(hi)
+            self.y_events[k].append(states.T)
+            self.m_events[k].append(members)
+            if getattr(g, 'terminal', False):
+                first = hi < self.x_terminal[members]
+                self.x_terminal[members[first]] = hi[first]
+                self._y_terminal[:, members[first]] = states[:, first]
+
+        return np.all(np.isfinite(self.x_terminal))
+
+    def finish_events(self, x, states, derivatives):
+        """
+        finish_events(self, x, states, derivatives)
+
+        Collects the event records and freezes the ensemble members after their terminal events. When all of them
+        have stopped, the last step is cut at the last terminal event.
+
+        :param x: step points [n].
+        :param states: states at the step points [n, n_eq, ...].
+        :param derivatives: right-hand side values at the step points [n, n_eq, ...].
+        :return: step points, states and right-hand side values.
+        """
+
+        for k in range(len(self.events)):
+            t, y, m = (np.concatenate(self.t_events[k]) if self.t_events[k] else np.empty(0),
+                       np.concatenate(self.y_events[k]) if self.y_events[k] else np.empty((0, states.shape[1])),
+                       np.concatenate(self.m_events[k]) if self.m_events[k] else np.empty(0, dtype=np.intp))
+            kept = t <= self.x_terminal[m]  # zeros after the terminal event of a member within its last step
+            self.t_events[k], self.y_events[k], self.m_events[k] = t[kept], y[kept], m[kept]
+
+        stopped = np.isfinite(self.x_terminal)
+        if not stopped.any():
+            return x, states, derivatives
+
+        shape = states.shape
+        states, derivatives = states.reshape(len(x), shape[1], -1), derivatives.reshape(len(x), shape[1], -1)
+        if stopped.all():
+            keep = x < np.max(self.x_terminal)
+            x = np.append(x[keep], np.max(self.x_terminal))
+            states = np.concatenate((states[keep], self._y_terminal[np.newaxis]))
+            derivatives = np.concatenate((derivatives[keep], np.zeros((1,) + derivatives.shape[1:])))
+        frozen = (x[:, np.newaxis] >= self.x_terminal)[:, np.newaxis]
+        states = np.where(frozen, self._y_terminal, states)
+        derivatives = np.where(frozen, 0.0, derivatives)
+        return x, states.reshape((len(x),) + shape[1:]), derivatives.reshape((len(x),) + shape[1:])
+
+    def solution(self, cache=True, rhs_key=None):
+        """
+        solution(self, cache=True, rhs_key=None)
+
+        Solves the system once and returns its continuous solution. Solutions are memoized by the solver class, the
+        right-hand side functions, the initial values, the grid and the solver parameters, so asking again for the
+        same solution costs nothing; the arrays of a memoized solution (and self.x, self.state, self.derivatives) are
+        read-only. Right-hand sides depending on mutable external state should use cache=False.
+
+        :param cache: "True", to look up and store the solution in the memo.
+        :param rhs_key: tuple of scalars and arrays describing the right-hand side functions and the events, used in
+        the memo instead of the functions themselves; for right-hand sides built anew for every solve.
+        :return: OdeSolution.
+        """
+
+        key = None
+        if cache:
+            rhs = (self.foo, self.foo1, self.events) if rhs_key is None else tuple(_hashable(v) for v in rhs_key)
+            key = (type(self), rhs, self.order, self.n_eq, self.vectorized,
+                   self.x0, self.xf, len(self.grid), self.d, _hashable(self.y0), _hashable(self.dy0),
+                   tuple(_hashable(getattr(self, name)) for name in self.solver_params))
+            if key in _solution_cache:
+                _solution_cache.move_to_end(key)
+                solution = _solution_cache[key]
+                self.x, self.state, self.derivatives = solution.x, solution.states, solution.derivatives
+                self.n = len(solution.x)
+                self.n_steps = solution.n_steps
+                self.t_events, self.y_events, self.m_events, self.x_terminal = solution.events
+                self.nfev = 0
+                return solution
+
+        self.state = self.solve(self.rhs(), self.initial_state())
+        solution = OdeSolution(self.x, self.state, self.derivatives)
+        solution.nfev = self.nfev
+        solution.n_steps = self.n_steps
+        solution.events = (self.t_events, self.y_events, self.m_events, self.x_terminal)
+        if cache:
+            # the cached arrays are shared by every later hit, so they are frozen
+            for array in (solution.x, solution.states, solution.derivatives):
+                array.flags.writeable = False
+            _solution_cache[key] = solution
+            if len(_solution_cache) > _solution_cache_size:
+                _solution_cache.popitem(last=False)
+        return solution
+
+    def sensitivity(self, foo=None, p=(), h=1e-6):
+        """
+        sensitivity(self, foo=None, p=(), h=1e-6)
+
+        Sensitivities dY(x)/d(Y0, p) of the solution to the initial state and to the parameters of the right-hand side
+        by central differences. The unperturbed problem and all 2 (n_eq + k) perturbed ones form one ensemble, so they
+        are solved in a single batched run sharing the steps (and the step size control) of the solver.
+
+        :param foo: vectorised right-hand side foo(x, Y, *p) with k parameters; the right-hand side of the solver
+        if "None", then p is empty.
+        :param p: parameter values [k].
+        :param h: relative perturbation of the initial values and the parameters.
+        :return: states [n, n_eq] and sensitivities [n, n_eq, n_eq + k] over the grid.
+        """
+
+        state0 = self.initial_state()
+        if state0.ndim != 1:
+            raise ValueError("Sensitivities need a single initial state [n_eq], got shape {}".format(state0.shape))
+        values = np.concatenate((state0, np.asarray(p, dtype=np.float64)))
+        q = len(values)
+        steps = h * np.maximum(np.abs(values), 1)
+        # columns: the unperturbed point, then the + and the - perturbation of every value
+        batch = values[:, np.newaxis] + np.hstack((np.zeros((q, 1)), np.diag(steps), -np.diag(steps)))
+        params = tuple(batch[len(state0):])
+        rhs = self.rhs() if foo is None else (lambda x, y: foo(x, y, *params))
+
+        states = self.solve(rhs, batch[:len(state0)])
+        self.state = states[..., 0]
+        self.derivatives = self.derivatives[..., 0]
+        return self.state, (states[..., 1:q + 1] - states[..., q + 1:]) / (2 * steps)
+
     def predict(self, prnt=False, plot=False):
 
+        self.state = self.solve(self.rhs(), self.initial_state())
+        if plot:
+            import matplotlib.pyplot as plt
+
+        if self.vectorized:
+            self.y = self.state
+            if prnt:
+                for i in range(self.n):
+                    print(self.x[i], *np.ravel(self.state[i]))
+            if plot:
+                components = self.state.reshape(self.n, -1)
+                for i in range(components.shape[1]):
+                    plt.plot(self.x, components[:, i], "o", label=r"$y_{{{}}}$".format(i + 1))
+                plt.xlabel(r"$x$")
+                plt.ylabel(r"$y$")
+                plt.legend(bbox_to_anchor=(0., 1.02, 1., .102), loc=3, ncol=2, mode="expand", borderaxespad=0.)
+                plt.show()
+            return self.y, self.x
+
         if self.n_eq == 2 and self.order == 1:
-            self.y[0] = self.y0
-            self.y1[0] = self.y01
-            for i in range(1, self.n):
-                self.y[i] = self.d * (self.foo(self.x[i - 1], self.y[i - 1], self.y1[i - 1])) + self.y[i - 1]
-                self.y1[i] = self.d * (self.foo1(self.x[i - 1], self.y[i - 1], self.y1[i - 1])) + self.y1[i - 1]
+            self.y = self.state[:, 0]
+            self.y1 = self.state[:, 1]
             if prnt:
                 for i in range(self.n):
                     print(self.x[i], self.y[i], self.y1[i])
@@ -291,9 +1483,7 @@ class EulerMethod(NumericalMethods):
             return self.y, self.y1, self.x
 
         if self.order == 1 and self.n_eq == 1:
-            self.y[0] = self.y0
-            for i in range(1, self.n):
-                self.y[i] = self.d * (self.foo(self.x[i - 1], self.y[i - 1])) + self.y[i - 1]
+            self.y = self.state[:, 0]
             if prnt:
                 for i in range(self.n):
                     print(self.x[i], self.y[i])
@@ -305,12 +1495,9 @@ class EulerMethod(NumericalMethods):
                 plt.show()
             return self.y, self.x
 
-        if self.order == 2:
-            self.y[0] = self.y0
-            self.dy[0] = self.dy0
-            for i in range(1, self.n):
-                self.y[i] = self.d * self.dy[i - 1] + self.y[i - 1]
-                self.dy[i] = self.d * (self.foo(self.x[i - 1], self.y[i - 1], self.dy[i - 1])) + self.dy[i - 1]
+        if self.order >= 2:
+            self.y = self.state[:, 0]
+            self.dy = self.state[:, 1]
             if prnt:
                 for i in range(self.n):
                     print(self.x[i], self.y[i], self.dy[i])
@@ -325,8 +1512,255 @@ class EulerMethod(NumericalMethods):
             return self.y, self.dy, self.x
 
 
+class RungeKuttaMethod(EulerMethod):
+    """
+    Classic fourth order Runge-Kutta method on the fixed grid of fit. Same interface as EulerMethod; every step costs
+    four right-hand side evaluations.
+    """
+
+    def step(self, rhs, x, y, d, f=None):
+        """
+        step(self, rhs, x, y, d, f=None)
+
+        :param rhs: vectorised right-hand side.
+        :param x: argument value.
+        :param y: state array.
+        :param d: step.
+        :param f: already computed F(x, Y), optional.
+        :return: state array at x + d.
+        """
+
+        if f is None:
+            f = rhs(x, y)
+            self.nfev += 1
+        k2 = rhs(x + d / 2, y + d / 2 * f)
+        k3 = rhs(x + d / 2, y + d / 2 * k2)
+        k4 = rhs(x + d, y + d * k3)
+        self.nfev += 3
+        return y + d / 6 * (f + 2 * k2 + 2 * k3 + k4)
+
+
+class DormandPrinceMethod(EulerMethod):
+    """
+    Embedded Runge-Kutta 5(4) method of Dormand and Prince with adaptive step size control. The step of fit is only
+    the initial step: after predict, self.x holds the accepted step points and the states are returned there. The
+    step is shared by an ensemble and controlled by its worst member.
+    """
+
+    c = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+    a = [np.array([]),
+         np.array([1 / 5]),
+         np.array([3 / 40, 9 / 40]),
+         np.array([44 / 45, -56 / 15, 32 / 9]),
+         np.array([19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729]),
+         np.array([9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656])]
+    b = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+    e = np.array([71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40])  # b5 - b4
+    solver_params = ('rtol', 'atol', 'max_steps')
+
+    def __init__(self, foo, foo1=None, order=1, n_eq=1, vectorized=False, events=(), rtol=1e-6, atol=1e-9,
+                 max_steps=100000):
+        """
+        DormandPrinceMethod(foo, foo1=None, order=1, n_eq=1, vectorized=False, events=(), rtol=1e-6, atol=1e-9,
+                            max_steps=100000)
+
+        :param rtol: relative tolerance of the local error.
+        :param atol: absolute tolerance of the local error.
+        :param max_steps: maximal number of accepted and rejected steps.
+        """
+
+        EulerMethod.__init__(self, foo, foo1=foo1, order=order, n_eq=n_eq, vectorized=vectorized, events=events)
+        self.rtol = rtol
+        self.atol = atol
+        self.max_steps = max_steps
+        self.n_rejected = 0
+
+    def stages(self, rhs, x, y, d, f):
+        """
+        stages(self, rhs, x, y, d, f)
+
+        :param rhs: vectorised right-hand side.
+        :param x: argument value.
+        :param y: state array.
+        :param d: step.
+        :param f: F(x, Y).
+        :return: list of the seven stage derivatives (the last one is F at the new point) and the new state.
+        """
+
+        k = [f]
+        for i in range(1, 6):
+            k.append(rhs(x + self.c[i] * d, y + d * np.tensordot(self.a[i], np.stack(k), axes=1)))
+        y_new = y + d * np.tensordot(self.b, np.stack(k), axes=1)
+        k.append(rhs(x + d, y_new))
+        self.nfev += 6
+        return k, y_new
+
+    def error_norm(self, k, y, y_new, d):
+        """
+        error_norm(self, k, y, y_new, d)
+
+        :return: scaled RMS norm of the local error estimate over the state axis, the worst of the ensemble.
+        """
+
+        error = d * np.tensordot(self.e, np.stack(k), axes=1)
+        scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+        return np.max(np.sqrt(np.mean((error / scale) ** 2, axis=0)))
+
+    def solve(self, rhs, state0):
+        """
+        solve(self, rhs, state0)
+
+        :param rhs: vectorised right-hand side F(x, Y).
+        :param state0: initial state array [n_eq, ...].
+        :return: states array at the accepted step points [n, n_eq, ...].
+        """
+
+        x, xf = self.x0, self.xf
+        f = np.asarray(rhs(x, state0))
+        y = self.ensemble(state0, f).astype(np.float64)
+        self.nfev = 1
+        self.n_steps = 0
+        self.n_rejected = 0
+
+        xs, states, derivatives = [x], [y], [f]
+        self.init_events(x, y)
+        d = min(abs(self.d), abs(xf - x))
+        direction = np.sign(xf - x)
+        while direction * (xf - x) > 0:
+            if self.n_steps + self.n_rejected >= self.max_steps:
+                raise RuntimeError("Maximal number of steps {} is reached at x={}.".format(self.max_steps, x))
+            d = min(d, abs(xf - x))
+            k, y_new = self.stages(rhs, x, y, direction * d, f)
+            error = self.error_norm(k, y, y_new, d)
+            if error <= 1:
+                x_new = xf if d == abs(xf - x) else x + direction * d
+                stop = self.locate_events(x, y, f, x_new, y_new, k[-1])
+                x, y, f = x_new, y_new, k[-1]
+                xs.append(x)
+                states.append(y)
+                derivatives.append(f)
+                self.n_steps += 1
+                self.report((x - self.x0) / (xf - self.x0))
+                if stop:
+                    break
+                d *= min(5, 0.9 * error ** -0.2) if error > 0 else 5
+            else:
+                self.n_rejected += 1
+                d *= max(0.2, 0.9 * error ** -0.2)
+
+        self.x, states, self.derivatives = self.finish_events(np.array(xs), np.stack(states), np.stack(derivatives))
+        self.n = len(self.x)
+        return states
+
+
+class BackwardDifferentiationMethod(EulerMethod):
+    """
+    Implicit second order backward differentiation formula (BDF2, the first step is backward Euler) on the fixed grid
+    of fit, for stiff systems where explicit methods need tiny steps. Every step solves
+    Y_{n+1} - 4/3 Y_n + 1/3 Y_{n-1} = 2/3 d F(x_{n+1}, Y_{n+1}) by a simplified Newton method with one Jacobian per
+    step; the linear systems of an ensemble are solved in one batched call.
+    """
+
+    solver_params = ('jac', 'tol', 'max_iter')
+
+    def __init__(self, foo, foo1=None, order=1, n_eq=1, vectorized=False, events=(), jac=None, tol=1e-10,
+                 max_iter=10):
+        """
+        BackwardDifferentiationMethod(foo, foo1=None, order=1, n_eq=1, vectorized=False, events=(), jac=None,
+                                      tol=1e-10, max_iter=10)
+
+        :param jac: Jacobian J(x, Y) [n_eq, n_eq, ...] of the vectorised right-hand side, finite differences if "None".
+        :param tol: absolute tolerance of the Newton iterations.
+        :param max_iter: maximal number of Newton iterations per step; RuntimeError is raised if they do not converge.
+        """
+
+        EulerMethod.__init__(self, foo, foo1=foo1, order=order, n_eq=n_eq, vectorized=vectorized, events=events)
+        self.jac = jac
+        self.tol = tol
+        self.max_iter = max_iter
+        self.njev = 0
+        self.n_newton = 0
+
+    def jacobian(self, rhs, x, y, f):
+        """
+        jacobian(self, rhs, x, y, f)
+
+        :return: Jacobian dF/dY [n_eq, n_eq, ...] at (x, Y).
+        """
+
+        self.njev += 1
+        if self.jac is not None:
+            return np.asarray(self.jac(x, y), dtype=np.float64)
+        jac = np.empty((y.shape[0],) + y.shape)
+        for j in range(y.shape[0]):
+            e = np.sqrt(np.finfo(np.float64).eps) * (1 + np.abs(y[j]))
+            shifted = y.copy()
+            shifted[j] += e
+            jac[:, j] = (rhs(x, shifted) - f) / e
+        self.nfev += y.shape[0]
+        return jac
+
+    def solve(self, rhs, state0):
+        """
+        solve(self, rhs, state0)
+
+        :param rhs: vectorised right-hand side F(x, Y).
+        :param state0: initial state array [n_eq, ...].
+        :return: states array [n, n_eq, ...].
+        """
+
+        grid = self.grid
+        f = np.asarray(rhs(grid[0], state0))
+        self.nfev = 1
+        self.njev = 0
+        self.n_newton = 0
+        state0 = self.ensemble(state0, f)
+        state = np.empty((len(grid),) + state0.shape, dtype=np.float64)
+        self.derivatives = np.empty_like(state)
+        state[0] = state0
+        self.derivatives[0] = f
+        self.init_events(grid[0], state0)
+        n = len(grid)
+        eye = np.eye(state.shape[1]).reshape((state.shape[1], state.shape[1]) + (1,) * (state.ndim - 2))
+
+        for i in range(1, len(grid)):
+            x = grid[i]
+            if i == 1:
+                gamma, history = self.d, state[0]
+            else:
+                gamma, history = 2 / 3 * self.d, (4 * state[i - 1] - state[i - 2]) / 3
+            y = state[i - 1] + self.d * f  # explicit Euler predictor
+            f = rhs(x, y)
+            self.nfev += 1
+            # iteration matrix I - gamma * J, batch axes first for np.linalg.solve
+            matrix = np.moveaxis(eye - gamma * self.jacobian(rhs, x, y, f), (0, 1), (-2, -1))
+            for _ in range(self.max_iter):
+                residual = y - history - gamma * f
+                delta = np.linalg.solve(matrix, np.moveaxis(residual, 0, -1)[..., np.newaxis])[..., 0]
+                y = y - np.moveaxis(delta, -1, 0)
+                f = rhs(x, y)
+                self.nfev += 1
+                self.n_newton += 1
+                if np.max(np.abs(delta)) <= self.tol * (1 + np.max(np.abs(y))):
+                    break
+            else:
+                raise RuntimeError("Newton iterations did not converge in {} iterations at x={}, refine the grid or "
+                                   "increase max_iter.".format(self.max_iter, x))
+            state[i] = y
+            self.derivatives[i] = f
+            self.report(i / (len(grid) - 1))
+            if self.locate_events(grid[i - 1], state[i - 1], self.derivatives[i - 1], x, y, f):
+                n = i + 1
+                break
+        self.n_steps = n - 1
+        self.x, state, self.derivatives = self.finish_events(grid[:n], state[:n], self.derivatives[:n])
+        self.n = len(self.x)
+        return state
+
+
 if __name__ == "__main__":
 
+    import matplotlib.pyplot as plt
     from scipy.signal import square, sawtooth
 
     def linear(x):
@@ -0,0 +1,181 @@
+"""Optimization of the filter correction function parameters
+
+Notes
+-----
+Iterative search of the parameters of the correction function which minimise the quality criterion. Criterion
+values are cached by parameter tuple. Batches of candidates are solved as ensembles and split between the workers of
+a process pool.
+"""
+import os
+
+import numpy as np
+
+_worker_criterion = None
+
+
+def _init_worker(criterion):
+    global _worker_criterion
+    _worker_criterion = criterion
+
+
+def _evaluate_chunk(params):
+    return _worker_criterion.evaluate_batch(params)
+
+
+class CriterionOptimizer:
+
+    def __init__(self, criterion, n_jobs=None, chunk_size=64):
+        """
+        CriterionOptimizer(criterion, n_jobs=None, chunk_size=64)
+
+        :param criterion: QualityCriterion (anything with evaluate_batch(params [m, k]) -> values [m]).
+        :param n_jobs: number of worker processes, os.cpu_count() if "None", 1 evaluates in this process.
+        :param chunk_size: number of candidates solved as one ensemble by a worker.
+        """
+
+        self.criterion = criterion
+        self.n_jobs = (os.cpu_count() or 1) if n_jobs is None else n_jobs
+        self.chunk_size = chunk_size
+        self.cache = {}  # parameter tuple -> criterion value
+        self.n_evaluations = 0  # criterion values actually computed
+        self.best_params_ = None
+        self.best_value_ = np.inf
+        self.history_ = []  # best value after every iteration
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Shuts the process pool down."""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def evaluate(self, params):
+        """
+        evaluate(self, params)
+
+        Criterion values of the candidates. Cached values are reused; the rest is split into chunks of chunk_size
+        candidates, each solved as one ensemble, in the process pool (in this process for small batches).
+
+        :param params: candidate parameter vectors [m, k].
+        :return: criterion values [m].
+        """
+
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        keys = [tuple(p) for p in params]
+        todo = list(dict.fromkeys(key for key in keys if key not in self.cache))
+
+        if todo:
+            batch = np.array(todo)
+            chunks = [batch[i:i + self.chunk_size] for i in range(0, len(batch), self.chunk_size)]
+            if self.n_jobs == 1 or len(chunks) == 1:
+                values = [self.criterion.evaluate_batch(chunk) for chunk in chunks]
+            else:
+                if self._pool is None:
+                    from concurrent.futures import ProcessPoolExecutor  # multiprocessing is slow to import
+
+                    self._pool = ProcessPoolExecutor(self.n_jobs, initializer=_init_worker,
+                                                     initargs=(self.criterion,))
+                values = list(self._pool.map(_evaluate_chunk, chunks))
+            for key, value in zip(todo, np.concatenate(values)):
+                self.cache[key] = value
+            self.n_evaluations += len(todo)
+
+        values = np.array([self.cache[key] for key in keys])
+        best = np.argmin(values)
+        if values[best] < self.best_value_:
+            self.best_value_ = values[best]
+            self.best_params_ = params[best].copy()
+        return values
+
+    def grid_search(self, bounds, n=11):
+        """
+        grid_search(self, bounds, n=11)
+
+        :param bounds: (low, high) of every parameter.
+        :param n: number of grid points per parameter.
+        :return: best parameters found.
+        """
+
+        axes = [np.linspace(low, high, n) for low, high in bounds]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(bounds))
+        self.evaluate(grid)
+        self.history_.append(self.best_value_)
+        return self.best_params_
+
+    def random_search(self, bounds, n=100, seed=None):
+        """
+        random_search(self, bounds, n=100, seed=None)
+
+        :param bounds: (low, high) of every parameter.
+        :param n: number of uniformly drawn candidates.
+        :param seed: seed of numpy.random.default_rng.
+        :return: best parameters found.
+        """
+
+        bounds = np.asarray(bounds, dtype=np.float64)
+        rng = np.random.default_rng(seed)
+        self.evaluate(rng.uniform(bounds[:, 0], bounds[:, 1], (n, len(bounds))))
+        self.history_.append(self.best_value_)
+        return self.best_params_
+
+    def nelder_mead(self, x0, step=0.1, tol=1e-6, max_iter=200, patience=20):
+        """
+        nelder_mead(self, x0, step=0.1, tol=1e-6, max_iter=200, patience=20)
+
+        Gradient-free local search by the Nelder-Mead simplex method with early stopping: it stops when the simplex
+        values differ by less than tol or the best value has not improved by tol for patience iterations. The initial
+        simplex and every shrink are evaluated as one batch.
+
+        :param x0: initial parameter vector.
+        :param step: size of the initial simplex.
+        :param tol: absolute tolerance of the criterion value.
+        :param max_iter: maximal number of iterations.
+        :param patience: number of iterations without improvement before stopping.
+        :return: best parameters found.
+        """
+
+        x0 = np.atleast_1d(np.asarray(x0, dtype=np.float64))
+        k = len(x0)
+        simplex = np.vstack((x0, x0 + step * np.eye(k)))
+        values = self.evaluate(simplex)
+        best, stale = np.min(values), 0
+
+        for _ in range(max_iter):
+            order = np.argsort(values)
+            simplex, values = simplex[order], values[order]
+            if values[-1] - values[0] < tol or stale >= patience:
+                break
+
+            centroid = simplex[:-1].mean(axis=0)
+            reflected = centroid + (centroid - simplex[-1])
+            f_reflected = self.evaluate(reflected)[0]
+            if f_reflected < values[0]:
+                expanded = centroid + 2 * (centroid - simplex[-1])
+                f_expanded = self.evaluate(expanded)[0]
+                simplex[-1], values[-1] = (expanded, f_expanded) if f_expanded < f_reflected else \
+                    (reflected, f_reflected)
+            elif f_reflected < values[-2]:
+                simplex[-1], values[-1] = reflected, f_reflected
+            else:
+                contracted = centroid + 0.5 * (simplex[-1] - centroid)
+                f_contracted = self.evaluate(contracted)[0]
+                if f_contracted < values[-1]:
+                    simplex[-1], values[-1] = contracted, f_contracted
+                else:
+                    simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                    values[1:] = self.evaluate(simplex[1:])
+
+            if np.min(values) < best - tol:
+                best, stale = np.min(values), 0
+            else:
+                stale += 1
+            self.history_.append(self.best_value_)
+
+        return self.best_params_
@@ -1,28 +1,52 @@
-import random
-from scipy.stats import norm
+import re
+from itertools import count
+
 import numpy as np
 
+_clock = count(1)  # versions of the assigned parameters
+_graph_name = re.compile(r'^([xy])graph([1-5])$')
+
 
 class Params:
+    """
+    Lazily evaluated parameter store of the graphs. Every derived graph declares the parameters it depends on
+    (Params.dependencies) and is computed by the method compute_<name> on access, only if one of them has been
+    assigned since the last computation; otherwise the stored values are served. Assigning a derived graph (e.g. a
+    computed contour line) keeps it until its dependencies change. Parameters are tracked by assignment, so arrays
+    should be assigned rather than modified in place.
+
+    The graphs of a family (xgraph1..5, ygraph1..5) are rows of one preallocated float64 buffer [5, capacity], and
+    xgraph<k>, ygraph<k>, xgraphs and ygraphs are views of it. Assigning a graph copies the values into its row, so
+    every view sees the update; only a graph longer than the capacity reallocates the buffer, which detaches views
+    taken before.
+    """
+
+    dependencies = {
+        'ygraph1': ('xgraph1',),
+        'ygraph2': ('xgraph2', 'a2', 'b2', 'a3', 'rng'),
+        'ygraph3': ('xgraph3', 'a3', 'b3'),
+        'ygraph4': ('xgraph4',),
+    }
+
     def __init__(self,
                  xgraph1=None, xgraph2=None, xgraph3=None, xgraph4=None, xgraph5=None,
                  foo=None, mu=None, sigma=None, alpha=None, beta=None,
                  a1=None, b1=None,
                  a2=None, b2=None,
-                 a3=None, b3=None):
+                 a3=None, b3=None,
+                 seed=None):
+
+        object.__setattr__(self, '_versions', {})  # parameter -> version of its last assignment
+        object.__setattr__(self, '_cache', {})  # graph -> versions of its dependencies at its last update
+        capacity = max(len(x) if x is not None else 0 for x in (xgraph1, xgraph2, xgraph3, xgraph4, xgraph5))
+        object.__setattr__(self, 'buffers', {family: np.full((5, capacity), np.nan) for family in 'xy'})
+        object.__setattr__(self, '_lengths', {family: [0] * 5 for family in 'xy'})
 
         self.xgraph1 = xgraph1
         self.xgraph2 = xgraph2
         self.xgraph3 = xgraph3
         self.xgraph4 = xgraph4
         self.xgraph5 = xgraph5
-        self.ygraph1 = np.array([])
-        self.ygraph2 = np.array([])
-        self.ygraph3 = np.array([])
-        self.ygraph4 = np.array([])
-        self.ygraph5 = np.array([])
-        self.xgraphs = [self.xgraph1, self.xgraph2, self.xgraph3, self.xgraph4, self.xgraph5]
-        self.ygraphs = [self.ygraph1, self.ygraph2, self.ygraph3, self.xgraph4, self.xgraph5]
         self.foo = foo
         self.mu = mu
         self.sigma = sigma
@@ -34,13 +58,90 @@ class Params:
         self.b2 = b2
         self.a3 = a3
         self.b3 = b3
-        self.params = [self.a1, self.b1, self.a2, self.b2, self.a3, self.b3]
+        self.rng = np.random.default_rng(seed)  # noise of the traffic graph
 
-    def set_figure_params(self):
+    def __setattr__(self, name, value):
+        match = _graph_name.match(name)
+        if match is not None:
+            self._store(match.group(1), int(match.group(2)) - 1, value)
+        if name in self.dependencies:
+            self._cache[name] = self._snapshot(name)
+            return
+        self._versions[name] = next(_clock)
+        if match is None:
+            object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        # called for the graphs only, they are never instance attributes
+        match = _graph_name.match(name)
+        if match is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        family, i = match.group(1), int(match.group(2)) - 1
+        if name in self.dependencies and self.is_stale(name):
+            self._store(family, i, getattr(self, 'compute_' + name)())
+            self._cache[name] = self._snapshot(name)
+        return self.buffers[family][i, :self._lengths[family][i]]
+
+    def _store(self, family, i, value):
+        """
+        _store(self, family, i, value)
+
+        Copies the values of a graph into its row of the family buffer, growing the buffer if needed.
+        """
+
+        value = np.empty(0) if value is None else np.asarray(value, dtype=np.float64)
+        if value.ndim != 1:
+            raise ValueError("Graph {}graph{} should be a 1-D array, got shape {}.".format(family, i + 1, value.shape))
+        buffer = self.buffers[family]
+        if len(value) > buffer.shape[1]:
+            grown = np.full((5, max(len(value), 2 * buffer.shape[1])), np.nan)
+            grown[:, :buffer.shape[1]] = buffer
+            buffer = self.buffers[family] = grown
+        buffer[i, :len(value)] = value
+        self._lengths[family][i] = len(value)
+
+    def _snapshot(self, name):
+        return tuple(self._versions.get(parameter) for parameter in self.dependencies[name])
+
+    def is_stale(self, name):
+        """
+        is_stale(self, name)
+
+        :param name: derived graph name.
+        :return: "True", if the graph will be recomputed on the next access.
+        """
+
+        return self._cache.get(name) != self._snapshot(name)
+
+    @property
+    def xgraphs(self):
+        return [getattr(self, 'xgraph{}'.format(k)) for k in range(1, 6)]
+
+    @property
+    def ygraphs(self):
+        return [getattr(self, 'ygraph{}'.format(k)) for k in range(1, 6)]
+
+    @property
+    def params(self):
+        return [self.a1, self.b1, self.a2, self.b2, self.a3, self.b3]
+
+    def compute_ygraph1(self):
+        from scipy.stats import norm
+
+        return norm.pdf(self.xgraph1)
+
+    def compute_ygraph2(self):
         signal = self.a2 * np.cos(self.b2 * self.xgraph2) + self.a2
-        noise = [random.gauss(0, np.std(signal) / self.a3) for i in range(len(self.xgraph2))]
+        return signal + self.rng.normal(0, np.std(signal) / self.a3, len(self.xgraph2))
+
+    def compute_ygraph3(self):
+        return self.a3 * np.cos(self.b3 * self.xgraph3) + self.a3
+
+    def compute_ygraph4(self):
+        return self.xgraph4
+
+    def set_figure_params(self):
+        """Brings every derived graph up to date, recomputing only the stale ones."""
 
-        self.ygraph1 = norm.pdf(self.xgraph1)
-        self.ygraph2 = signal + noise
-        self.ygraph3 = self.a3 * np.cos(self.b3 * self.xgraph3) + self.a3
-        self.ygraph4 = self.xgraph4
+        for name in self.dependencies:
+            getattr(self, name)
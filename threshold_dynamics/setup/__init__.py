@@ -1,5 +1,6 @@
-from scipy.stats import norm
-from threshold_dynamics.params import *
+import numpy as np
+
+from threshold_dynamics.params import Params
 
 progname = "Numerical Methods Project"
 progversion = "0.1"
@@ -44,12 +45,21 @@ w – вероятность посетителя попасть в таргет
 – подбираемый параметр. 
 """
 
-figure_params = Params(xgraph1=np.arange(0.0, 1.0, 0.01),
-                       xgraph2=np.arange(0.0, 1.0, 0.01),
-                       xgraph3=np.arange(0.0, 1.0, 0.01),
-                       xgraph4=np.arange(0.0, 1.0, 0.01),
-                       xgraph5=np.arange(0.0, 1.0, 0.01),
-                       foo=norm.pdf, mu=0.5, sigma=0.1, alpha=0.5, beta=0.5,
-                       a1=1, b1=1,
-                       a2=1, b2=10,
-                       a3=5, b3=1)
+
+def __getattr__(name):
+    # figure_params is built on first access (PEP 562), so importing the setup loads neither scipy nor the graphs
+    if name == 'figure_params':
+        from scipy.stats import norm
+
+        global figure_params
+        figure_params = Params(xgraph1=np.arange(0.0, 1.0, 0.01),
+                               xgraph2=np.arange(0.0, 1.0, 0.01),
+                               xgraph3=np.arange(0.0, 1.0, 0.01),
+                               xgraph4=np.arange(0.0, 1.0, 0.01),
+                               xgraph5=np.arange(0.0, 1.0, 0.01),
+                               foo=norm.pdf, mu=0.5, sigma=0.1, alpha=0.5, beta=0.5,
+                               a1=1, b1=1,
+                               a2=1, b2=10,
+                               a3=5, b3=1)
+        return figure_params
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
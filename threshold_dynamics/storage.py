@@ -0,0 +1,142 @@
+"""Binary result store
+
+Notes
+-----
+A result is an uncompressed .npz file: every column (graph argument, values, solver states, spline coefficients)
+is its own .npy member, and the "__meta__" member holds a JSON header describing how the result was produced
+(kind, method, parameters, grid). Members of an uncompressed archive are stored as is, so load_result maps them
+straight from the file with numpy.memmap: loading a million-row set copies nothing and reads only the pages used.
+A plain .npy file loads as the single column "data". CSV is written only on an explicit export_csv.
+"""
+import json
+import struct
+import zipfile
+
+import numpy as np
+
+META = '__meta__'
+
+_header_readers = {(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}
+
+
+def _jsonable(value):
+    """
+    _jsonable(value)
+
+    :param value: metadata value.
+    :return: value with numpy arrays and scalars converted to lists and numbers, classes and functions to names.
+    """
+
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    if callable(value):
+        return getattr(value, '__name__', repr(value))
+    return value
+
+
+def save_result(fname, columns, **metadata):
+    """
+    save_result(fname, columns, **metadata)
+
+    :param fname: result file name, ".npz" is appended if missing.
+    :param columns: dict of column name and array.
+    :param metadata: description of the result, e.g. kind, method, parameters and grid; numpy values, classes and
+    functions are stored as numbers, lists and names.
+    :return: result file name.
+    """
+
+    if META in columns:
+        raise ValueError("Column name '{}' is reserved for the metadata.".format(META))
+    fname = str(fname)
+    fname = fname if fname.endswith('.npz') else fname + '.npz'
+    arrays = {name: np.ascontiguousarray(value) for name, value in columns.items()}
+    arrays[META] = np.array(json.dumps(_jsonable(metadata)))
+    np.savez(fname, **arrays)
+    return fname
+
+
+def _map_member(f, fname, info, mmap_mode):
+    """
+    _map_member(f, fname, info, mmap_mode)
+
+    :return: memory map of an uncompressed .npy member of a zip archive, "None" if it cannot be mapped.
+    """
+
+    # the data starts after the local file header (30 bytes, name and extra field) and the .npy header
+    f.seek(info.header_offset)
+    local = f.read(30)
+    name_length, extra_length = struct.unpack('<HH', local[26:30])
+    f.seek(info.header_offset + 30 + name_length + extra_length)
+    version = np.lib.format.read_magic(f)
+    if version not in _header_readers:
+        return None
+    shape, fortran_order, dtype = _header_readers[version](f)
+    if dtype.hasobject or 0 in shape:
+        return None
+    return np.memmap(fname, dtype=dtype, mode=mmap_mode, offset=f.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def load_result(fname, mmap_mode='r'):
+    """
+    load_result(fname, mmap_mode='r')
+
+    :param fname: .npz result or .npy file name.
+    :param mmap_mode: 'r' (read-only) or 'c' (copy-on-write) memory maps of the columns, "None" reads them into
+    memory.
+    :return: dict of column name and array, metadata dict.
+    """
+
+    if mmap_mode not in ('r', 'c', None):
+        raise ValueError("Result columns can be mapped with mmap_mode 'r' or 'c' only, got '{}'.".format(mmap_mode))
+    fname = str(fname)
+    if fname.endswith('.npy'):
+        return {'data': np.load(fname, mmap_mode=mmap_mode)}, {}
+
+    columns, metadata = {}, {}
+    with zipfile.ZipFile(fname) as archive, open(fname, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            column = None
+            if name != META and mmap_mode is not None and info.compress_type == zipfile.ZIP_STORED:
+                column = _map_member(f, fname, info, mmap_mode)
+            if column is None:
+                with archive.open(info) as member:
+                    column = np.lib.format.read_array(member, allow_pickle=False)
+            if name == META:
+                metadata = json.loads(str(column))
+            else:
+                columns[name] = column
+    return columns, metadata
+
+
+def export_csv(fname, columns, names=None, delimiter=','):
+    """
+    export_csv(fname, columns, names=None, delimiter=',')
+
+    Writes columns of equal length as a CSV table; a multidimensional column [n, ...] becomes the columns
+    <name>_0, <name>_1, ...
+
+    :param fname: CSV file name.
+    :param columns: dict of column name and array.
+    :param names: names of the exported columns, all if "None".
+    :param delimiter: delimiter of the values.
+    :return: CSV file name.
+    """
+
+    names = list(columns) if names is None else names
+    table, header = [], []
+    for name in names:
+        column = np.asarray(columns[name])
+        column = column.reshape(len(column), -1)
+        table.append(column)
+        header.extend([name] if column.shape[1] == 1 else ['{}_{}'.format(name, i) for i in range(column.shape[1])])
+    if len({len(column) for column in table}) > 1:
+        raise ValueError("Exported columns should have equal lengths, got {}.".format(
+            {name: len(column) for name, column in zip(names, table)}))
+    np.savetxt(fname, np.hstack(table), delimiter=delimiter, header=delimiter.join(header))
+    return fname
@@ -0,0 +1,185 @@
+"""Parameter sweeps of the quality criterion
+
+Notes
+-----
+C(beta) over 1-D and 2-D parameter grids for the "Contour Line" mode. The grid is split into chunks of flat indices;
+every chunk is solved as one ensemble by a worker of a process pool, which writes its values straight into a
+memory-mapped .npy result file. Unfinished points are NaN, so an interrupted sweep resumes where it stopped. The
+<file>.json sidecar records a fingerprint of the axes and the criterion; a result file of another grid or
+criterion is started over instead of resumed.
+"""
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+from threshold_dynamics.numerical_methods import Cancelled
+
+_worker_criterion = None
+
+
+def _init_worker(criterion):
+    global _worker_criterion
+    _worker_criterion = criterion
+
+
+def _sweep_chunk(fname, axes, start, stop, criterion=None):
+    """
+    _sweep_chunk(fname, axes, start, stop, criterion=None)
+
+    Evaluates the grid points with flat indices [start, stop) and writes them into the memory-mapped result.
+
+    :return: start and stop.
+    """
+
+    criterion = criterion or _worker_criterion
+    result = np.load(fname, mmap_mode='r+')
+    index = np.unravel_index(np.arange(start, stop), result.shape)
+    params = np.stack([axis[i] for axis, i in zip(axes, index)], axis=1)
+    result.reshape(-1)[start:stop] = criterion.evaluate_batch(params)
+    result.flush()
+    return start, stop
+
+
+class ParameterSweep:
+
+    def __init__(self, criterion, axes, fname=None, chunk_size=256, n_jobs=None, start_method=None):
+        """
+        ParameterSweep(criterion, axes, fname=None, chunk_size=256, n_jobs=None, start_method=None)
+
+        :param criterion: QualityCriterion (anything with evaluate_batch(params [m, k]) -> values [m]).
+        :param axes: list of 1-D parameter grids, one per swept parameter.
+        :param fname: .npy file of the results; an existing file of the same axes and criterion is resumed, any other
+        is overwritten. A temporary file if "None".
+        :param chunk_size: number of grid points per work unit.
+        :param n_jobs: number of worker processes, os.cpu_count() if "None", 1 evaluates in this process.
+        :param start_method: multiprocessing start method of the workers, the platform default if "None"; use
+        'spawn' or 'forkserver' from multithreaded processes (e.g. the GUI), where forking may deadlock.
+        """
+
+        self.criterion = criterion
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        self.shape = tuple(len(axis) for axis in self.axes)
+        if fname is None:
+            import tempfile
+
+            handle, fname = tempfile.mkstemp(suffix='.npy')
+            os.close(handle)
+            os.remove(fname)
+        self.fname = fname
+        self.chunk_size = chunk_size
+        self.n_jobs = (os.cpu_count() or 1) if n_jobs is None else n_jobs
+        self.start_method = start_method
+        self.fingerprint = self.make_fingerprint()
+
+    def make_fingerprint(self):
+        """
+        make_fingerprint(self)
+
+        :return: hex digest of the axes and the criterion (its fingerprint method, or its pickle), "None" if the
+        criterion cannot be pickled; a sweep without a fingerprint never resumes.
+        """
+
+        digest = hashlib.sha256()
+        for axis in self.axes:
+            digest.update(np.array(axis.shape).tobytes() + axis.tobytes())
+        try:
+            fingerprint = getattr(self.criterion, 'fingerprint', None)
+            digest.update(fingerprint().encode() if fingerprint is not None else pickle.dumps(self.criterion))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+        return digest.hexdigest()
+
+    @property
+    def sidecar(self):
+        return self.fname + '.json'
+
+    def resumable(self):
+        """
+        resumable(self)
+
+        :return: "True", if the result file exists and was written for the same axes and criterion.
+        """
+
+        if self.fingerprint is None or not os.path.exists(self.fname) or not os.path.exists(self.sidecar):
+            return False
+        with open(self.sidecar) as f:
+            return json.load(f).get('fingerprint') == self.fingerprint
+
+    def result(self):
+        """
+        result(self)
+
+        :return: memory-mapped result array of the grid shape, created and filled with NaN if needed.
+        """
+
+        if self.resumable():
+            result = np.load(self.fname, mmap_mode='r+')
+            if result.shape == self.shape and result.dtype == np.float64:
+                return result
+        result = np.lib.format.open_memmap(self.fname, mode='w+', dtype=np.float64, shape=self.shape)
+        result[...] = np.nan
+        result.flush()
+        with open(self.sidecar, 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'shape': self.shape}, f)
+        return result
+
+    def remove(self):
+        """Deletes the result file and its sidecar."""
+
+        for fname in (self.fname, self.sidecar):
+            if os.path.exists(fname):
+                os.remove(fname)
+
+    def pending(self):
+        """
+        pending(self)
+
+        :return: list of (start, stop) flat index ranges with unfinished points.
+        """
+
+        flat = np.isnan(self.result()).reshape(-1)
+        size = len(flat)
+        return [(start, min(start + self.chunk_size, size)) for start in range(0, size, self.chunk_size)
+                if flat[start:start + self.chunk_size].any()]
+
+    def run(self, callback=None):
+        """
+        run(self, callback=None)
+
+        Evaluates the unfinished chunks of the grid.
+
+        :param callback: function called with the number of finished and all chunks after every chunk, optional;
+        if it returns "True", the unstarted chunks are dropped and Cancelled is raised (finished chunks are kept in
+        the result file, so the sweep can be resumed).
+        :return: memory-mapped result array of the grid shape.
+        """
+
+        chunks = self.pending()
+        if self.n_jobs == 1 or len(chunks) <= 1:
+            for done, (start, stop) in enumerate(chunks, 1):
+                _sweep_chunk(self.fname, self.axes, start, stop, self.criterion)
+                self.report(callback, done, len(chunks))
+        else:
+            import multiprocessing  # slow to import
+            from concurrent.futures import ProcessPoolExecutor
+
+            context = None if self.start_method is None else multiprocessing.get_context(self.start_method)
+            with ProcessPoolExecutor(self.n_jobs, mp_context=context, initializer=_init_worker,
+                                     initargs=(self.criterion,)) as pool:
+                futures = [pool.submit(_sweep_chunk, self.fname, self.axes, start, stop) for start, stop in chunks]
+                try:
+                    for done, future in enumerate(futures, 1):
+                        future.result()
+                        self.report(callback, done, len(chunks))
+                except Cancelled:
+                    pool.shutdown(cancel_futures=True)
+                    raise
+        return np.load(self.fname, mmap_mode='r')
+
+    @staticmethod
+    def report(callback, done, total):
+        if callback is not None and callback(done, total):
+            raise Cancelled("Sweep was cancelled after {} of {} chunks.".format(done, total))
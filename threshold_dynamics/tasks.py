@@ -0,0 +1,176 @@
+"""Computations behind the program modes
+
+Notes
+-----
+Plain functions of arrays and numbers, free of Qt and of the global figure parameters, so they can run in worker
+threads and without the GUI. Every one takes an optional progress(fraction) callback which is passed to the
+numerical methods; returning "True" from it cancels the computation with numerical_methods.Cancelled.
+"""
+
+import numpy as np
+
+from threshold_dynamics.criterion import QualityCriterion
+from threshold_dynamics.model import ThresholdDynamicsModel
+from threshold_dynamics.numerical_methods import (NumericalIntegration, CubicSplineInterpolation, DormandPrinceMethod)
+from threshold_dynamics.sweep import ParameterSweep
+
+
+def distribution_params(distribution, mu=0.5, sigma=0.1, alpha=0.5, beta=0.5):
+    """
+    distribution_params(distribution, mu=0.5, sigma=0.1, alpha=0.5, beta=0.5)
+
+    Maps the parameters of the distribution settings onto a scipy.stats distribution: the Beta distribution takes
+    alpha and beta as its shapes, the log-normal one has the shape sigma and the scale exp(mu) (mu and sigma of the
+    logarithm), the others are shifted by mu and scaled by sigma, with alpha and beta for their shapes if any.
+
+    :param distribution: scipy.stats distribution or its pdf method.
+    :return: shape parameters, loc and scale.
+    """
+
+    name = getattr(getattr(distribution, '__self__', distribution), 'name', None)
+    if name == 'beta':
+        return (alpha, beta), 0.0, 1.0
+    if name == 'lognorm':
+        return (sigma,), 0.0, float(np.exp(mu))
+    numargs = getattr(getattr(distribution, '__self__', distribution), 'numargs', 0)
+    return (alpha, beta)[:numargs], mu, sigma
+
+
+def distribution_integral(distribution, a, b, args=(), loc=0.0, scale=1.0, x=None, progress=None):
+    """
+    distribution_integral(distribution, a, b, args=(), loc=0.0, scale=1.0, x=None, progress=None)
+
+    :param distribution: scipy.stats distribution of the audience, or its vectorised density.
+    :param a: lower limit.
+    :param b: upper limit.
+    :param args: shape parameters of the distribution.
+    :param loc: location of the distribution.
+    :param scale: scale of the distribution.
+    :param x: grid the CDF of a density is tabulated on.
+    :param progress: progress callback.
+    :return: integral of the density over [a, b].
+    """
+
+    ni = NumericalIntegration()
+    ni.progress = progress
+    ni.fit_distribution(distribution, args=tuple(args), loc=loc, scale=scale, x=x)
+    value = ni.distribution_integral(a, b)
+    ni.report(1.0)
+    return value
+
+
+def spline_interpolation(x, y, h=0.001, form='symmetric', chunk_size=65536, progress=None):
+    """
+    spline_interpolation(x, y, h=0.001, form='symmetric', chunk_size=65536, progress=None)
+
+    :param x: knots.
+    :param y: function values at the knots.
+    :param h: sampling rate of the interpolated graph.
+    :param form: form of the cubic spline.
+    :param chunk_size: number of points evaluated at a time.
+    :param progress: progress callback, called after every chunk.
+    :return: fitted CubicSplineInterpolation, argument and function values of the interpolated graph.
+    """
+
+    spline = CubicSplineInterpolation(form)
+    spline.progress = progress
+    spline.fit(y, x)
+    yc, xc = np.empty(spline.grid_size(h)), np.empty(spline.grid_size(h))
+    start = 0
+    for y_chunk, x_chunk in spline.predict_chunks(h, chunk_size):
+        yc[start:start + len(y_chunk)], xc[start:start + len(x_chunk)] = y_chunk, x_chunk
+        start += len(y_chunk)
+    return spline, xc, yc
+
+
+def spline_coefficients(spline):
+    """
+    spline_coefficients(spline)
+
+    :param spline: fitted CubicSplineInterpolation.
+    :return: table [n-1, k] of the coefficients of every interval (a, b, c, d or k_i, k_{i+1}, a, b).
+    """
+
+    if spline.form == 'usual':
+        return np.stack((spline.a, spline.b, spline.c, spline.d), axis=1)
+    return np.stack((spline.k[:-1], spline.k[1:], spline.a, spline.b), axis=1)
+
+
+def threshold_model(visits, schedule, y0=0.5, beta=0.5, T=1.0, mu=0.5, sigma=0.1):
+    """
+    threshold_model(visits, schedule, y0=0.5, beta=0.5, T=1.0, mu=0.5, sigma=0.1)
+
+    Builds the model from the graphs: the traffic z(t) accumulates the visits, the plan S(t) follows the cumulative
+    schedule and asks for the volume reachable with the initial threshold.
+
+    :param visits: visits rate samples over [0, T].
+    :param schedule: placement schedule samples over [0, T].
+    :param y0: initial threshold.
+    :param beta: parameter of the correction function.
+    :param T: duration of the placement.
+    :param mu: mean of the normal audience distribution.
+    :param sigma: deviation of the normal audience distribution.
+    :return: ThresholdDynamicsModel.
+    """
+
+    from scipy.stats import norm
+
+    t = np.linspace(0, T, len(visits))
+    ni = NumericalIntegration()
+    z = ni.cumulative_trapezium_method(np.abs(visits), t).copy()
+    plan = ni.cumulative_trapezium_method(schedule, t).copy()
+    ni.fit_distribution(norm, loc=mu, scale=sigma)
+    s = ni.tail_share(y0) * z[-1] * plan / plan[-1]
+    return ThresholdDynamicsModel(t, z, s, beta=beta, rho=lambda w: norm.pdf(w, loc=mu, scale=sigma))
+
+
+def cauchy_problem(visits, schedule, x0=0.0, y0=0.5, beta=0.5, T=1.0, mu=0.5, sigma=0.1,
+                   method=DormandPrinceMethod, progress=None, cache=True, **solver_params):
+    """
+    cauchy_problem(visits, schedule, x0=0.0, y0=0.5, beta=0.5, T=1.0, mu=0.5, sigma=0.1,
+                   method=DormandPrinceMethod, progress=None, cache=True, **solver_params)
+
+    The model is built anew for every call, so its solutions are memoized by the graphs and the parameters of the
+    model; solving the same problem again returns the memoized solution without calling progress.
+
+    :param progress: progress callback, called after every solver step.
+    :param cache: "True", to use the solution memo of the solver.
+    :return: OdeSolution of x, y and q.
+    """
+
+    model = threshold_model(visits, schedule, y0, beta, T, mu, sigma)
+    de = model.solver(x0=x0, y0=y0, T=T, method=method, **solver_params)
+    de.progress = progress
+    return de.solution(cache=cache, rhs_key=('threshold_model', visits, schedule, y0, beta, T, mu, sigma))
+
+
+def contour_line(visits, schedule, betas, x0=0.0, y0=0.5, T=1.0, mu=0.5, sigma=0.1, fname=None, n_jobs=None,
+                 chunk_size=16, start_method=None, progress=None, **criterion_params):
+    """
+    contour_line(visits, schedule, betas, x0=0.0, y0=0.5, T=1.0, mu=0.5, sigma=0.1, fname=None, n_jobs=None,
+                 chunk_size=16, start_method=None, progress=None, **criterion_params)
+
+    :param betas: grid of the correction parameter.
+    :param fname: scratch .npy file of the sweep, resumed if it holds a sweep of the same grid and criterion and
+    deleted once the sweep finishes; a temporary file if "None".
+    :param n_jobs: number of worker processes of the sweep.
+    :param chunk_size: number of grid points per work unit.
+    :param start_method: multiprocessing start method of the workers, see ParameterSweep.
+    :param progress: progress callback, called after every chunk.
+    :param criterion_params: parameters of QualityCriterion.
+    :return: criterion values C(beta).
+    """
+
+    model = threshold_model(visits, schedule, y0, 0.5, T, mu, sigma)
+    criterion = QualityCriterion(model, x0=x0, y0=y0, T=T, **criterion_params)
+    sweep = ParameterSweep(criterion, [betas], fname=fname, chunk_size=chunk_size, n_jobs=n_jobs,
+                           start_method=start_method)
+    callback = None if progress is None else (lambda done, total: progress(done / total))
+    try:
+        values = np.array(sweep.run(callback))
+    except BaseException:
+        if fname is None:
+            sweep.remove()
+        raise
+    sweep.remove()
+    return values
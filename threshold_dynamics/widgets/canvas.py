@@ -8,7 +8,13 @@ from threshold_dynamics.setup import figure_params
 
 class MyMplCanvas(FigureCanvas):
 
-    """Ultimately, this is a QWidget (as well as a FigureCanvasAgg, etc.)."""
+    """Ultimately, this is a QWidget (as well as a FigureCanvasAgg, etc.).
+
+    Lines are animated Line2D artists kept between updates: a full draw renders the static part (axes, title,
+    labels, legend), caches it as the background and draws the lines over it. update_data then only moves the lines
+    with set_data and blits them over the cached background; a full draw is needed only when the data leave the view
+    or the texts change.
+    """
 
     def __init__(self, x, y, title, xlabel, ylabel, pen, parent=None, width=5, height=4, dpi=100):
         self.x = x
@@ -17,6 +23,8 @@ class MyMplCanvas(FigureCanvas):
         self.xlabel = xlabel
         self.ylabel = ylabel
         self.pen = pen
+        self.lines = []  # persistent Line2D artists
+        self.background = None  # static part of the axes cached by the last full draw
 
         fig = Figure(figsize=(width, height), dpi=dpi)
         self.axes = fig.add_subplot(111)
@@ -25,29 +33,86 @@ class MyMplCanvas(FigureCanvas):
         self.setParent(parent)
         FigureCanvas.setSizePolicy(self, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
         FigureCanvas.updateGeometry(self)
+        self.mpl_connect('draw_event', self.on_draw)
+
+    def line_data(self):
+        try:
+            return [(self.x[i], self.y[i]) for i in range(self.x.shape[1])]
+        except IndexError:
+            return [(self.x, self.y)]
 
     def compute_initial_figure(self):
         self.axes.set_title(self.title)
         self.axes.set_xlabel(self.xlabel)
         self.axes.set_ylabel(self.ylabel)
-        try:
-            for i in range(self.x.shape[1]):
-                self.axes.plot(self.x[i], self.y[i], self.pen)
-        except IndexError:
-            self.axes.plot(self.x, self.y, self.pen, label="some stuff")
+        data = self.line_data()
+        self.lines = []
+        for x, y in data:
+            self.lines += self.axes.plot(x, y, self.pen, animated=True,
+                                         label="some stuff" if len(data) == 1 else None)
         self.axes.legend(bbox_to_anchor=(1.05, 1), loc=2, borderaxespad=0.)
 
+    def on_draw(self, event):
+
+        """Cache the background after a full draw and draw the lines over it"""
+
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for line in self.lines:
+            self.axes.draw_artist(line)
+
+    def in_view(self):
+
+        """Whether all lines fit into the current axes limits"""
+
+        (x0, x1), (y0, y1) = sorted(self.axes.get_xlim()), sorted(self.axes.get_ylim())
+        for line in self.lines:
+            x, y = np.asarray(line.get_xdata(), dtype=float), np.asarray(line.get_ydata(), dtype=float)
+            if x.size and (np.nanmin(x) < x0 or np.nanmax(x) > x1 or np.nanmin(y) < y0 or np.nanmax(y) > y1):
+                return False
+        return True
+
+    def update_data(self, x, y):
+
+        """Move the lines to new data, blitting them over the cached background if they stay in view"""
+
+        self.x = x
+        self.y = y
+        data = self.line_data()
+        if len(data) != len(self.lines):
+            self.redraw()
+            return
+        for line, (x, y) in zip(self.lines, data):
+            line.set_data(x, y)
+        if self.background is None or not self.in_view():
+            self.axes.relim()
+            self.axes.autoscale_view()
+            self.draw_idle()  # the draw event caches the new background
+            return
+        self.restore_region(self.background)
+        self.draw_lines()
+        self.blit(self.axes.bbox)
+
+    def redraw(self):
+        self.axes.cla()
+        self.compute_initial_figure()
+        self.draw()
+
     def update_figure(self, x, y, title=None, xlabel=None, ylabel=None, pen=None):
-        self.x = x or self.x
-        self.y = y or self.y
+        texts = (self.title, self.xlabel, self.ylabel, self.pen)
         self.title = title or self.title
         self.xlabel = xlabel or self.xlabel
         self.ylabel = ylabel or self.ylabel
         self.pen = pen or self.pen
 
-        self.axes.cla()
-        self.compute_initial_figure()
-        self.draw()
+        if texts == (self.title, self.xlabel, self.ylabel, self.pen):
+            self.update_data(self.x if x is None else x, self.y if y is None else y)
+            return
+        self.x = self.x if x is None else x
+        self.y = self.y if y is None else y
+        self.redraw()
 
 
 # class MyDynamicMplCanvas(MyMplCanvas):
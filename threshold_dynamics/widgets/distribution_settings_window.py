@@ -1,6 +1,5 @@
 import sys
 from PyQt5 import QtWidgets, QtCore
-from scipy.stats import norm, lognorm, laplace, beta
 
 from threshold_dynamics.setup import figure_params
 
@@ -123,6 +122,7 @@ class DistributionSettingWindow(QtWidgets.QMainWindow):
                     widget.show()
 
     def apply_changes(self):
+        from scipy.stats import norm, lognorm, laplace, beta
 
         if self.mu_line_edit.text() != '':
             figure_params.mu = float(self.mu_line_edit.text())
@@ -0,0 +1,53 @@
+import threading
+
+from PyQt5 import QtCore
+
+from threshold_dynamics.numerical_methods import Cancelled
+
+
+class JobSignals(QtCore.QObject):
+
+    """Signals of a job; they are delivered to the main thread"""
+
+    progress = QtCore.pyqtSignal(float)
+    result = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+    finished = QtCore.pyqtSignal()
+
+
+class Job(QtCore.QRunnable):
+
+    """Runs fn(*args, progress=callback, **kwargs) in a thread of a QThreadPool.
+
+    The callback emits the progress signal and returns "True" once cancel has been requested, so the numerical
+    methods stop at their next progress report. fn must not touch widgets or the global figure parameters: inputs
+    are copied when the job is created and results come back through the result signal.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super(Job, self).__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancel = threading.Event()
+
+    def progress(self, fraction):
+        self.signals.progress.emit(fraction)
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, progress=self.progress, **self.kwargs)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            self.signals.error.emit("{}: {}".format(type(error).__name__, error))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
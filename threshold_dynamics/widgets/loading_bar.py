@@ -1,42 +1,57 @@
 import sys
-import time
-from PyQt5 import QtWidgets, QtCore
+from PyQt5 import QtWidgets
 
 
 class LoadingBar(QtWidgets.QWidget):
+
+    """Progress of the running job with a cancel button, hidden while no job runs"""
+
     def __init__(self, parent=None):
         super().__init__(parent)
 
-        self.update = 0
+        self.job = None
 
         # Init loading bar widget
+        self.bar_layout = QtWidgets.QHBoxLayout(self)
+        self.label = QtWidgets.QLabel()
         self.pbar = QtWidgets.QProgressBar(self)
-        self.pbar.setGeometry(30, 40, 200, 25)
-
-        # # Set timer
-        self.timer = QtCore.QBasicTimer()
-        self.step = 0
-        self.timer.start(100, self)
-
-        # Set window properties
-        self.setWindowTitle('QProgressBar')
+        self.pbar.setRange(0, 100)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel)
+        self.bar_layout.addWidget(self.label)
+        self.bar_layout.addWidget(self.pbar)
+        self.bar_layout.addWidget(self.cancel_button)
+        self.hide()
+
+    def start(self, job, title=""):
+        self.job = job
+        self.label.setText(title)
+        self.pbar.setValue(0)
+        self.cancel_button.setEnabled(True)
+        job.signals.progress.connect(self.set_progress)
+        job.signals.finished.connect(self.finish)
         self.show()
 
-    def timerEvent(self, e):
-        if self.step >= 100:
-            self.timer.stop()
-            self.close()
-            return
+    def set_progress(self, fraction):
+        self.pbar.setValue(int(round(100 * fraction)))
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.cancel_button.setEnabled(False)
 
-        self.step += self.update
-        self.update = 0
-        self.pbar.setValue(self.step)
+    def finish(self):
+        self.job = None
+        self.hide()
 
-    def update_timer(self, steps):
-        self.update = steps
+    @property
+    def busy(self):
+        return self.job is not None
 
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
     lb = LoadingBar()
-    sys.exit(app.exec_())
\ No newline at end of file
+    lb.show()
+    lb.set_progress(0.5)
+    sys.exit(app.exec_())
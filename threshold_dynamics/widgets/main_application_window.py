@@ -1,11 +1,12 @@
 from __future__ import unicode_literals
 
+import os
 import time
 from PyQt5 import QtGui
-from scipy.stats import norm, beta, lognorm, laplace
 
-from threshold_dynamics.numerical_methods import (NumericalIntegration, CubicSplineInterpolation, EulerMethod)
+from threshold_dynamics import RESULTS_PATH, loader, tasks, storage
 from threshold_dynamics.widgets.canvas import *
+from threshold_dynamics.widgets.jobs import Job
 from threshold_dynamics.widgets.loading_bar import LoadingBar
 from threshold_dynamics.setup import proginfo
 
@@ -15,8 +16,10 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
     def __init__(self, parent=None):
         super(MainApplicationWindow, self).__init__(parent)
 
-        # Init loading bar
+        # Init loading bar and the pool of the background jobs
         self.loading = LoadingBar()
+        self.pool = QtCore.QThreadPool.globalInstance()
+        self.results = {}  # result name -> columns of the last computed results, for the CSV export
 
         # Set window properties
         self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
@@ -25,6 +28,7 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
 
         # Set menu
         self.file_menu = QtWidgets.QMenu('&File', self)
+        self.file_menu.addAction('&Export CSV...', self.export_result)
         self.file_menu.addAction('&Quit', self.file_quit,
                                  QtCore.Qt.CTRL + QtCore.Qt.Key_Q)
         self.menuBar().addMenu(self.file_menu)
@@ -46,6 +50,7 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
         self.de_layout = QtWidgets.QHBoxLayout()
         self.intgr_layout = QtWidgets.QHBoxLayout()
         self.de_params = QtWidgets.QHBoxLayout()
+        self.cl_layout = QtWidgets.QHBoxLayout()
         # 2. Canvases
         figure_params.set_figure_params()
         self.sc = MyMplCanvas(
@@ -75,9 +80,9 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
         self.dbc = MyMplCanvas(
             x=figure_params.xgraph4,
             y=figure_params.ygraph4,
-            title=r"Distribution of the audience by the probability of hitting the target.",
-            xlabel=r'\omega',
-            ylabel=r"$\rho(\omega) = a + \sin(b + \omega)$",
+            title=r"$C(\beta)$",
+            xlabel=r'$\beta$',
+            ylabel=r"$C(\beta)$",
             pen="g",
         )
         # 3. Button name
@@ -86,6 +91,7 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
         self.sco = QtWidgets.QPushButton("Save Coefficients")
         self.de = QtWidgets.QPushButton("Solve Differential Equation")
         self.sder = QtWidgets.QPushButton("Save Result")
+        self.cl = QtWidgets.QPushButton("Calculate Contour Line")
         self.fo = QtWidgets.QPushButton("Get Discrete Set")
         self.b1 = QtWidgets.QPushButton("Months Statistics")
         self.b2 = QtWidgets.QPushButton("Alignment With The Plan")
@@ -134,7 +140,7 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
                         self.l_a2, self.le_a2, self.l_b2, self.le_b2, self.dc, self.ac2, self.us2, self.ss2]
         self.win2obj = [self.l_a3, self.le_a3, self.l_b3, self.le_b3, self.mc, self.ac3, self.us3, self.ss3]
         self.win3obj = [self.de, self.sder, self.x0, self.y0, self.beta, self.T, self.le_x0, self.le_y0, self.le_beta, self.le_T]
-        self.win4obj = [self.dbc]
+        self.win4obj = [self.dbc, self.cl]
         self.win5obj = [self.iv, self.itgr, self.intrp, self.sco]
         self.win_obj_list = [self.win1obj, self.win2obj, self.win3obj, self.win4obj, self.win5obj]
 
@@ -156,7 +162,10 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
         self.itgr.clicked.connect(self.calculate_integral)
         self.intrp.clicked.connect(self.interpolate)
         self.de.clicked.connect(self.solve_differential_equation)
+        self.cl.clicked.connect(self.calculate_contour_line)
         self.fo.clicked.connect(self.file_open)
+        self.sco.clicked.connect(lambda: self.export_csv('interpolation_coefs'))
+        self.sder.clicked.connect(lambda: self.export_csv('cauchy_problem'))
         self.b1.clicked.connect(lambda: self.show_window(0))
         self.b2.clicked.connect(lambda: self.show_window(1))
         self.b3.clicked.connect(lambda: self.show_window(2))
@@ -191,6 +200,7 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
         self.main_layout.addLayout(self.intgr_layout)
         self.main_layout.addLayout(self.de_layout)
         self.main_layout.addLayout(self.de_params)
+        self.main_layout.addLayout(self.cl_layout)
         self.main_layout.addStretch()
         self.main_layout.addLayout(self.loader)
 
@@ -214,6 +224,9 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
         self.de_layout.addWidget(self.sder)
         self.de_layout.addStretch()
 
+        self.cl_layout.addWidget(self.cl)
+        self.cl_layout.addStretch()
+
         # functions regime << first graph params widgets
         self.params1.addStretch()
         self.params1.addWidget(self.distribution_settings)
@@ -253,6 +266,7 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
 
         self.loader.addWidget(self.fo)
         self.loader.addStretch()
+        self.loader.addWidget(self.loading)
 
     def show_window(self, n_window):
 
@@ -265,12 +279,21 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
 
     def use_discrete_set(self, n_graph):
 
-        """"""
+        """Write the loaded set into the graph: a column is its x, two columns are its x and y"""
 
-        if self.discrete_set is not None:
-            figure_params.xgraphs[n_graph] = self.discrete_set
-        else:
+        if self.discrete_set is None:
             self.statusBar().showMessage("No data, bro!", 2000)
+            return
+        columns = self.discrete_set
+        try:
+            setattr(figure_params, "xgraph{}".format(n_graph + 1), columns[0])
+            if len(columns) > 1:
+                setattr(figure_params, "ygraph{}".format(n_graph + 1), columns[1])
+        except (ValueError, IndexError):
+            self.statusBar().showMessage("Value error, bro!", 2000)
+            return
+        [self.sc, self.dc, self.mc][n_graph].update_figure(figure_params.xgraphs[n_graph],
+                                                           figure_params.ygraphs[n_graph])
 
     def apply_change(self):
 
@@ -278,10 +301,6 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
 
         try:
             if self.current_window == self.win1obj:
-                if self.le_a.text() != '':
-                    figure_params.a1 = float(self.le_a.text())
-                if self.le_b.text() != '':
-                    figure_params.b1 = float(self.le_b.text())
                 if self.le_a2.text() != '':
                     figure_params.a2 = float(self.le_a2.text())
                 if self.le_b2.text() != '':
@@ -293,83 +312,193 @@ class MainApplicationWindow(QtWidgets.QMainWindow):
                     figure_params.b3 = float(self.le_b3.text())
         except ValueError:
             self.statusBar().showMessage("Value error, bro!", 2000)
+            return
+
+        # only the graphs depending on the changed parameters are recomputed and blitted
+        for n_graph, canvas in enumerate([self.sc, self.dc, self.mc]):
+            if figure_params.is_stale("ygraph{}".format(n_graph + 1)):
+                canvas.update_data(figure_params.xgraphs[n_graph], figure_params.ygraphs[n_graph])
 
     def file_open(self):
 
-        """"""
+        """Load a discrete set as a list of columns: memory maps of a saved .npz/.npy result, or the CSV columns
+        parsed in the background (and mapped from their cached sidecar on later opens)"""
+
+        name = QtWidgets.QFileDialog.getOpenFileName(self, 'Open File')[0]
+        if not name:
+            return
+        if name.endswith(('.npz', '.npy')):
+            columns, metadata = storage.load_result(name)
+            self.discrete_set_loaded([column for value in columns.values()
+                                      for column in (value.T if value.ndim > 1 else [value])])
+        else:
+            self.run_job("Loading", loader.load_csv, self.discrete_set_loaded, name)
+
+    def discrete_set_loaded(self, columns):
+        if not columns or not len(columns[0]):
+            self.statusBar().showMessage("No data, bro!", 2000)
+            return
+        self.discrete_set = columns
+        self.statusBar().showMessage("Received a {}x{} matrix, bro!".format(len(columns[0]), len(columns)), 2000)
 
-        name = QtWidgets.QFileDialog.getOpenFileName(self, 'Open File')
-        self.discrete_set = np.genfromtxt(name[0], delimiter=',')
-        sz = self.discrete_set.shape
-        if len(sz) == 1:
-            self.statusBar().showMessage("Received a {}x{} matrix, bro!".format(sz[0], 1), 2000)
-        if len(sz) == 2:
-            self.statusBar().showMessage("Received a {}x{} matrix, bro!".format(sz[0], sz[1]), 2000)
+    def save_result(self, name, columns, **metadata):
+
+        """Save the columns and the metadata into RESULTS_PATH/<name>.npz and keep them for the CSV export"""
+
+        self.results[name] = columns
+        os.makedirs(RESULTS_PATH, exist_ok=True)
+        return storage.save_result(os.path.join(RESULTS_PATH, name), columns, **metadata)
 
     def save_discrete_set(self, n_graph):
 
-        """"""
+        """Save the graph into RESULTS_PATH/graph<n>.npz with the parameters it is computed from"""
 
-        np.savetxt("/Users/basilminkov/PycharmProjects/NumericalMethodsProjects/results/graph{}.csv".format(str(n_graph+1)),
-                   np.stack((figure_params.xgraphs[n_graph], figure_params.ygraphs[n_graph]), axis=1), delimiter=',')
+        self.save_result("graph{}".format(n_graph + 1),
+                         {'x': figure_params.xgraphs[n_graph], 'y': figure_params.ygraphs[n_graph]},
+                         kind='discrete_set', parameters=dict(zip(('a1', 'b1', 'a2', 'b2', 'a3', 'b3'),
+                                                                  figure_params.params)))
         self.statusBar().showMessage("Graph{} is saved, bro!".format(str(n_graph+1)), 2000)
 
-    def calculate_integral(self):
+    def export_csv(self, name):
 
-        """"""
+        """Export the last computed result as CSV"""
 
-        ni = NumericalIntegration()
-        ni.fit(figure_params.xgraph1, figure_params.ygraph1)
-        self.iv.setText(str(ni.calculate_integral()))
-        self.statusBar().showMessage("Integral has been calculated, bro!", 2000)
+        if name not in self.results:
+            self.statusBar().showMessage("Nothing to export, bro!", 2000)
+            return
+        fname = QtWidgets.QFileDialog.getSaveFileName(self, 'Export CSV', name + '.csv')[0]
+        if fname:
+            storage.export_csv(fname, self.results[name])
+            self.statusBar().showMessage("Exported to {}, bro!".format(fname), 2000)
+
+    def export_result(self):
+
+        """Export a saved .npz result as CSV"""
+
+        fname = QtWidgets.QFileDialog.getOpenFileName(self, 'Open Result', RESULTS_PATH, 'Results (*.npz *.npy)')[0]
+        if not fname:
+            return
+        columns, metadata = storage.load_result(fname)
+        target = QtWidgets.QFileDialog.getSaveFileName(self, 'Export CSV', os.path.splitext(fname)[0] + '.csv')[0]
+        if not target:
+            return
+        try:
+            storage.export_csv(target, columns)
+        except ValueError as error:
+            self.statusBar().showMessage(str(error), 5000)
+            return
+        self.statusBar().showMessage("Exported to {}, bro!".format(target), 2000)
+
+    def run_job(self, title, fn, on_result, *args, **kwargs):
+
+        """Run fn(*args, **kwargs) in the thread pool, showing its progress; on_result gets its result"""
+
+        if self.loading.busy:
+            self.statusBar().showMessage("Busy, bro! Wait or cancel the running job.", 2000)
+            return
+        job = Job(fn, *args, **kwargs)
+        job.signals.result.connect(on_result)
+        job.signals.error.connect(lambda message: self.statusBar().showMessage(message, 5000))
+        job.signals.cancelled.connect(lambda: self.statusBar().showMessage("{} cancelled, bro!".format(title), 2000))
+        self.loading.start(job, title)
+        self.pool.start(job)
 
     def interpolate(self):
 
-        """"""
+        """Interpolate the first graph by the cubic spline in the background, plot it and save the coefficients"""
 
-        ni = NumericalIntegration()
-        ni.fit(figure_params.xgraph1, figure_params.ygraph1)
-        ni.interpolate()
-        np.savetxt("/Users/basilminkov/PycharmProjects/NumericalMethodsProjects/results/interpolation_coefs.csv",
-                   ni.coefs_, delimiter=',')
+        self.run_job("Interpolation", tasks.spline_interpolation, self.interpolated,
+                     figure_params.xgraph1.copy(), figure_params.ygraph1.copy(), h=0.001)
+
+    def interpolated(self, result):
+        spline, xc, yc = result
+        self.sc.update_figure(xc, yc)
+        metadata = dict(kind='interpolation', method='cubic spline', parameters={'form': spline.form},
+                        grid={'knots': len(spline.x), 'h': 0.001})
+        self.save_result('interpolation', {'x': xc, 'y': yc}, **metadata)
+        self.save_result('interpolation_coefs', {'x': spline.x[:-1], 'coefficients': tasks.spline_coefficients(spline)},
+                         **metadata)
         self.statusBar().showMessage("Interpolation has been done and saved to file, bro!", 2000)
 
     def calculate_integral(self):
 
-        """"""
+        """Integrate rho(omega) of the distribution settings over the first graph range through the distribution CDF"""
 
-        ni = NumericalIntegration()
-        ni.fit(figure_params.xgraph1, figure_params.ygraph1)
-        self.iv.setText(str(ni.calculate_integral()))
+        x = figure_params.xgraph1.copy()
+        args, loc, scale = tasks.distribution_params(figure_params.foo, figure_params.mu, figure_params.sigma,
+                                                     figure_params.alpha, figure_params.beta)
+        self.run_job("Integration", tasks.distribution_integral, self.integral_calculated,
+                     figure_params.foo, x[0], x[-1], args=args, loc=loc, scale=scale, x=x)
+
+    def integral_calculated(self, value):
+        self.iv.setText(str(value))
         self.statusBar().showMessage("Integral has been calculated, bro!", 2000)
 
-    def solve_differential_equation(self):
+    def cauchy_problem_params(self):
 
-        """"""
+        """Read x0, y0, beta and T of the Cauchy problem, "None" on a value error"""
 
-        de = EulerMethod()
+        x0, y0, beta_param, T = 0.0, 0.5, figure_params.beta, 1.0
         try:
             if self.le_x0.text() != '':
-                de.x0 = float(self.le_x0.text())
+                x0 = float(self.le_x0.text())
             if self.le_y0.text() != '':
-                de.y0 = float(self.le_y0.text())
+                y0 = float(self.le_y0.text())
             if self.le_beta.text() != '':
-                de.beta = float(self.le_beta.text())
+                beta_param = float(self.le_beta.text())
             if self.le_T.text() != '':
-                de.T = float(self.le_T.text())
+                T = float(self.le_T.text())
         except ValueError:
             self.statusBar().showMessage("Value error, bro!", 2000)
-        ni = NumericalIntegration()
-        de.U = ni.calculate_integral()
-        de.S = [random.random() for i in range(10)]
-        de.z = [random.random() for i in range(10)]
-        ni = NumericalIntegration()
-        ni.fit(figure_params.xgraph1, figure_params.ygraph1)
-        ni.interpolate()
-        print(de.solve_differential_equation())
-        np.savetxt("/Users/minkov/PycharmProjects/NumericalMethodsProjects/results/CauchyProblemAnswer.csv",
-                   [de.solve_differential_equation()])
-        self.statusBar().showMessage("Differential equation has been calculated, bro!", 2000)
+            return None
+        return x0, y0, beta_param, T
+
+    def graphs_model_params(self, y0, T):
+
+        """Copies of the graphs and the distribution the threshold dynamics model is built from"""
+
+        return dict(visits=figure_params.ygraph2.copy(), schedule=figure_params.ygraph3.copy(), y0=y0, T=T,
+                    mu=figure_params.mu, sigma=figure_params.sigma)
+
+    def solve_differential_equation(self):
+
+        """Solve the threshold dynamics Cauchy problem in the background and save x(T), y(T), q(T)"""
+
+        params = self.cauchy_problem_params()
+        if params is None:
+            return
+        x0, y0, beta_param, T = params
+        model_params = self.graphs_model_params(y0, T)
+        parameters = dict(x0=x0, y0=y0, beta=beta_param, T=T, mu=model_params['mu'], sigma=model_params['sigma'])
+        self.run_job("Cauchy problem", tasks.cauchy_problem,
+                     lambda solution: self.differential_equation_solved(solution, parameters),
+                     x0=x0, beta=beta_param, **model_params)
+
+    def differential_equation_solved(self, solution, parameters):
+        self.save_result('cauchy_problem', {'t': solution.x, 'states': solution.states},
+                         kind='cauchy_problem', method='DormandPrinceMethod', parameters=parameters,
+                         grid={'start': solution.x[0], 'stop': solution.x[-1], 'steps': solution.n_steps},
+                         labels={'states': ['x', 'y', 'q']})
+        self.statusBar().showMessage("Differential equation has been calculated, bro! x(T) = {:.6g}, y(T) = {:.6g}, "
+                                     "q(T) = {:.6g}".format(*solution.states[-1]), 5000)
+
+    def calculate_contour_line(self):
+
+        """Sweep the quality criterion C(beta) over the fourth graph grid of beta in the background"""
+
+        params = self.cauchy_problem_params()
+        if params is None:
+            return
+        x0, y0, beta_param, T = params
+        # the workers are spawned, forking the multithreaded Qt process may deadlock them
+        self.run_job("Contour line", tasks.contour_line, self.contour_line_calculated,
+                     betas=figure_params.xgraph4.copy(), x0=x0, start_method='spawn',
+                     **self.graphs_model_params(y0, T))
+
+    def contour_line_calculated(self, values):
+        figure_params.ygraph4 = values
+        self.dbc.update_figure(figure_params.xgraph4, figure_params.ygraph4)
+        self.statusBar().showMessage("Contour line has been calculated, bro!", 2000)
 
     def about(self):
 